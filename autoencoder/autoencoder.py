@@ -10,16 +10,95 @@ from keras.models import Sequential, Model
 from hyperopt import hp, fmin, tpe, Trials, STATUS_OK
 from keras.layers import Input, Dense, Dropout, Lambda
 
+from autoencoder.inference import coding_layer_index, export_model
+
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
 
 warnings.filterwarnings("ignore", category=UserWarning)
 
 
+RMSE_MODES = ("loss", "subsample", None)
+
+
+class RMSECallback(tf.keras.callbacks.Callback):
+    """
+    ## Reports the train and test RMSE after every epoch to a progress callback
+
+    Modes:
+    - "loss": square root of Keras' loss and val_loss (the MSE of the epoch), no extra predictions. With dropout
+    the train loss is measured with dropout active.
+    - "subsample": RMSE of the model on n_samples random train and test curves, computed every interval epochs.
+    In between the last values are reported again. Needs X_train and X_test, falls back to "loss" without them.
+
+    Input Arguments:
+    - progress_callback: Called as progress_callback(epoch, total_epochs, train_rmse, test_rmse)
+    - mode (str): "loss" or "subsample". Default "loss".
+    - X_train, X_test (np.ndarray, optional): Training and test curves for "subsample"
+    - interval (int): Epochs between two subsample evaluations. Default 1.
+    - n_samples (int): Curves per subsample. Default 1000.
+    - seed (int, optional): Seed of the subsample
+    """
+
+    def __init__(
+        self,
+        progress_callback,
+        mode="loss",
+        X_train=None,
+        X_test=None,
+        interval=1,
+        n_samples=1000,
+        seed=None,
+    ):
+        super().__init__()
+        self.progress_callback = progress_callback
+        self.mode = mode
+        self.interval = max(int(interval), 1)
+        self.rmse = (np.nan, np.nan)
+        if mode == "subsample" and (X_train is None or X_test is None):
+            self.mode = "loss"
+        if self.mode == "subsample":
+            rng = np.random.default_rng(seed)
+            self.X_train = _subsample(X_train, n_samples, rng)
+            self.X_test = _subsample(X_test, n_samples, rng)
+
+    def on_epoch_end(self, epoch, logs=None):
+        logs = logs or {}
+        if self.mode == "loss":
+            self.rmse = (
+                np.sqrt(logs.get("loss", np.nan)),
+                np.sqrt(logs.get("val_loss", np.nan)),
+            )
+        elif epoch % self.interval == 0 or epoch + 1 == self.params["epochs"]:
+            self.rmse = (
+                _rmse(self.model, self.X_train),
+                _rmse(self.model, self.X_test),
+            )
+        self.progress_callback(epoch + 1, self.params["epochs"], *self.rmse)
+
+
+def _subsample(X, n_samples, rng):
+    """Random rows of X in sorted order (sequential reads for memory-mapped X)."""
+    if len(X) <= n_samples:
+        return np.asarray(X)
+    return X[np.sort(rng.choice(len(X), n_samples, replace=False))]
+
+
+def _rmse(model, X):
+    predictions = model.predict(X, batch_size=1024, verbose=0)
+    return float(np.sqrt(np.mean((X - predictions) ** 2)))
+
+
 class Autoencoder:
     """
     ## Main class to build and train an Autoencoder.
 
     Please see **functions.py** to know how to actually use this class!
+
+    The training data is either given as arrays (X_train, X_test) or as tf.data datasets of (curves, curves)
+    batches (train_dataset, validation_dataset, see **dataset.py**) for data that does not fit into memory.
+
+    The RMSE passed to the progress_callback of train() is set with rmse_mode (see RMSECallback), rmse_interval
+    and rmse_samples. rmse_mode=None disables the progress reporting.
     """
 
     def __init__(
@@ -38,6 +117,11 @@ class Autoencoder:
         X_train=None,
         X_test=None,
         verbose=1,
+        train_dataset=None,
+        validation_dataset=None,
+        rmse_mode="loss",
+        rmse_interval=1,
+        rmse_samples=1000,
     ):
         self.input_size = input_size
         self.n_codings = n_codings
@@ -50,10 +134,21 @@ class Autoencoder:
         self.use_early_stopping = use_early_stopping
         self.early_stopping_patience = early_stopping_patience
         self.n_evaluations = n_evaluations
-        self.X_train = np.array(X_train)
-        self.X_test = np.array(X_test)
+        # asarray keeps memory-mapped float32 matrices (see tools.curves.open_curve_matrix) without a copy
+        self.X_train = None if X_train is None else np.asarray(X_train, np.float32)
+        self.X_test = None if X_test is None else np.asarray(X_test, np.float32)
+        if train_dataset is not None and validation_dataset is None:
+            raise ValueError("train_dataset needs a validation_dataset")
+        self.train_dataset = train_dataset
+        self.validation_dataset = validation_dataset
+        if rmse_mode not in RMSE_MODES:
+            raise ValueError(f"Unknown rmse_mode: {rmse_mode}")
+        self.rmse_mode = rmse_mode
+        self.rmse_interval = rmse_interval
+        self.rmse_samples = rmse_samples
         self.verbose = verbose
         self.model = None
+        self._sub_models_of = None
 
     def compute_layer_sizes(self):
         sizes = [self.input_size]
@@ -91,17 +186,61 @@ class Autoencoder:
         model.compile(optimizer="adam", loss="mse")
         return model
 
-    def get_coding_layer(self, data):
-        """Extracts the coding layer for the given data."""
-        middle_layer_index = len(self.model.layers) // 2 - 1
-        coding_model = Model(
-            inputs=self.model.inputs,
-            outputs=self.model.layers[middle_layer_index].output,
+    @property
+    def coding_layer_index(self):
+        """Index of the coding layer in model.layers (Dropout layers are skipped)."""
+        return coding_layer_index(
+            [layer.__class__.__name__ for layer in self.model.layers]
+        )
+
+    def _build_sub_models(self):
+        """Build encoder, decoder and the fused model once per trained model (they share its layers)."""
+        if self._sub_models_of is self.model:
+            return
+        coding = self.model.layers[self.coding_layer_index].output
+        if int(coding.shape[-1]) != self.n_codings:
+            raise ValueError(
+                f"Coding layer has {coding.shape[-1]} units, expected n_codings={self.n_codings}"
+            )
+        self._encoder = Model(inputs=self.model.inputs, outputs=coding)
+        self._fused = Model(
+            inputs=self.model.inputs, outputs=[self.model.outputs[0], coding]
         )
-        return coding_model.predict(data)
+        decoder_input = Input(shape=(int(coding.shape[-1]),))
+        decoded = decoder_input
+        for layer in self.model.layers[self.coding_layer_index + 1 :]:
+            decoded = layer(decoded)
+        self._decoder = Model(inputs=decoder_input, outputs=decoded)
+        self._sub_models_of = self.model
+
+    @property
+    def encoder(self):
+        """Model from the input to the coding layer."""
+        self._build_sub_models()
+        return self._encoder
+
+    @property
+    def decoder(self):
+        """Model from the codings to the reconstruction."""
+        self._build_sub_models()
+        return self._decoder
+
+    def get_coding_layer(self, data):
+        """Extracts the coding layer for the given data (2D array, also a memory-mapped matrix)."""
+        return self.encoder.predict(data)
+
+    def predict_with_codings(self, data, batch_size=None):
+        """Reconstructions and codings of the given data in one pass through the model."""
+        self._build_sub_models()
+        reconstructions, codings = self._fused.predict(data, batch_size=batch_size)
+        return reconstructions, codings
+
+    def export(self, path, quantize=False):
+        """Export the weights to a .npz file for the NumPy inference (see inference.py)."""
+        export_model(self.model, path, quantize=quantize)
 
-    def train(self, progress_callback=None):
-        """Trains the model and returns the training history."""
+    def train(self, progress_callback=None, initial_epoch=0):
+        """Trains the model and returns the training history (initial_epoch > 0 continues a trained model)."""
         callbacks = []
         if self.use_early_stopping:
             callbacks.append(
@@ -112,32 +251,34 @@ class Autoencoder:
                 )
             )
 
-        class RMSECallback(tf.keras.callbacks.Callback):
-            def __init__(self, X_train, X_test, progress_callback):
-                super().__init__()
-                self.X_train = X_train
-                self.X_test = X_test
-                self.progress_callback = progress_callback
-
-            def on_epoch_end(self, epoch, logs=None):
-                train_predictions = self.model.predict(self.X_train)
-                test_predictions = self.model.predict(self.X_test)
-
-                train_rmse = np.sqrt(np.mean((self.X_train - train_predictions) ** 2))
-                test_rmse = np.sqrt(np.mean((self.X_test - test_predictions) ** 2))
-
-                if self.progress_callback:
-                    self.progress_callback(
-                        epoch + 1, self.params["epochs"], train_rmse, test_rmse
-                    )
+        if progress_callback is not None and self.rmse_mode is not None:
+            callbacks.append(
+                RMSECallback(
+                    progress_callback,
+                    mode=self.rmse_mode,
+                    X_train=self.X_train,
+                    X_test=self.X_test,
+                    interval=self.rmse_interval,
+                    n_samples=self.rmse_samples,
+                )
+            )
 
-        callbacks.append(RMSECallback(self.X_train, self.X_test, progress_callback))
+        if self.train_dataset is not None:
+            return self.model.fit(
+                self.train_dataset,
+                validation_data=self.validation_dataset,
+                epochs=self.epochs,
+                initial_epoch=initial_epoch,
+                callbacks=callbacks,
+                verbose=self.verbose,
+            )
 
         history = self.model.fit(
             self.X_train,
             self.X_train,
             validation_data=(self.X_test, self.X_test),
             epochs=self.epochs,
+            initial_epoch=initial_epoch,
             batch_size=self.batch_size,
             shuffle=True,
             callbacks=callbacks,
@@ -164,6 +305,9 @@ class Autoencoder:
         self.n_codings = int(params["n_codings"])
         self.n_layers = int(params["n_layers"])
         self.decrease_mode = params["decrease_mode"]
+        self.use_dropout = params.get("use_dropout", self.use_dropout)
+        self.dropout_rate = params.get("dropout_rate", self.dropout_rate)
+        self.batch_size = int(params.get("batch_size", self.batch_size))
         return self.build_and_train_model()
 
     def run(self, progress_callback=None):
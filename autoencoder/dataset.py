@@ -0,0 +1,135 @@
+"""
+tf.data input pipeline to train the Autoencoder on curve files that do not fit into memory.
+
+The curves are read chunk by chunk from memory-mapped float32 .npy matrices (see tools.curves.save_curve_matrix and
+ProjectStore.save_curve_matrix), shuffled in a buffer, batched, optionally normalized in a parallel map and
+prefetched while the model trains on the previous batch. Only the shuffle buffer and a few batches are in memory.
+
+Example:
+```python
+paths = ["projects/A/Current_normalized.npy", "projects/B/Current_normalized.npy"]
+train_chunks, validation_chunks = split_curve_chunks(paths, validation_fraction=0.2)
+autoencoder = Autoencoder(
+    input_size=curve_file_width(paths),
+    train_dataset=curve_dataset(train_chunks, batch_size=256),
+    validation_dataset=curve_dataset(validation_chunks, batch_size=256, shuffle_buffer=0),
+)
+autoencoder.run()
+```
+"""
+
+import numpy as np
+import tensorflow as tf
+from typing import List, NamedTuple, Tuple
+
+from tools.curves import open_curve_matrix
+
+
+class CurveChunk(NamedTuple):
+    """Rows [start, stop) of a curve matrix file."""
+
+    path: str
+    start: int
+    stop: int
+
+
+def curve_file_width(paths) -> int:
+    """Number of points per curve, the same for all files."""
+    widths = {open_curve_matrix(path).shape[1] for path in paths}
+    if len(widths) != 1:
+        raise ValueError(f"Curve files have different numbers of points: {widths}")
+    return widths.pop()
+
+
+def split_curve_chunks(
+    paths, validation_fraction=0.2, chunk_rows=4096, seed=None
+) -> Tuple[List[CurveChunk], List[CurveChunk]]:
+    """
+    ## Split curve files into training and validation chunks
+
+    Whole chunks are assigned at random, so both sets are read sequentially from disk.
+
+    Input Arguments:
+    - paths (list): .npy files written by save_curve_matrix
+    - validation_fraction (float): Share of the chunks used for validation. Default 0.2.
+    - chunk_rows (int): Rows per chunk. Default 4096.
+    - seed (int, optional): Seed of the assignment
+
+    Returns:
+    - list of training chunks, list of validation chunks
+    """
+    chunks = []
+    for path in paths:
+        n_rows = len(open_curve_matrix(path))
+        for start in range(0, n_rows, chunk_rows):
+            chunks.append(CurveChunk(path, start, min(start + chunk_rows, n_rows)))
+
+    rng = np.random.default_rng(seed)
+    is_validation = rng.random(len(chunks)) < validation_fraction
+    if validation_fraction > 0 and len(chunks) > 1 and not is_validation.any():
+        is_validation[rng.integers(len(chunks))] = True
+    train = [chunk for chunk, v in zip(chunks, is_validation) if not v]
+    validation = [chunk for chunk, v in zip(chunks, is_validation) if v]
+    return train, validation
+
+
+def _chunk_reader(chunks: List[CurveChunk], shuffle, seed):
+    """Generator function yielding the chunks as float32 arrays, in a new random order on every call if shuffle."""
+    rng = np.random.default_rng(seed)
+
+    def read():
+        matrices = {}
+        order = rng.permutation(len(chunks)) if shuffle else range(len(chunks))
+        for i in order:
+            chunk = chunks[i]
+            if chunk.path not in matrices:
+                matrices[chunk.path] = open_curve_matrix(chunk.path)
+            rows = matrices[chunk.path][chunk.start : chunk.stop]
+            yield np.asarray(rows, dtype=np.float32)
+
+    return read
+
+
+def normalize_by_max(curves):
+    """Divide every curve by its maximum (like normalize_curve_data, without the interpolation)."""
+    return curves / tf.reduce_max(curves, axis=1, keepdims=True)
+
+
+def curve_dataset(
+    chunks: List[CurveChunk],
+    batch_size=32,
+    shuffle_buffer=10000,
+    normalize=None,
+    seed=None,
+    num_parallel_calls=tf.data.AUTOTUNE,
+) -> tf.data.Dataset:
+    """
+    ## tf.data.Dataset of (curves, curves) batches for Autoencoder training
+
+    Input Arguments:
+    - chunks (list of CurveChunk): see split_curve_chunks
+    - batch_size (int): Curves per batch. Default 32.
+    - shuffle_buffer (int): Size of the shuffle buffer in curves, 0 disables shuffling. Default 10000.
+    - normalize (callable, optional): Applied to every batch in a parallel map, e.g. normalize_by_max
+    - seed (int, optional): Seed of the chunk order and the shuffle buffer
+    - num_parallel_calls (int): Parallel calls of normalize. Default tf.data.AUTOTUNE.
+
+    Returns:
+    - tf.data.Dataset, re-read from disk in every epoch
+    """
+    if not chunks:
+        raise ValueError("No curve chunks given")
+    width = curve_file_width({chunk.path for chunk in chunks})
+    shuffle = shuffle_buffer > 0
+    dataset = tf.data.Dataset.from_generator(
+        _chunk_reader(chunks, shuffle, seed),
+        output_signature=tf.TensorSpec(shape=(None, width), dtype=tf.float32),
+    ).unbatch()
+    if shuffle:
+        dataset = dataset.shuffle(
+            shuffle_buffer, seed=seed, reshuffle_each_iteration=True
+        )
+    dataset = dataset.batch(batch_size)
+    if normalize is not None:
+        dataset = dataset.map(normalize, num_parallel_calls=num_parallel_calls)
+    return dataset.map(lambda curves: (curves, curves)).prefetch(tf.data.AUTOTUNE)
@@ -6,7 +6,11 @@ Use autoencode() to train the model.
 Required inputs:
 - df: pandas DataFrame
 - target_feature: str -> the column name of the target feature, e.g. "IV_Current_normalized"
-                      -> list of floats
+                      -> list of floats or a CurveArray column (see tools/curves.py)
+
+Optional inputs:
+- X: np.ndarray -> the curves of target_feature as a float32 matrix, e.g. a memory map from
+                   tools.curves.open_curve_matrix or ProjectStore.curve_matrix (default: built from the column)
 
 Architecture Options:
 - n_codings: int -> number of codings in the middle (default: 10)
@@ -20,27 +24,43 @@ Training Options:
 - early_stopping_patience: int -> patience for early stopping (default: 10)
 - epochs: int -> number of epochs to train the model (default: 400)
 - batch_size: int -> batch size for training the model (default: 32)
+- rmse_mode: str -> RMSE for the progress_callback: "loss" (sqrt of loss/val_loss), "subsample" or None to
+                   disable it (default: "loss", see autoencoder.RMSECallback)
+- rmse_interval: int -> epochs between two "subsample" evaluations (default: 1)
+- rmse_samples: int -> curves per "subsample" evaluation (default: 1000)
+
+Use autoencode_files() to train on .npy curve matrices that do not fit into memory (tf.data pipeline, see
+dataset.py).
+
+Use search.search_hyperparameters() for a parallel hyperparameter search (hyperopt TPE with successive halving).
 """
 
 import numpy as np
 
 from autoencoder.autoencoder import Autoencoder
+from autoencoder.dataset import curve_dataset, curve_file_width, split_curve_chunks
 from sklearn.model_selection import train_test_split
+from tools.curves import CurveArray, curve_matrix
 
 
-def autoencode(df, target_feature, progress_callback=None, **kwargs):
+def autoencode(df, target_feature, progress_callback=None, X=None, **kwargs):
     """
     Train an autoencoder on the given DataFrame and target feature.
     """
     test_size = 0.2
 
-    X = np.array(df[target_feature].tolist()).astype(np.float32)
-    X_train, X_test, train_indices, test_indices = train_test_split(
-        X,
+    if X is None:
+        X = curve_matrix(df[target_feature])
+    elif len(X) != len(df):
+        raise ValueError(f"X has {len(X)} rows, the data has {len(df)} rows")
+    train_indices, test_indices = train_test_split(
         np.arange(X.shape[0]),
         test_size=test_size,
         random_state=None,
     )
+    # Sorted indices read a memory-mapped X sequentially, fit shuffles the rows anyway
+    X_train = X[np.sort(train_indices)]
+    X_test = X[np.sort(test_indices)]
     input_size = X_train.shape[1]
 
     # Initialize and build the autoencoder
@@ -51,17 +71,46 @@ def autoencode(df, target_feature, progress_callback=None, **kwargs):
     # Run the autoencoder
     history = autoencoder.run(progress_callback=progress_callback)
 
-    # Reconstruct the curves
-    all_predictions = autoencoder.model.predict(X)
-    df["reconstruction"] = all_predictions.tolist()
-
-    # Get the codings
-    codings = autoencoder.get_coding_layer(X)
-    df["codings"] = codings.tolist()
+    # Reconstruct the curves and get the codings in one pass
+    all_predictions, codings = autoencoder.predict_with_codings(X)
+    df["reconstruction"] = CurveArray.from_matrix(all_predictions).to_column(df.index)
+    df["codings"] = CurveArray.from_matrix(codings).to_column(df.index)
 
     return df, history, autoencoder
 
 
+def autoencode_files(
+    paths,
+    progress_callback=None,
+    validation_fraction=0.2,
+    chunk_rows=4096,
+    shuffle_buffer=10000,
+    normalize=None,
+    seed=None,
+    **kwargs,
+):
+    """
+    Train an autoencoder on curve matrix files (.npy, see tools.curves.save_curve_matrix) with a tf.data pipeline,
+    without loading the curves into memory. kwargs are the options of Autoencoder (epochs, batch_size, ...).
+    """
+    batch_size = kwargs.get("batch_size", 32)
+    train_chunks, validation_chunks = split_curve_chunks(
+        paths, validation_fraction, chunk_rows, seed
+    )
+    autoencoder = Autoencoder(
+        input_size=curve_file_width(paths),
+        train_dataset=curve_dataset(
+            train_chunks, batch_size, shuffle_buffer, normalize, seed
+        ),
+        validation_dataset=curve_dataset(
+            validation_chunks, batch_size, 0, normalize, seed
+        ),
+        **kwargs,
+    )
+    history = autoencoder.run(progress_callback=progress_callback)
+    return history, autoencoder
+
+
 def calculate_rmse(original, reconstructed):
     """Calculate RMSE between original and reconstructed data."""
     return np.sqrt(np.mean((original - reconstructed) ** 2, axis=1))
@@ -0,0 +1,177 @@
+"""
+NumPy inference for trained autoencoders, without TensorFlow.
+
+The Autoencoder is a stack of Dense layers (relu, sigmoid output) and optional Dropout layers, which do nothing at
+inference. `export_model` writes the weights to a .npz file, `NumpyAutoencoder` runs the same computation with
+batched float32 matrix products and gives the same reconstructions as `model.predict` and the same codings as
+`Autoencoder.get_coding_layer` (up to float32 rounding).
+
+With quantize=True the kernels are stored as int8 with one float32 scale per output neuron (about 4x smaller files),
+they are converted back to float32 when the file is loaded.
+
+Example:
+```python
+export_model(autoencoder.model, "autoencoder_training/model.npz")
+model = NumpyAutoencoder.load("autoencoder_training/model.npz")
+reconstructions, codings = model.predict_with_codings(X)
+```
+"""
+
+import os
+import json
+import numpy as np
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0, out=x),
+    "sigmoid": lambda x: np.divide(1, 1 + np.exp(-x, out=x), out=x),
+    "tanh": lambda x: np.tanh(x, out=x),
+}
+
+
+def coding_layer_index(layer_types) -> int:
+    """
+    ## Index of the coding layer (bottleneck) of an Autoencoder
+
+    The Autoencoder has an even number of Dense layers, the codings are the output of the last Dense layer of the
+    encoder half. Dropout layers are skipped, so the index is also correct with use_dropout=True.
+
+    Input Arguments:
+    - layer_types (list of str): Type of every layer, e.g. the class names of model.layers ("Dense", "Dropout")
+
+    Returns:
+    - int: Index of the coding layer in the list of layers
+    """
+    dense = [i for i, kind in enumerate(layer_types) if kind.lower() == "dense"]
+    if not dense:
+        raise ValueError("Model has no Dense layers")
+    return dense[len(dense) // 2 - 1]
+
+
+def export_model(model, path, quantize=False) -> None:
+    """
+    ## Export the weights of a Keras autoencoder to a .npz file
+
+    Input Arguments:
+    - model: Trained Keras model (Dense and Dropout layers)
+    - path (str): Target .npz file
+    - quantize (bool): Store the kernels as int8 with a scale per output neuron. Default False.
+    """
+    layers, arrays = [], {}
+    for i, layer in enumerate(model.layers):
+        kind = layer.__class__.__name__
+        if kind == "Dropout":
+            layers.append({"type": "dropout"})
+            continue
+        if kind != "Dense":
+            raise ValueError(f"Unsupported layer for the NumPy export: {kind}")
+        activation = layer.get_config()["activation"]
+        if activation not in ACTIVATIONS:
+            raise ValueError(
+                f"Unsupported activation for the NumPy export: {activation}"
+            )
+        kernel, bias = (np.asarray(w, dtype=np.float32) for w in layer.get_weights())
+        if quantize:
+            scale = np.abs(kernel).max(axis=0) / 127
+            scale[scale == 0] = 1
+            arrays[f"kernel_{i}"] = np.round(kernel / scale).astype(np.int8)
+            arrays[f"scale_{i}"] = scale.astype(np.float32)
+        else:
+            arrays[f"kernel_{i}"] = kernel
+        arrays[f"bias_{i}"] = bias
+        layers.append({"type": "dense", "activation": activation})
+
+    metadata = {
+        "layers": layers,
+        "input_size": int(model.input_shape[-1]),
+        # Same layer as Autoencoder.get_coding_layer
+        "coding_layer": coding_layer_index([layer["type"] for layer in layers]),
+        "quantized": bool(quantize),
+    }
+    arrays["metadata"] = np.array(json.dumps(metadata))
+    temporary = f"{path}.tmp.npz"
+    np.savez(temporary, **arrays)
+    os.replace(temporary, path)
+
+
+class NumpyAutoencoder:
+    """
+    ## Autoencoder inference with NumPy
+
+    Input Arguments:
+    - layers (list): (kernel, bias, activation) per layer, None for layers without computation (Dropout)
+    - coding_layer (int): Index of the layer whose output are the codings
+    - batch_size (int): Curves per batch in predict. Default 4096.
+    """
+
+    def __init__(self, layers, coding_layer, batch_size=4096):
+        self.layers = layers
+        self.coding_layer = coding_layer
+        self.batch_size = batch_size
+        first = next(layer for layer in layers if layer is not None)
+        self.input_size = first[0].shape[0]
+        self.n_codings = len(layers[coding_layer][1])
+
+    @classmethod
+    def load(cls, path, batch_size=4096):
+        """Load a file written by export_model."""
+        with np.load(path) as stored:
+            metadata = json.loads(str(stored["metadata"]))
+            layers = []
+            for i, layer in enumerate(metadata["layers"]):
+                if layer["type"] == "dropout":
+                    layers.append(None)
+                    continue
+                kernel = stored[f"kernel_{i}"].astype(np.float32)
+                if f"scale_{i}" in stored:
+                    kernel *= stored[f"scale_{i}"]
+                layers.append((kernel, stored[f"bias_{i}"], layer["activation"]))
+        # Derived from the layer types, files of older exports stored a wrong index for models with dropout
+        coding_layer = coding_layer_index(
+            [layer["type"] for layer in metadata["layers"]]
+        )
+        return cls(layers, coding_layer, batch_size)
+
+    def _forward(self, batch, with_codings):
+        x = np.asarray(batch, dtype=np.float32)
+        codings = None
+        with np.errstate(over="ignore"):  # exp overflow in sigmoid gives the correct 0
+            for i, layer in enumerate(self.layers):
+                if layer is not None:
+                    kernel, bias, activation = layer
+                    x = ACTIVATIONS[activation](x @ kernel + bias)
+                if with_codings and i == self.coding_layer:
+                    codings = x.copy()
+        return x, codings
+
+    def predict_on_batch(self, batch) -> np.ndarray:
+        return self._forward(batch, False)[0]
+
+    def _batches(self, X, with_codings):
+        reconstructions, codings = [], []
+        for start in range(0, len(X), self.batch_size):
+            x, c = self._forward(X[start : start + self.batch_size], with_codings)
+            reconstructions.append(x)
+            codings.append(c)
+        return reconstructions, codings
+
+    def predict(self, X) -> np.ndarray:
+        """Reconstructions of all curves of X (like model.predict)."""
+        reconstructions, _ = self._batches(X, False)
+        if not reconstructions:
+            return np.zeros((0, self.input_size), np.float32)
+        return np.concatenate(reconstructions)
+
+    def get_coding_layer(self, X) -> np.ndarray:
+        """Codings of all curves of X (like Autoencoder.get_coding_layer)."""
+        return self.predict_with_codings(X)[1]
+
+    def predict_with_codings(self, X):
+        """Reconstructions and codings of all curves of X in one pass."""
+        reconstructions, codings = self._batches(X, True)
+        if not reconstructions:
+            return (
+                np.zeros((0, self.input_size), np.float32),
+                np.zeros((0, self.n_codings), np.float32),
+            )
+        return np.concatenate(reconstructions), np.concatenate(codings)
@@ -0,0 +1,123 @@
+"""
+Process-wide registry of saved autoencoder models (.keras or .npz) for inference.
+
+Every model file is loaded once per process and shared by all Streamlit sessions, the least recently used models
+are dropped when more than max_models are loaded. TensorFlow is only imported when the first .keras model is
+loaded, so pages that import this module stay fast. Models exported to .npz (see inference.py) run with NumPy and
+never import TensorFlow.
+
+Example:
+```python
+model = get_model("autoencoder_training/model_7codings_3layers.keras")
+reconstructions = model.predict(X)
+```
+"""
+
+import threading
+import numpy as np
+from collections import OrderedDict
+
+from autoencoder.inference import NumpyAutoencoder
+from autoencoder.scoring import model_identity
+
+
+class LoadedModel:
+    """
+    ## Keras model with a compiled predict function
+
+    The predict function is a tf.function with the fixed input signature (batch_size, input_size), so it is traced
+    only once. Smaller batches are padded to batch_size.
+
+    Input Arguments:
+    - model: Loaded Keras model
+    - path (str): Model file
+    - batch_size (int): Curves per call of the compiled function. Default 4096.
+    """
+
+    def __init__(self, model, path, batch_size=4096):
+        import tensorflow as tf
+
+        self.model = model
+        self.path = path
+        self.batch_size = batch_size
+        self.input_size = int(model.input_shape[-1])
+        self._predict = tf.function(
+            lambda batch: model(batch, training=False),
+            input_signature=[
+                tf.TensorSpec(shape=(batch_size, self.input_size), dtype=tf.float32)
+            ],
+        )
+
+    def predict_on_batch(self, batch) -> np.ndarray:
+        """Predict up to batch_size curves."""
+        batch = np.asarray(batch, dtype=np.float32)
+        n_rows = len(batch)
+        if n_rows > self.batch_size:
+            raise ValueError(f"Batch has more than {self.batch_size} rows")
+        if n_rows < self.batch_size:
+            padding = np.zeros((self.batch_size - n_rows, self.input_size), np.float32)
+            batch = np.concatenate([batch, padding])
+        return self._predict(batch).numpy()[:n_rows]
+
+    def predict(self, X) -> np.ndarray:
+        """Predict all curves of X (also a memory-mapped matrix) in batches of batch_size."""
+        parts = [
+            self.predict_on_batch(X[start : start + self.batch_size])
+            for start in range(0, len(X), self.batch_size)
+        ]
+        if not parts:
+            return np.zeros((0, self.input_size), np.float32)
+        return np.concatenate(parts)
+
+
+class ModelRegistry:
+    """
+    ## LRU cache of loaded models
+
+    Models are keyed by path, size and modification time of the file, a retrained model with the same name is
+    loaded again.
+
+    Input Arguments:
+    - max_models (int): Number of models kept in memory. Default 4.
+    - batch_size (int): Batch size of the compiled predict functions. Default 4096.
+    """
+
+    def __init__(self, max_models=4, batch_size=4096):
+        self.max_models = max_models
+        self.batch_size = batch_size
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """LoadedModel for .keras files, NumpyAutoencoder for .npz files."""
+        key = model_identity(path)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key]
+            if str(path).endswith(".npz"):
+                model = NumpyAutoencoder.load(path, self.batch_size)
+            else:
+                from tensorflow.keras.models import load_model
+
+                model = LoadedModel(load_model(path), path, self.batch_size)
+            self._models[key] = model
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+            return model
+
+    def clear(self) -> None:
+        with self._lock:
+            self._models.clear()
+
+    def __len__(self):
+        return len(self._models)
+
+
+registry = ModelRegistry()
+"""Registry shared by the whole process."""
+
+
+def get_model(path):
+    """Load a model through the shared registry."""
+    return registry.get(path)
@@ -0,0 +1,140 @@
+"""
+Reconstruction-error scores of an autoencoder, used to filter IV curves.
+
+The curves are predicted in large batches of a fixed size and the errors of every batch are computed in one
+vectorized pass, no reconstruction matrix of the full data is kept. The scores are cached on disk by the model file
+and a fingerprint of the curves, so the filtering page only runs the model once per model and dataset.
+
+Example:
+```python
+X = store.curve_matrix("Current_normalized")
+scores = ScoreCache().scores(model, "autoencoder_training/model.keras", X)
+selection = RowSelection(scores["error"] <= threshold)
+```
+"""
+
+import os
+import hashlib
+import numpy as np
+import pandas as pd
+from typing import Optional
+
+SCORE_COLUMNS = ("mse", "rmse", "max_abs", "error")
+"""Columns of the scores. error is the MSE * 1000 (the filter value of the filtering page)."""
+
+
+def reconstruction_errors(X, reconstructions) -> pd.DataFrame:
+    """
+    ## Per-curve errors between curves and their reconstructions
+
+    Input Arguments:
+    - X (np.ndarray): Curves, one per row
+    - reconstructions (np.ndarray): Reconstructions with the same shape
+
+    Returns:
+    - pd.DataFrame with the columns of SCORE_COLUMNS, one row per curve
+    """
+    difference = np.asarray(X, dtype=np.float32) - np.asarray(
+        reconstructions, dtype=np.float32
+    )
+    mse = np.mean(np.square(difference, dtype=np.float64), axis=1)
+    return pd.DataFrame(
+        {
+            "mse": mse,
+            "rmse": np.sqrt(mse),
+            "max_abs": np.max(np.abs(difference), axis=1),
+            "error": mse * 1000,
+        }
+    )
+
+
+def score_curves(model, X, batch_size=4096) -> pd.DataFrame:
+    """
+    ## Reconstruction errors of all curves
+
+    The last batch is padded to batch_size, so the model is always called with the same input shape.
+
+    Input Arguments:
+    - model: Keras model (or any object with predict_on_batch)
+    - X (np.ndarray): Curves, one per row, e.g. a memory-mapped curve matrix
+    - batch_size (int): Curves per model call. Default 4096.
+
+    Returns:
+    - pd.DataFrame with the columns of SCORE_COLUMNS, one row per curve
+    """
+    n_rows = len(X)
+    batch_size = max(min(batch_size, n_rows), 1)
+    parts = []
+    for start in range(0, n_rows, batch_size):
+        batch = np.asarray(X[start : start + batch_size], dtype=np.float32)
+        n_batch = len(batch)
+        if n_batch < batch_size:
+            padding = np.zeros((batch_size - n_batch,) + batch.shape[1:], batch.dtype)
+            batch = np.concatenate([batch, padding])
+        reconstructions = np.asarray(model.predict_on_batch(batch))[:n_batch]
+        parts.append(reconstruction_errors(batch[:n_batch], reconstructions))
+    if not parts:
+        return pd.DataFrame(columns=list(SCORE_COLUMNS), dtype=np.float64)
+    return pd.concat(parts, ignore_index=True)
+
+
+def _digest(*parts) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def matrix_fingerprint(X, chunk_rows=65536) -> str:
+    """Content hash of a curve matrix, read chunk by chunk (works for memory maps)."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{X.shape}{np.dtype(X.dtype).str}".encode())
+    for start in range(0, len(X), chunk_rows):
+        h.update(np.ascontiguousarray(X[start : start + chunk_rows]).tobytes())
+    return h.hexdigest()
+
+
+def model_identity(model_path) -> str:
+    """Path, size and modification time of a model file, a retrained model is a new identity."""
+    stat = os.stat(model_path)
+    return _digest(os.path.abspath(model_path), stat.st_size, stat.st_mtime_ns)
+
+
+class ScoreCache:
+    """
+    ## On-disk cache of reconstruction-error scores
+
+    Input Arguments:
+    - directory (str): Cache directory. Default "cache/scores".
+    """
+
+    def __init__(self, directory="cache/scores"):
+        self.directory = directory
+
+    def key(self, model_path, X) -> str:
+        return _digest(model_identity(model_path), matrix_fingerprint(X))
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.parquet")
+
+    def get(self, key) -> Optional[pd.DataFrame]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        return pd.read_parquet(path)
+
+    def put(self, key, scores: pd.DataFrame) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = f"{self._path(key)}.tmp"
+        scores.to_parquet(temporary)
+        os.replace(temporary, self._path(key))
+
+    def scores(self, model, model_path, X, batch_size=4096) -> pd.DataFrame:
+        """Scores of the curves X for the model stored at model_path, computed only if not cached."""
+        key = self.key(model_path, X)
+        scores = self.get(key)
+        if scores is None:
+            scores = score_curves(model, X, batch_size)
+            self.put(key, scores)
+        return scores
@@ -0,0 +1,316 @@
+"""
+Parallel hyperparameter search for the Autoencoder with hyperopt and successive halving.
+
+Configurations are proposed by TPE in brackets. Every bracket starts all its configurations with a small epoch
+budget in parallel worker processes, keeps the best 1/eta and continues training them (from the saved model) with
+eta times the budget until max_epochs is reached. Only the losses at max_epochs are reported to TPE, configurations
+that were stopped early are stored as failed trials (their last loss is kept as rung_loss). The Trials are written to
+directory/trials.pkl after every bracket, calling the search again with the same directory resumes it. The fingerprint of the data and the seed of the
+train/test split are written to directory/search.json on the first run, a resumed search reuses the split and
+refuses other data, so all validation losses of the Trials are comparable.
+
+Example:
+```python
+result = search_hyperparameters(
+    "projects/A/Current_normalized.npy", "autoencoder_search/A", n_trials=27, n_workers=4
+)
+result["params"], result["loss"], result["model_path"]
+```
+"""
+
+import os
+import json
+import pickle
+import numpy as np
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+from hyperopt import (
+    hp,
+    tpe,
+    Trials,
+    STATUS_OK,
+    STATUS_FAIL,
+    JOB_STATE_DONE,
+    space_eval,
+)
+from hyperopt.base import Domain
+from typing import List
+
+from autoencoder.scoring import matrix_fingerprint
+from tools.curves import open_curve_matrix, save_curve_matrix
+
+DEFAULT_SPACE = {
+    "n_codings": hp.quniform("n_codings", 2, 20, 1),
+    "n_layers": hp.quniform("n_layers", 2, 8, 1),
+    "decrease_mode": hp.choice("decrease_mode", ["linear", "exponential"]),
+    "dropout": hp.choice(
+        "dropout",
+        [
+            {"use_dropout": False, "dropout_rate": 0.0},
+            {
+                "use_dropout": True,
+                "dropout_rate": hp.uniform("dropout_rate", 0.05, 0.5),
+            },
+        ],
+    ),
+    "batch_size": hp.choice("batch_size", [16, 32, 64, 128, 256]),
+}
+"""Search space over the Autoencoder options n_codings, n_layers, decrease_mode, dropout and batch_size."""
+
+
+def rung_budgets(min_epochs, max_epochs, eta) -> List[int]:
+    """Epoch budgets of the successive halving rungs, e.g. [44, 133, 400] for 25, 400 and eta=3."""
+    budgets = [int(max_epochs)]
+    while budgets[-1] / eta >= min_epochs:
+        budgets.append(int(round(budgets[-1] / eta)))
+    return budgets[::-1]
+
+
+def _init_worker(n_threads):
+    """Cap the TensorFlow threads of a worker process (before TensorFlow is imported)."""
+    os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+    os.environ["OMP_NUM_THREADS"] = str(n_threads)
+    os.environ["TF_NUM_INTRAOP_THREADS"] = str(n_threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(n_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def _split(X, validation_fraction, seed):
+    """Fixed train/test split of the search (sorted rows for sequential reads of a memory map)."""
+    order = np.random.default_rng(seed).permutation(len(X))
+    n_test = max(int(len(X) * validation_fraction), 1)
+    return X[np.sort(order[n_test:])], X[np.sort(order[:n_test])]
+
+
+def _train_trial(job):
+    """Worker: train one configuration up to its budget, continuing the saved model of the last rung."""
+    from keras.models import load_model
+    from autoencoder.autoencoder import Autoencoder
+
+    params, budget, initial_epoch, model_path, data_path, options = job
+    X = open_curve_matrix(data_path)
+    X_train, X_test = _split(X, options["validation_fraction"], options["split_seed"])
+    autoencoder = Autoencoder(
+        input_size=X.shape[1],
+        epochs=budget,
+        use_early_stopping=True,
+        early_stopping_patience=options["early_stopping_patience"],
+        X_train=X_train,
+        X_test=X_test,
+        verbose=0,
+        rmse_mode=None,
+        **params,
+    )
+    if initial_epoch:
+        autoencoder.model = load_model(model_path)
+    else:
+        autoencoder.model = autoencoder.build_model()
+    history = autoencoder.train(initial_epoch=initial_epoch)
+    autoencoder.model.save(model_path)
+    return float(np.min(history.history["val_loss"]))
+
+
+def _not_evaluated(params):
+    raise RuntimeError("Trials are evaluated by search_hyperparameters")
+
+
+def _suggest(domain, trials, n, rng):
+    """n new trial documents proposed by TPE (random search for the first trials)."""
+    docs = []
+    for tid in trials.new_trial_ids(n):
+        docs.extend(tpe.suggest([tid], domain, trials, int(rng.integers(2**31 - 1))))
+    return docs
+
+
+def trial_params(space, doc) -> dict:
+    """Autoencoder options of a trial document."""
+    vals = {key: value[0] for key, value in doc["misc"]["vals"].items() if value}
+    params = dict(space_eval(space, vals))
+    params.update(params.pop("dropout", {}))
+    for key in ["n_codings", "n_layers", "batch_size"]:
+        if key in params:
+            params[key] = int(params[key])
+    return params
+
+
+def load_trials(directory) -> Trials:
+    """Trials of a (previous) search in directory, empty Trials if there are none."""
+    path = os.path.join(directory, "trials.pkl")
+    if not os.path.exists(path):
+        return Trials()
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def _save_trials(trials, directory):
+    path = os.path.join(directory, "trials.pkl")
+    with open(f"{path}.tmp", "wb") as f:
+        pickle.dump(trials, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def _search_state(directory, fingerprint, seed, validation_fraction) -> dict:
+    """Split seed and data fingerprint of the search in directory, written on the first run and checked on resume."""
+    path = os.path.join(directory, "search.json")
+    state = {
+        "fingerprint": fingerprint,
+        "split_seed": 0 if seed is None else seed,
+        "validation_fraction": validation_fraction,
+    }
+    if not os.path.exists(path):
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(f"{path}.tmp", path)
+        return state
+
+    with open(path) as f:
+        stored = json.load(f)
+    if stored["fingerprint"] != fingerprint:
+        raise ValueError(f"The search in {directory} was started with other data")
+    if seed is not None and seed != stored["split_seed"]:
+        raise ValueError(
+            f"The search in {directory} was started with seed={stored['split_seed']}"
+        )
+    if validation_fraction != stored["validation_fraction"]:
+        raise ValueError(
+            f"The search in {directory} was started with "
+            f"validation_fraction={stored['validation_fraction']}"
+        )
+    return stored
+
+
+def search_hyperparameters(
+    data,
+    directory,
+    n_trials=27,
+    n_workers=None,
+    threads_per_worker=None,
+    max_epochs=400,
+    min_epochs=25,
+    eta=3,
+    space=None,
+    validation_fraction=0.2,
+    early_stopping_patience=10,
+    seed=None,
+):
+    """
+    ## Search the Autoencoder hyperparameters
+
+    Input Arguments:
+    - data: Path of a curve matrix (.npy, see tools.curves.save_curve_matrix) or a 2D array of normalized curves
+    - directory (str): Folder for the Trials, the models and (for arrays) the data. Reused to resume a search.
+    - n_trials (int): Total number of configurations (including those of a resumed search). Default 27.
+    - n_workers (int, optional): Parallel worker processes. Default: CPU count / threads_per_worker.
+    - threads_per_worker (int, optional): TensorFlow threads per worker. Default: CPU count / n_workers, else 2.
+    - max_epochs (int): Epoch budget of the last rung. Default 400.
+    - min_epochs (int): Smallest epoch budget. Default 25.
+    - eta (int): Only the best 1/eta of a rung reach the next rung. Default 3.
+    - space (dict, optional): hyperopt search space. Default DEFAULT_SPACE.
+    - validation_fraction (float): Share of the curves used for the validation loss. Default 0.2.
+    - early_stopping_patience (int): Patience of the early stopping within a rung. Default 10.
+    - seed (int, optional): Seed of the proposals and of the train/test split. A resumed search keeps its split seed.
+
+    Returns:
+    - dict with loss (best validation loss at max_epochs), params, model_path and trials
+    """
+    os.makedirs(directory, exist_ok=True)
+    if isinstance(data, (str, os.PathLike)):
+        data_path = str(data)
+        fingerprint = matrix_fingerprint(open_curve_matrix(data_path))
+    else:
+        data_path = os.path.join(directory, "data.npy")
+        data = np.asarray(data, dtype=np.float32)
+        fingerprint = matrix_fingerprint(data)
+    state = _search_state(directory, fingerprint, seed, validation_fraction)
+    if not isinstance(data, (str, os.PathLike)) and not os.path.exists(data_path):
+        save_curve_matrix(data_path, data)
+
+    cpu_count = os.cpu_count() or 1
+    if n_workers is None:
+        n_workers = max(cpu_count // (threads_per_worker or 2), 1)
+    if threads_per_worker is None:
+        threads_per_worker = max(cpu_count // n_workers, 1)
+
+    space = DEFAULT_SPACE if space is None else space
+    domain = Domain(_not_evaluated, space)
+    trials = load_trials(directory)
+    budgets = rung_budgets(min_epochs, max_epochs, eta)
+    bracket_size = eta ** (len(budgets) - 1)
+    rng = np.random.default_rng(seed)
+    options = {
+        "validation_fraction": validation_fraction,
+        "split_seed": state["split_seed"],
+        "early_stopping_patience": early_stopping_patience,
+    }
+
+    def model_path(doc):
+        return os.path.join(directory, f"trial_{doc['tid']}.keras")
+
+    with ProcessPoolExecutor(
+        max_workers=n_workers,
+        mp_context=get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(threads_per_worker,),
+    ) as executor:
+        while len(trials.trials) < n_trials:
+            docs = _suggest(
+                domain, trials, min(bracket_size, n_trials - len(trials.trials)), rng
+            )
+            survivors, previous = docs, 0
+            for budget in budgets:
+                jobs = [
+                    (
+                        trial_params(space, doc),
+                        budget,
+                        previous,
+                        model_path(doc),
+                        data_path,
+                        options,
+                    )
+                    for doc in survivors
+                ]
+                for doc, loss in zip(survivors, executor.map(_train_trial, jobs)):
+                    doc["state"] = JOB_STATE_DONE
+                    doc["result"] = {
+                        "loss": loss,
+                        "status": STATUS_OK,
+                        "epochs": budget,
+                    }
+                survivors = sorted(survivors, key=lambda doc: doc["result"]["loss"])
+                survivors = survivors[: max(len(survivors) // eta, 1)]
+                previous = budget
+
+            # Only the losses and models of the full budget are kept. TPE only models STATUS_OK trials, so
+            # configurations that were stopped early do not count with a loss of a smaller budget.
+            for doc in docs:
+                if doc["result"]["epochs"] < budgets[-1]:
+                    doc["result"] = {
+                        "loss": None,
+                        "rung_loss": doc["result"]["loss"],
+                        "status": STATUS_FAIL,
+                        "epochs": doc["result"]["epochs"],
+                    }
+                    if os.path.exists(model_path(doc)):
+                        os.remove(model_path(doc))
+            trials.insert_trial_docs(docs)
+            trials.refresh()
+            _save_trials(trials, directory)
+
+    finished = [
+        trial
+        for trial in trials.trials
+        if trial["result"]["status"] == STATUS_OK
+        and trial["result"].get("epochs") == budgets[-1]
+    ]
+    if not finished:
+        raise ValueError(f"No trial in {directory} reached {budgets[-1]} epochs")
+    best = min(finished, key=lambda trial: trial["result"]["loss"])
+    return {
+        "loss": best["result"]["loss"],
+        "params": trial_params(space, best),
+        "model_path": model_path(best),
+        "trials": trials,
+    }
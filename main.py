@@ -19,6 +19,8 @@ pipeline. The recommended way is to use the GUI. See app.py.
 import pandas as pd
 
 from pipeline.pipe import DataPipeline
+from pipeline.cache import StepCache
+from pipeline.profiling import StepProfiler
 from pipeline.steps import ProcessingStep
 from pipeline.functions import normalize_curve_data
 
@@ -45,26 +47,56 @@ def main():
     result = pipeline.process(input_data)
 
     Each step will be executed in order and return an updated dataframe.
+
+    Steps can declare the columns they read and write:
+    ProcessingStep(name="Temperature", function=cell_from_module_temperature, inputs=["T_mod", "G_mod"],
+                   outputs=["T_eff"])
+
+    Such steps only get their input columns, run in parallel to independent steps and only their outputs are
+    merged into the dataframe. Steps without outputs (e.g. filters) run in order and see the full dataframe.
+
+    For data that does not fit into memory, stream it chunk by chunk through the row-local steps and aggregate the
+    bin counts and fit statistics (see pipeline.stream):
+    results = pipeline.process_stream(
+        read_parquet_chunks("data/measurements.parquet"),
+        {"bins": BinCountAggregator(G_VALUES, T_VALUES), "fit": SurfaceStatisticsAggregator(anzahl_module=6)},
+    )
+
+    To use all cores, DataPipeline(n_processes=8) runs the row-local steps on row shards in a process pool.
     """
     # success = create_new_project("Test Project")
     success = True
     if success:
-        pipeline = DataPipeline()
-        pipeline.add_step(
-            ProcessingStep(name="Normalize", function=normalize_curve_data)
+        # Step results are cached on disk, a rerun only executes the steps whose inputs or kwargs changed
+        pipeline = DataPipeline(
+            cache=StepCache("cache/pipeline"), profiler=StepProfiler()
         )
-
         pipeline.add_step(
             ProcessingStep(
                 name="Filter DataFrame",
                 function=filter_dataframe_by_label,
                 kwargs={"label": "Gut"},
+                row_local=True,
+            )
+        )
+
+        # Normalize and Calculate Module Temperature do not depend on each other and run at the same time
+        pipeline.add_step(
+            ProcessingStep(
+                name="Normalize",
+                function=normalize_curve_data,
+                inputs=["Current", "Voltage"],
+                outputs=["Current_normalized", "Voltage_normalized"],
+                row_local=True,
             )
         )
         pipeline.add_step(
             ProcessingStep(
                 name="Calculate Module Temperature",
                 function=cell_from_module_temperature,
+                inputs=["T_mod", "G_mod"],
+                outputs=["T_eff"],
+                row_local=True,
             )
         )
         pipeline.add_step(
@@ -72,6 +104,9 @@ def main():
                 name="Effective Irradiance",
                 function=effective_irradiance,
                 kwargs={"isc_calibrated": 10.14, "isc_alpha": 0.06},
+                inputs=["Isc", "G_mod", "T_eff"],
+                outputs=["G_eff"],
+                row_local=True,
             )
         )
 
@@ -79,6 +114,8 @@ def main():
         result = pipeline.process(input_data)
         print("\nFinal result:")
         print(result)
+        print("\nTime per step:")
+        print(pipeline.profiler.report())
     else:
         print("Could not create a new project.")
 
@@ -17,7 +17,10 @@ from sra.power import (
     power_calculation,
     calculate_sra_matrix,
     fit_data_to_surface,
+    fit_power_surface,
 )
+from sra.uncertainty import bootstrap_sra
+from tools.project_store import ProjectStore
 
 if "project" not in st.session_state:
     st.session_state["project"] = None
@@ -31,16 +34,16 @@ else:
 
     # data laden
     projects_dir = os.path.join(os.getcwd(), "projects")
-    folder_path = os.path.join(projects_dir, st.session_state.project)
+    store = ProjectStore(st.session_state.project, projects_dir)
 
-    if not os.path.exists(folder_path + "/data_effective.pkl"):
+    if not store.exists("data_effective"):
         st.error(
             "Für dieses Projekt liegen noch keine effektiven Betriebsbedingungen vor."
         )
         if st.button("Zurück zur Übersicht"):
             st.switch_page("pages/project_overview.py")
     else:
-        data = pd.read_pickle(folder_path + "/data_effective.pkl")
+        data = store.load("data_effective")
         st.markdown("#### Projekt: " + st.session_state.project)
         st.markdown(
             "Nachfolgend kann eine SRA Berechnung durchgeführt werden. Dazu werden zunächst noch ein paar Werte der "
@@ -48,7 +51,7 @@ else:
             "Indoor-Werte genutzt werden."
         )
 
-        if os.path.exists(folder_path + "/matrix.pkl"):
+        if store.exists("matrix"):
             st.error(
                 "Die Leistungsmatrix wurde für dieses Projekt bereits erstellt. Ein erneutes Berechnen"
                 " überschreibt die aktuellen Daten."
@@ -72,6 +75,21 @@ else:
             anzahl_module = st.number_input(
                 "Anzahl der Module", step=1, min_value=1, value=None
             )
+            fit_methods = {
+                "Numerische Optimierung (scipy)": "minimize",
+                "Geschlossene Lösung (schnell)": "closed_form",
+                "Gemeinsamer Fit von Leistung und Temperaturkoeffizient": "joint",
+            }
+            fit_method = st.selectbox(
+                "Verfahren für die Anpassung der Referenzfläche", fit_methods
+            )
+            n_resamples = st.number_input(
+                "Anzahl Bootstrap-Stichproben für Konfidenzintervalle (0 = keine)",
+                min_value=0,
+                max_value=10000,
+                value=0,
+                step=100,
+            )
 
             if (
                 p_stc
@@ -96,10 +114,22 @@ else:
                 # st.write(spatial_data)
 
                 # 4. Schauen wie ich den Fit mache (je nach Verteilung!)
+                fit_result = None
                 if is_filled:
-                    adjusted_p_stc, adjusted_p_gamma = fit_data_to_surface(
-                        data, p_stc, p_gamma, anzahl_module
-                    )
+                    if fit_methods[fit_method] == "minimize":
+                        adjusted_p_stc, adjusted_p_gamma = fit_data_to_surface(
+                            data, p_stc, p_gamma, anzahl_module
+                        )
+                    else:
+                        fit_result = fit_power_surface(
+                            data,
+                            p_stc,
+                            p_gamma,
+                            anzahl_module,
+                            method=fit_methods[fit_method],
+                        )
+                        adjusted_p_stc = fit_result["p_mpp"]
+                        adjusted_p_gamma = fit_result["p_gamma"]
 
                     matrix = calculate_sra_matrix(
                         adjusted_p_stc, adjusted_p_gamma, anzahl_module
@@ -147,7 +177,7 @@ else:
                 new_stc_module_power = new_stc_string_power / anzahl_module
 
                 single_module_matrix = matrix / anzahl_module
-                single_module_matrix.to_pickle(folder_path + "/single_matrix.pkl")
+                store.save_table("single_matrix", single_module_matrix)
 
                 datasheet_stc_string_power = p_stc * anzahl_module
 
@@ -156,8 +186,53 @@ else:
                 ) * 100
 
                 degradation_matrix = (matrix / datasheet_stc_string_power - 1) * 100
-                degradation_matrix.to_pickle(folder_path + "/degradation_matrix.pkl")
-                matrix.to_pickle(folder_path + "/matrix.pkl")
+                store.save_table("degradation_matrix", degradation_matrix)
+                store.save_table("matrix", matrix)
+
+                if fit_result is not None:
+                    st.markdown("#### Güte der Anpassung")
+                    a, b, c = st.columns(3)
+                    a.metric("RMSE", f"{fit_result['rmse']:.2f} W", border=True)
+                    b.metric(
+                        "Mittlere Abweichung",
+                        f"{fit_result['bias']:.2f} W",
+                        border=True,
+                    )
+                    c.metric("R²", f"{fit_result['r2']:.4f}", border=True)
+
+                if n_resamples:
+                    # Bootstrap der Messdaten, die numerische Optimierung wird dabei durch die geschlossene
+                    # Lösung ersetzt (gleiches Ergebnis, aber für alle Stichproben auf einmal lösbar)
+                    bootstrap_method = fit_methods[fit_method]
+                    if bootstrap_method == "minimize":
+                        bootstrap_method = "closed_form"
+                    uncertainty = bootstrap_sra(
+                        data,
+                        p_stc,
+                        p_gamma,
+                        anzahl_module,
+                        n_resamples=int(n_resamples),
+                        is_filled=is_filled,
+                        method=bootstrap_method,
+                    )
+                    store.save_table("bootstrap_samples", uncertainty["samples"])
+                    lower, upper = uncertainty["degradation_at_stc"]
+
+                    st.markdown("#### Unsicherheit (Bootstrap, 95 %)")
+                    st.metric(
+                        "Degradation bei STC",
+                        f"{degradation_at_stc:.2f} %",
+                        f"{lower:.2f} % bis {upper:.2f} %",
+                        delta_color="off",
+                        border=True,
+                    )
+                    lower_tab, upper_tab = st.tabs(
+                        ["Untere Grenze Degradation", "Obere Grenze Degradation"]
+                    )
+                    with lower_tab:
+                        st.dataframe(uncertainty["degradation"]["lower"].round(2))
+                    with upper_tab:
+                        st.dataframe(uncertainty["degradation"]["upper"].round(2))
 
                 st.markdown("#### Referenzfläche und angepasste Referenz")
 
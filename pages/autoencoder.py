@@ -8,8 +8,21 @@ from autoencoder.functions import autoencode
 from sklearn.metrics import mean_squared_error
 from pipeline.functions import normalize_curve_data
 from tools.helper import plot_random_iv_curves, plot_reconstructions
+from tools.curves import is_curve_column, open_curve_matrix, save_curve_matrix
 from tensorflow.keras.models import load_model
 
+
+def save_normalized_matrix(data, file_name):
+    """Store the normalized curves as a float32 matrix, training and codings read it as a memory map."""
+    directory = os.path.join(os.getcwd(), "autoencoder_training", "data")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(
+        directory, f"{os.path.splitext(file_name)[0]}_Current_normalized.npy"
+    )
+    save_curve_matrix(path, data["Current_normalized"])
+    st.session_state.curve_matrix_path = path
+
+
 st.markdown("# IV Autoencoder")
 st.write(
     "Mit diesem Tool kann ein IV Autoencoder über das User Interface trainiert werden. Anschließend kann das Model "
@@ -45,7 +58,7 @@ if uploaded_file is not None:
         )
         current_configured = False
         if current_column:
-            if not isinstance(data.iloc[0][current_column], list):
+            if not is_curve_column(data[current_column]):
                 st.error(
                     f"Die Daten in der Spalte **{current_column}** liegen nicht als Liste vor."
                 )
@@ -59,7 +72,7 @@ if uploaded_file is not None:
         )
         voltage_configured = False
         if voltage_column:
-            if not isinstance(data.iloc[0][voltage_column], list):
+            if not is_curve_column(data[voltage_column]):
                 st.error(
                     f"Die Daten in der Spalte **{voltage_column}** liegen nicht als Liste vor."
                 )
@@ -91,6 +104,7 @@ if uploaded_file is not None:
                         number_of_steps=number_of_steps,
                     )
                     st.session_state.data = data
+                    save_normalized_matrix(data, uploaded_file.name)
                     st.rerun()
         else:
             if current_configured and voltage_configured:
@@ -102,6 +116,7 @@ if uploaded_file is not None:
                         number_of_steps=number_of_steps,
                     )
                     st.session_state.data = data
+                    save_normalized_matrix(data, uploaded_file.name)
                     tab1, tab2 = st.tabs(["Normalisierte IV-Kurven", "Rohdaten"])
                     with tab1:
                         st.markdown("#### Normalisierte IV-Kurven")
@@ -175,6 +190,15 @@ if uploaded_file is not None:
         )
     else:
         early_stopping_patience = 0
+    rmse_modes = {
+        "Aus dem Loss (ohne zusätzliche Berechnung)": "loss",
+        "Stichprobe (1000 Kurven alle 5 Epochen)": "subsample",
+    }
+    rmse_mode = st.selectbox(
+        "Berechnung des RMSE für die Fortschrittsanzeige",
+        list(rmse_modes),
+        index=0,
+    )
 
     if "Current_normalized" in st.session_state.data.columns:
         st.divider()
@@ -196,9 +220,14 @@ if uploaded_file is not None:
                         f"Epoche {epoch}/{total_epochs} - Train RMSE: {train_rmse:.4f}, Test RMSE: {test_rmse:.4f}"
                     )
 
+            X = None
+            path = st.session_state.get("curve_matrix_path")
+            if path and os.path.exists(path):
+                X = open_curve_matrix(path)
             ae_df, history, autoencoder = autoencode(
                 st.session_state.data,
                 target_feature="Current_normalized",
+                X=X,
                 epochs=epochen,
                 n_codings=n_codings,
                 n_layers=n_layers,
@@ -209,6 +238,9 @@ if uploaded_file is not None:
                 use_dropout=dropout,
                 dropout_rate=dropout_rate,
                 progress_callback=progress_callback,
+                rmse_mode=rmse_modes[rmse_mode],
+                rmse_interval=5,
+                rmse_samples=1000,
             )
 
             st.session_state.autoencoder = autoencoder
@@ -221,6 +253,8 @@ if uploaded_file is not None:
             model_name = f"model_{n_codings}codings_{n_layers}layers_{timestamp}.keras"
             model_path = os.path.join(model_directory, model_name)
             autoencoder.model.save(model_path)
+            # NumPy export of the same model, usable for filtering without TensorFlow
+            autoencoder.export(os.path.splitext(model_path)[0] + ".npz")
             text_placeholder.success(
                 f"Training erfolgreich abgeschlossen. Das Model wurde gespeichert unter "
                 f"{model_path}.",
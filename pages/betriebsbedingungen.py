@@ -16,6 +16,7 @@ from sra.current import (
 from sra.irradiance import effective_irradiance
 
 from tools.helper import count_current_pairs, count_filled_bins
+from tools.project_store import ProjectStore
 
 if "project" not in st.session_state:
     st.session_state["project"] = None
@@ -36,19 +37,17 @@ else:
     )
 
     projects_dir = os.path.join(os.getcwd(), "projects")
-    folder_path = os.path.join(projects_dir, st.session_state.project)
+    store = ProjectStore(st.session_state.project, projects_dir)
 
-    if not os.path.exists(folder_path + "/data_filtered.pkl"):
+    if not store.exists("data_filtered"):
         st.error("Für dieses Projekt liegen noch keine gefilterten Daten vor.")
         if st.button("Zurück zur Übersicht"):
             st.switch_page("pages/project_overview.py")
     else:
         if "data_filtered" not in st.session_state:
-            st.session_state.data_filtered = pd.read_pickle(
-                folder_path + "/data_filtered.pkl"
-            )
+            st.session_state.data_filtered = store.load("data_filtered")
 
-        if os.path.exists(folder_path + "/data_effective.pkl"):
+        if store.exists("data_effective"):
             st.error(
                 "Die effektiven Betriebsbedingungen wurden für dieses Projekt bereits erstellt. Ein erneutes Berechnen"
                 " überschreibt die aktuellen Daten."
@@ -151,9 +150,7 @@ else:
                         st.session_state.data_filtered, isc_calib, isc_alpha
                     ).copy()
 
-                    st.session_state.data_filtered.to_pickle(
-                        os.path.join(folder_path, "data_effective.pkl")
-                    )
+                    store.save_stage("data_effective", st.session_state.data_filtered)
 
                     try:
                         g_values = [100, 200, 400, 500, 600, 800, 1000, 1100]
@@ -181,10 +178,10 @@ else:
                         current_degradation_matrix = (
                             current_matrix / isc_calib - 1
                         ) * 100
-                        current_degradation_matrix.to_pickle(
-                            folder_path + "/current_degradation_matrix.pkl"
+                        store.save_table(
+                            "current_degradation_matrix", current_degradation_matrix
                         )
-                        current_matrix.to_pickle(folder_path + "/current_matrix.pkl")
+                        store.save_table("current_matrix", current_matrix)
                     except Exception as e:
                         print(e)
 
@@ -4,11 +4,13 @@ import numpy as np
 import pandas as pd
 import streamlit as st
 import plotly.express as px
-from tensorflow.keras.models import load_model
-from sklearn.metrics import mean_squared_error
 from pipeline.functions import normalize_curve_data
+from autoencoder.registry import get_model
+from autoencoder.scoring import ScoreCache, score_curves
 from tools.helper import plotly_plot_3d_power, plot_random_iv_curves
-
+from tools.curves import curve_matrix, is_curve_column
+from tools.project_store import ProjectStore
+from tools.selection import RowSelection
 
 if "project" not in st.session_state:
     st.session_state["project"] = None
@@ -26,10 +28,10 @@ else:
 
     # data laden
     projects_dir = os.path.join(os.getcwd(), "projects")
-    folder_path = os.path.join(projects_dir, st.session_state.project)
+    store = ProjectStore(st.session_state.project, projects_dir)
 
     if "dataframe" not in st.session_state:
-        data = pd.read_pickle(folder_path + "/data.pkl")
+        data = store.load("data")
         st.session_state.dataframe = data
 
     st.markdown("#### Projekt: " + st.session_state.project)
@@ -40,15 +42,16 @@ else:
         "durch einen automatisierten Autoencoder-Filterungsprozess gefiltert werden."
     )
 
-    if os.path.exists(folder_path + "/data_filtered.pkl"):
+    if store.exists("data_filtered"):
         st.error(
             "Der Datensatz wurde bereits gefiltert. Erneutes Filtern überschreibt die vorhandenen Daten."
         )
 
-    tab_label, tab_autoencoder, tab_no_filter, tab_raw = st.tabs(
+    tab_label, tab_autoencoder, tab_combine, tab_no_filter, tab_raw = st.tabs(
         [
             "Filtern nach Label",
             "Filtern durch Autoencoder",
+            "Filter kombinieren",
             "Ohne Filtern speichern",
             "Rohdaten ansehen",
         ]
@@ -67,10 +70,13 @@ else:
             index=None,
         )
         if label_to_filter and st.button("Daten filtern und speichern", type="primary"):
-            filtered_data = st.session_state.dataframe[
+            selection = RowSelection(
                 st.session_state.dataframe[label_to_filter] == True
-            ].copy()
-            filtered_data.to_pickle(folder_path + "/data_filtered.pkl")
+            )
+            filtered_data = selection.apply(st.session_state.dataframe)
+            store.save_selection(f"label_{label_to_filter}", selection)
+            # Stored as a delta: row positions plus the columns added in this session (e.g. normalized curves)
+            store.save_stage("data_filtered", filtered_data)
             with st.status("Daten werden gespeichert...", expanded=True) as status:
                 st.write("Daten filtern...")
                 time.sleep(1)
@@ -82,9 +88,7 @@ else:
                 )
 
             st.markdown("#### Daten vor dem Filtern")
-            broken_data = st.session_state.dataframe[
-                st.session_state.dataframe[label_to_filter] == False
-            ].copy()
+            broken_data = (~selection).apply(st.session_state.dataframe)
             st.plotly_chart(
                 plot_random_iv_curves(broken_data, "Current", "Voltage", 5),
                 use_container_width=True,
@@ -105,17 +109,20 @@ else:
             "Filtern verwendet werden."
         )
         model_directory = os.path.join(os.getcwd(), "autoencoder_training")
-        model_files = [f for f in os.listdir(model_directory) if f.endswith(".keras")]
+        # .npz models (NumPy export of a .keras model) are used without TensorFlow
+        model_files = [
+            f for f in os.listdir(model_directory) if f.endswith((".keras", ".npz"))
+        ]
         selected_model_file = st.selectbox(
             "Gespeichertes Model auswählen", model_files, index=0
         )
 
         if st.button("Model auswählen"):
             model_path = os.path.join(model_directory, selected_model_file)
-            loaded_model = load_model(model_path)
-            st.session_state["loaded_model"] = loaded_model
+            # Loaded once per process and shared by all sessions (TensorFlow is only imported for .keras models)
+            st.session_state["loaded_model"] = get_model(model_path)
             st.session_state["model_name"] = selected_model_file
-            print(load_model)
+            st.session_state["scores_key"] = None
 
         if st.session_state.loaded_model:
             st.info(f"Das Model {st.session_state.model_name} wurde geladen.")
@@ -137,9 +144,7 @@ else:
             )
             current_configured = False
             if current_column:
-                if not isinstance(
-                    st.session_state.dataframe.iloc[0][current_column], list
-                ):
+                if not is_curve_column(st.session_state.dataframe[current_column]):
                     st.error(
                         f"Die Daten in der Spalte **{current_column}** liegen nicht als Liste vor."
                     )
@@ -153,9 +158,7 @@ else:
             )
             voltage_configured = False
             if voltage_column:
-                if not isinstance(
-                    st.session_state.dataframe.iloc[0][voltage_column], list
-                ):
+                if not is_curve_column(st.session_state.dataframe[voltage_column]):
                     st.error(
                         f"Die Daten in der Spalte **{voltage_column}** liegen nicht als Liste vor."
                     )
@@ -177,6 +180,12 @@ else:
                         voltage_column_name=voltage_column,
                         number_of_steps=number_of_steps,
                     )
+                    st.session_state["scores_key"] = None
+                    store.save_curve_matrix(
+                        "Current_normalized",
+                        st.session_state.dataframe["Current_normalized"],
+                    )
+                    st.session_state["curve_matrix_project"] = st.session_state.project
                     tab1, tab2 = st.tabs(["Normalisierte IV-Kurven", "Rohdaten"])
                     with tab1:
                         st.markdown("#### Normalisierte IV-Kurven")
@@ -193,21 +202,34 @@ else:
             st.session_state.loaded_model
             and "Current_normalized" in st.session_state.dataframe.columns
         ):
-            X_new = np.array(
-                st.session_state.dataframe["Current_normalized"].tolist()
-            ).astype(np.float32)
-            reconstructed_new = st.session_state.loaded_model.predict(X_new)
-            st.session_state.dataframe["reconstruction"] = reconstructed_new.tolist()
-            errors = [
-                mean_squared_error(original, reconstructed) * 1000
-                for original, reconstructed in zip(X_new, reconstructed_new)
-            ]
-            st.session_state.dataframe["error"] = errors
-            if "sorted_df" not in st.session_state:
-                sorted_df = st.session_state.dataframe.sort_values(
-                    by="error", ascending=True
-                ).reset_index()
-                st.session_state["sorted_df"] = sorted_df
+            if st.session_state.get(
+                "curve_matrix_project"
+            ) == st.session_state.project and store.has_curve_matrix(
+                "Current_normalized"
+            ):
+                # Memory map written when the data of this project was normalized (deleted with the raw data)
+                X_new = store.curve_matrix("Current_normalized")
+            else:
+                X_new = curve_matrix(st.session_state.dataframe["Current_normalized"])
+            # Scores are computed once per model and dataset (also cached on disk), changing the threshold
+            # does not run the model again. The key covers the content of the curves, not only their shape.
+            model_path = os.path.join(model_directory, st.session_state.model_name)
+            score_cache = ScoreCache()
+            scores_key = score_cache.key(model_path, X_new)
+            if st.session_state.get("scores_key") != scores_key:
+                scores = score_cache.get(scores_key)
+                if scores is None:
+                    scores = score_curves(
+                        st.session_state.loaded_model,
+                        X_new,
+                        batch_size=st.session_state.loaded_model.batch_size,
+                    )
+                    score_cache.put(scores_key, scores)
+                st.session_state.dataframe["error"] = scores["error"].to_numpy()
+                st.session_state["sorted_errors"] = pd.DataFrame(
+                    {"error": np.sort(scores["error"].to_numpy())}
+                )
+                st.session_state["scores_key"] = scores_key
 
             st.markdown("#### Reconstruction Fehler als Filter-Parameter")
             st.markdown(
@@ -220,8 +242,8 @@ else:
             )
 
             fig = px.scatter(
-                st.session_state.sorted_df,
-                x=st.session_state.sorted_df.index,
+                st.session_state.sorted_errors,
+                x=st.session_state.sorted_errors.index,
                 y="error",
                 title="Reconstruction Fehler aller IV-Kurven (aufsteigend)",
                 labels={
@@ -239,13 +261,14 @@ else:
                 value=float(min_error),
             )
             if threshold and st.button("Filtern und speichern"):
-                below_threshold = st.session_state.dataframe[
+                selection = RowSelection(
                     st.session_state.dataframe["error"] <= threshold
-                ]
-                above_threshold = st.session_state.dataframe[
-                    st.session_state.dataframe["error"] > threshold
-                ]
-                below_threshold.to_pickle(folder_path + "/data_filtered.pkl")
+                )
+                below_threshold = selection.apply(st.session_state.dataframe)
+                above_threshold = (~selection).apply(st.session_state.dataframe)
+                store.save_selection("autoencoder", selection)
+                # Stored as a delta: row positions plus error and the normalized curves
+                store.save_stage("data_filtered", below_threshold)
                 with st.status("Daten werden gespeichert...", expanded=True) as status:
                     st.write("Daten filtern...")
                     time.sleep(1)
@@ -256,9 +279,7 @@ else:
                         expanded=False,
                     )
 
-                sorted_df = st.session_state.dataframe.sort_values(
-                    by="error", ascending=True
-                ).reset_index()
+                sorted_df = st.session_state.sorted_errors.copy()
                 sorted_df["above_threshold"] = sorted_df["error"] > threshold
 
                 fig = px.scatter(
@@ -290,6 +311,40 @@ else:
                         samples=10,
                     )
                     st.plotly_chart(above, use_container_width=True)
+    with tab_combine:
+        st.markdown("#### Filter kombinieren")
+        st.markdown(
+            "Jedes Filterergebnis wird als Auswahl der Zeilen (Bitmaske) der Rohdaten gespeichert. Gespeicherte "
+            "Filter können hier miteinander kombiniert werden, ohne die Daten erneut zu filtern."
+        )
+        saved_selections = store.selections()
+        if not saved_selections:
+            st.info("Es wurden noch keine Filter gespeichert.")
+        else:
+            selected_filters = st.multiselect("Filter auswählen", saved_selections)
+            combination = st.radio(
+                "Verknüpfung",
+                [
+                    "UND (in allen Filtern enthalten)",
+                    "ODER (in einem Filter enthalten)",
+                ],
+            )
+            if selected_filters:
+                selections = [store.load_selection(name) for name in selected_filters]
+                combined = selections[0]
+                for selection in selections[1:]:
+                    if combination.startswith("UND"):
+                        combined = combined & selection
+                    else:
+                        combined = combined | selection
+                st.metric(
+                    "Ausgewählte IV-Kurven",
+                    f"{combined.count} von {combined.n_rows}",
+                    border=True,
+                )
+                if st.button("Kombinierten Filter speichern", type="primary"):
+                    store.save_stage("data_filtered", combined)
+                    st.success("Daten erfolgreich gespeichert.")
     with tab_no_filter:
         st.markdown("#### Speichern ohne zu Filtern")
         st.markdown(
@@ -297,7 +352,7 @@ else:
             "Daten bereits in gefilterter Form vorliegen."
         )
         if st.button("Daten ohne Filtern speichern", type="primary"):
-            st.session_state.dataframe.to_pickle(folder_path + "/data_filtered.pkl")
+            store.save_stage("data_filtered", st.session_state.dataframe)
             with st.status("Daten werden gespeichert...", expanded=True) as status:
                 st.write("Daten werden nicht gefiltert...")
                 time.sleep(1)
@@ -9,6 +9,7 @@ from dotenv import load_dotenv
 
 from tools.forecast import get_pvnode_forecast
 from tools.helper import count_pmpp_pairs, schedule_measurements
+from tools.project_store import ProjectStore
 from measurements.pvpm import measure_iv_curve, get_usb_ports
 from measurements.sma import start_ivcurve
 
@@ -102,14 +103,14 @@ else:
 
     # 1. Projekt laden
     projects_dir = os.path.join(os.getcwd(), "projects")
-    folder_path = os.path.join(projects_dir, st.session_state.project)
+    store = ProjectStore(st.session_state.project, projects_dir)
 
-    if not os.path.exists(folder_path + "/matrix.pkl"):
+    if not store.exists("matrix"):
         st.error("Für dieses Projekt liegen noch keine Ergebnismatrix vor.")
         if st.button("Zurück zur Übersicht"):
             st.switch_page("pages/project_overview.py")
     else:
-        matrix = pd.read_pickle(folder_path + "/matrix.pkl")
+        matrix = store.load_table("matrix")
         st.markdown("#### Ergebnismatrix nach DIN EN 61853-1")
         st.dataframe(matrix, width=2000)
 
@@ -117,7 +118,7 @@ else:
     st.markdown("#### Anzahl an Messungen für die Ergebnismatrix")
     g_values = [100, 200, 400, 500, 600, 800, 1000, 1100]
     t_values = [15, 25, 45, 50, 75]
-    data = pd.read_pickle(folder_path + "/data_effective.pkl")
+    data = store.load("data_effective", ["G_eff", "T_eff", "Pmpp"])
     spatial_data = count_pmpp_pairs(data, g_values, t_values).transpose()
     df = pd.DataFrame(spatial_data, columns=[0, 1, 2, 3, 4])
     df["Pmpp / W"] = [
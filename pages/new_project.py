@@ -4,7 +4,8 @@ import pandas as pd
 import streamlit as st
 import plotly.graph_objects as go
 from tools.helper import extract_curve_parameters, plot_random_iv_curves
-
+from tools.curves import CurveArray, is_curve_column
+from tools.project_store import ProjectStore
 
 if "project" not in st.session_state:
     st.session_state["project"] = None
@@ -63,7 +64,7 @@ elif title and title not in projekte:
             )
             current_configured = False
             if current_column:
-                if not isinstance(dataframe.iloc[0][current_column], list):
+                if not is_curve_column(dataframe[current_column]):
                     st.error(
                         f"Die Daten in der Spalte **{current_column}** liegen nicht als Liste vor."
                     )
@@ -78,7 +79,7 @@ elif title and title not in projekte:
             )
             voltage_configured = False
             if voltage_column:
-                if not isinstance(dataframe.iloc[0][voltage_column], list):
+                if not is_curve_column(dataframe[voltage_column]):
                     st.error(
                         f"Die Daten in der Spalte **{voltage_column}** liegen nicht als Liste vor."
                     )
@@ -110,7 +111,13 @@ elif title and title not in projekte:
                     # Extract curve params
                     dataframe = extract_curve_parameters(dataframe)
 
-                    dataframe.to_pickle(os.path.join(folder_path, "data.pkl"))
+                    # Store the curves in a shared float32 buffer instead of Python lists
+                    for column in ["Current", "Voltage"]:
+                        dataframe[column] = CurveArray.from_column(
+                            dataframe[column]
+                        ).to_column(dataframe.index)
+
+                    ProjectStore(title, projects_dir).save_data(dataframe)
 
                     with st.status(
                         "Projekt wird erstellt...", expanded=False
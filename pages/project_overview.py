@@ -1,10 +1,9 @@
 import os
 
-import pandas as pd
 import streamlit as st
 
 from tools.helper import plot_random_iv_curves
-
+from tools.project_store import ProjectStore
 
 if "project" not in st.session_state:
     st.session_state["project"] = None
@@ -15,7 +14,7 @@ if not st.session_state.project:
 else:
     st.title(st.session_state.project)
     projects_dir = os.path.join(os.getcwd(), "projects")
-    folder_path = os.path.join(projects_dir, st.session_state.project)
+    store = ProjectStore(st.session_state.project, projects_dir)
 
     st.markdown(
         "Mit dem Selbstreferenzierungsalgorithmus (SRA) kann die Leistung eines PV-Strings unter Freifeldbedingungen "
@@ -23,15 +22,9 @@ else:
         "zeitgleich gemessenen Betriebsbedingungen."
     )
 
-    data_is_filtered = (
-        True if os.path.exists(folder_path + "/data_filtered.pkl") else False
-    )
-    effective_data_is_calculated = (
-        True if os.path.exists(folder_path + "/data_effective.pkl") else False
-    )
-    power_matrix_is_calculated = (
-        True if os.path.exists(folder_path + "/matrix.pkl") else False
-    )
+    data_is_filtered = store.exists("data_filtered")
+    effective_data_is_calculated = store.exists("data_effective")
+    power_matrix_is_calculated = store.exists("matrix")
     checkliste = st.container(border=True)
     with checkliste:
         st.markdown("#### Checkliste zur Projektbearbeitung")
@@ -73,24 +66,18 @@ else:
     if power_matrix_is_calculated:
         st.markdown("## Projekt-Ergebnisse")
 
-        power_matrix = pd.read_pickle(folder_path + "/matrix.pkl")
-        single_module_matrix = pd.read_pickle(folder_path + "/single_matrix.pkl")
-        power_degradation_matrix = pd.read_pickle(
-            folder_path + "/degradation_matrix.pkl"
-        )
+        power_matrix = store.load_table("matrix")
+        single_module_matrix = store.load_table("single_matrix")
+        power_degradation_matrix = store.load_table("degradation_matrix")
 
         new_stc_string_power = power_matrix.loc["1000 W/m²", "25 °C"]
         new_stc_module_power = single_module_matrix.loc["1000 W/m²", "25 °C"]
         power_degradation = power_degradation_matrix.loc["1000 W/m²", "25 °C"]
 
-        current_matrix_is_calculated = (
-            True if os.path.exists(folder_path + "/current_matrix.pkl") else False
-        )
+        current_matrix_is_calculated = store.exists("current_matrix")
         if current_matrix_is_calculated:
-            current_matrix = pd.read_pickle(folder_path + "/current_matrix.pkl")
-            current_degradation_matrix = pd.read_pickle(
-                folder_path + "/current_degradation_matrix.pkl"
-            )
+            current_matrix = store.load_table("current_matrix")
+            current_degradation_matrix = store.load_table("current_degradation_matrix")
             new_stc_current = current_matrix.loc["1000 W/m²", "25 °C"]
             current_degradation = current_degradation_matrix.loc["1000 W/m²", "25 °C"]
 
@@ -0,0 +1,154 @@
+"""
+On-disk cache for the results of DataPipeline steps.
+
+Every column of the data carries a key. Input columns are keyed by a hash of their content, a column written by a
+step is keyed by the step key, which is a hash of the keys of the columns the step reads, the step function and
+its kwargs. A step result is therefore reused as long as nothing upstream of it changed, e.g. changing
+isc_calibrated of the irradiance step does not invalidate the normalization or the temperature step.
+"""
+
+import os
+import json
+import pickle
+import hashlib
+import inspect
+import threading
+import pandas as pd
+from typing import Dict, Iterable, Optional
+
+from tools.curves import CurveArray, is_curve_column
+
+
+def _digest(*parts) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def column_key(step_key: str, column: str) -> str:
+    """Key of a column written by a step."""
+    return _digest(step_key, column)
+
+
+def column_fingerprint(column: pd.Series) -> str:
+    """
+    ## Content hash of a DataFrame column
+
+    Covers the index, the dtype and the values. Curve columns (lists or arrays per cell) are hashed through their
+    CurveArray buffer.
+    """
+    index = pd.util.hash_pandas_object(column.index).to_numpy().tobytes()
+    if is_curve_column(column):
+        curves = CurveArray.from_column(column, dtype=None)
+        values = curves.values.tobytes() + curves.offsets.tobytes()
+        return _digest(index, "curves", curves.dtype, values)
+    try:
+        values = pd.util.hash_pandas_object(column, index=False).to_numpy().tobytes()
+    except TypeError:
+        values = pickle.dumps(column.tolist())
+    return _digest(index, column.dtype, values)
+
+
+def data_fingerprint(data: pd.DataFrame) -> Dict[str, str]:
+    """Fingerprint of every column of a DataFrame, see column_fingerprint."""
+    return {col: column_fingerprint(data[col]) for col in data.columns}
+
+
+def function_identity(function) -> str:
+    """Module, name and (if available) source code of a step function, so a changed function is a new key."""
+    name = f"{getattr(function, '__module__', '')}.{getattr(function, '__qualname__', repr(function))}"
+    try:
+        source = inspect.getsource(function)
+    except (OSError, TypeError):
+        source = ""
+    return _digest(name, source)
+
+
+def step_key(step, column_keys: Dict[str, str], columns: Optional[Iterable[str]]):
+    """
+    ## Cache key of a step
+
+    Input Arguments:
+    - step (ProcessingStep): The step
+    - column_keys (dict): Key of every column of the current data
+    - columns: The columns the step reads, None for all columns
+
+    Returns:
+    - str, hex digest
+    """
+    columns = sorted(column_keys) if columns is None else list(columns)
+    kwargs = json.dumps(step.kwargs or {}, sort_keys=True, default=repr)
+    return _digest(
+        function_identity(step.function),
+        kwargs,
+        step.outputs,
+        *(f"{col}={column_keys[col]}" for col in columns),
+    )
+
+
+class StepCache:
+    """
+    ## Size-bounded on-disk cache for step results
+
+    Results are stored as pickles named by their key. Reading a result updates its modification time, if the cache
+    gets larger than max_bytes the least recently used results are deleted.
+
+    Input Arguments:
+    - directory (str): Folder of the cache, created if needed
+    - max_bytes (int): Size limit of the folder. Default 2 GB.
+    """
+
+    def __init__(self, directory, max_bytes=2 * 1024**3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key) -> Optional[pd.DataFrame]:
+        """Return the cached result or None."""
+        path = self._path(key)
+        try:
+            result = pd.read_pickle(path)
+            os.utime(path)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        return result
+
+    def put(self, key, result: pd.DataFrame) -> None:
+        """Store a result and evict old results if the cache is too large."""
+        path = self._path(key)
+        temporary = f"{path}.{threading.get_ident()}.tmp"
+        result.to_pickle(temporary)
+        os.replace(temporary, path)
+        self.evict()
+
+    def evict(self) -> None:
+        """Delete the least recently used results until the cache fits into max_bytes."""
+        with self._lock:
+            entries = []
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith(".pkl"):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def clear(self) -> None:
+        """Delete all cached results."""
+        with self._lock:
+            for name in os.listdir(self.directory):
+                if name.endswith(".pkl"):
+                    os.remove(os.path.join(self.directory, name))
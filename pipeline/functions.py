@@ -5,41 +5,126 @@ Helper functions for working specifically with the DataPipeline.
 import numpy as np
 import pandas as pd
 
+from tools.curves import CurveArray
+
 
 def normalize_curve_data(
     data: pd.DataFrame,
     current_column_name: str = "Current",
     voltage_column_name: str = "Voltage",
     number_of_steps: int = 100,
-) -> pd.DataFrame:
+    return_matrix: bool = False,
+):
     """
     ## Normalize Curve Data
 
+    All curves are normalized in one batch: every curve is divided by its maximum and then interpolated onto
+    `np.linspace(0, 1, number_of_steps)`. The result is identical to calling `np.interp` per curve.
+
     Input Arguments:
     - data (pandas DataFrame): DataFrame that needs the rows **Isc** and **G_mod** (GTI).
     - current_column_name (str): Name of the column with Current values. Default "Current".
     - voltage_column_name (str): Name of the column with Voltage values. Default "Voltage.
     - number_of_steps (int): How many steps (on the x-axis) to use for the normalization. Default 100.
+    - return_matrix (bool): Also return the normalized currents as a 2D float32 array. Default False.
 
     Returns:
-    - pandas DataFrame with added columns **Current_normalized** and **Voltage_normalized**
+    - pandas DataFrame with added columns **Current_normalized** and **Voltage_normalized**. Both columns are
+    backed by a CurveArray, use `curve_matrix(df["Current_normalized"])` to get them as a 2D array without copying.
+    - (only if return_matrix) np.ndarray with shape (number of curves, number_of_steps) and dtype float32
     """
     df = data.copy()
-    list_values = np.linspace(0, 1, number_of_steps).tolist()
+    currents = CurveArray.from_column(df[current_column_name], dtype=np.float64)
+    voltages = CurveArray.from_column(df[voltage_column_name], dtype=np.float64)
+    if not np.array_equal(currents.lengths, voltages.lengths):
+        raise ValueError("Current and voltage curves must have the same lengths")
+    list_values = np.linspace(0, 1, number_of_steps)
 
-    df.loc[:, "Voltage_standardized"] = [list_values for _ in range(len(df))]
-    df.loc[:, "Current_normalized"] = df[current_column_name].apply(
-        lambda x: [i / max(x) for i in x]
+    current_normalized = currents.values / np.repeat(
+        currents.row_max(), currents.lengths
     )
-    df.loc[:, "Voltage_normalized"] = df[voltage_column_name].apply(
-        lambda x: [i / max(x) for i in x]
+    voltage_normalized = voltages.values / np.repeat(
+        voltages.row_max(), voltages.lengths
     )
-    df.loc[:, "Current_normalized"] = df.apply(
-        lambda row: np.interp(
-            list_values, row["Voltage_normalized"], row["Current_normalized"]
-        ),
-        axis=1,
+    interpolated = interpolate_curves(
+        list_values,
+        CurveArray(voltage_normalized, voltages.offsets),
+        CurveArray(current_normalized, currents.offsets),
     )
-    df.loc[:, "Voltage_normalized"] = df["Voltage_standardized"]
-    df = df.drop(columns=["Voltage_standardized"])
+
+    df["Current_normalized"] = CurveArray.from_matrix(interpolated).to_column(df.index)
+    df["Voltage_normalized"] = CurveArray.from_matrix(
+        np.broadcast_to(list_values, interpolated.shape)
+    ).to_column(df.index)
+    if return_matrix:
+        return df, interpolated.astype(np.float32)
     return df
+
+
+def interpolate_curves(x, xp: CurveArray, fp: CurveArray) -> np.ndarray:
+    """
+    ## Batched version of np.interp
+
+    Interpolates every curve `(xp[i], fp[i])` at the same points x. Works for curves of different lengths without
+    padding. Curves whose xp values are not strictly increasing (e.g. noisy voltages near 0) are passed to np.interp
+    one by one, so the result is the same as np.interp for every curve.
+
+    Input Arguments:
+    - x (np.ndarray): Increasing points to evaluate, shared by all curves
+    - xp (CurveArray): x-coordinates of the curves
+    - fp (CurveArray): y-coordinates of the curves, same lengths as xp
+
+    Returns:
+    - np.ndarray with shape (number of curves, len(x)), same values as np.interp per curve
+    """
+    x = np.asarray(x, dtype=np.float64)
+    xp_values = xp.values.astype(np.float64, copy=False)
+    fp_values = fp.values.astype(np.float64, copy=False)
+    n_curves, n_points = len(xp), len(x)
+    starts, lengths = xp.starts, xp.lengths
+
+    # Number of xp values <= x[j] per curve: every xp value is counted at the first grid point it does not
+    # exceed, the cumulative sum over the grid then gives the searchsorted position for all curves at once.
+    first_grid_point = np.searchsorted(x, xp_values, side="left")
+    counts = np.bincount(
+        xp.row_ids() * (n_points + 1) + first_grid_point,
+        minlength=n_curves * (n_points + 1),
+    ).reshape(n_curves, n_points + 1)
+    j = np.cumsum(counts, axis=1)[:, :n_points] - 1
+
+    # Same case distinction as np.interp: left of the curve, right of the curve, exact hit, in between
+    last = (lengths - 1)[:, None]
+    left = j < 0
+    right = j >= last
+    inner = np.clip(j, 0, np.maximum(last - 1, 0))
+    position = starts[:, None] + inner
+    x0, x1 = (
+        xp_values[position],
+        xp_values[np.minimum(position + 1, len(xp_values) - 1)],
+    )
+    y0, y1 = (
+        fp_values[position],
+        fp_values[np.minimum(position + 1, len(fp_values) - 1)],
+    )
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (y1 - y0) / (x1 - x0)
+        result = slope * (x - x0) + y0
+        retry = np.isnan(result)
+        if np.any(retry):
+            fallback = slope * (x - x1) + y1
+            fallback = np.where(np.isnan(fallback) & (y0 == y1), y0, fallback)
+            result = np.where(retry, fallback, result)
+    result = np.where(x0 == x, y0, result)
+    result = np.where(left, fp_values[starts][:, None], result)
+    result = np.where(right, fp_values[starts + lengths - 1][:, None], result)
+
+    # The batched search above assumes sorted xp, np.interp gives its own (unspecified) values for the others
+    not_increasing = ~(np.diff(xp_values) > 0)
+    boundaries = starts[1:] - 1  # steps from one curve to the next
+    not_increasing[
+        boundaries[(boundaries >= 0) & (boundaries < len(not_increasing))]
+    ] = False
+    for i in np.unique(xp.row_ids()[1:][not_increasing]):
+        result[i] = np.interp(x, xp[i], fp[i])
+    return result
@@ -0,0 +1,269 @@
+"""
+Row-sharded execution of row-local DataPipeline steps in a process pool.
+
+The input frame is written once into shared memory (numeric columns as arrays, curve columns as CurveArray value
+and offset buffers). Every worker reads its row range from shared memory, runs the steps and writes its result into
+new shared memory blocks. Only the block names and the layout are pickled between the processes, not the frames.
+Columns that cannot be stored as arrays (strings, categories, ...) are pickled per row range into a shared memory
+block as a fallback, so every worker only unpickles the rows of its shard.
+"""
+
+import pickle
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import List
+
+from tools.curves import CurveArray, is_curve_column
+
+
+def _is_array_dtype(dtype) -> bool:
+    return isinstance(dtype, np.dtype) and dtype.kind in "biufcmM"
+
+
+class SharedFrame:
+    """
+    ## DataFrame stored in shared memory blocks
+
+    The object itself only holds the layout and the block names, so it is cheap to pickle. Use `to_frame()` in any
+    process to read (a row range of) the frame back and `release()` in the creating process when it is no longer
+    needed.
+
+    Input Arguments:
+    - data (pd.DataFrame): Frame to store
+    - bounds (list of int, optional): Row ranges that are read separately (the shard bounds). Columns without an
+    array layout are pickled per range. Default: one range over all rows.
+    """
+
+    def __init__(self, data: pd.DataFrame, bounds=None):
+        self.blocks = {}
+        self.n_rows = len(data)
+        self.bounds = [0, self.n_rows] if bounds is None else [int(b) for b in bounds]
+        try:
+            self.columns = [(col, self._store(data[col])) for col in data.columns]
+            self.index = self._store(pd.Series(data.index))
+        except BaseException:
+            self.release()
+            raise
+        self.index_name = data.index.name
+
+    def _share(self, values: np.ndarray):
+        """Copy an array into a new shared memory block, returns (name, dtype, shape)."""
+        values = np.ascontiguousarray(values)
+        block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, values.dtype, buffer=block.buf)[...] = values
+        self.blocks[block.name] = block
+        return block.name, values.dtype.str, values.shape
+
+    def _store(self, column: pd.Series):
+        if _is_array_dtype(column.dtype):
+            return "array", self._share(column.to_numpy())
+        if column.dtype == object and is_curve_column(column):
+            try:
+                first = column.iloc[0]
+                dtype = first.dtype if isinstance(first, np.ndarray) else np.float64
+                curves = CurveArray.from_column(column, dtype=dtype)
+            except (TypeError, ValueError):
+                pass
+            else:
+                return "curves", (
+                    self._share(curves.values),
+                    self._share(curves.offsets),
+                )
+        chunks = [
+            pickle.dumps(column.iloc[start:stop], protocol=pickle.HIGHEST_PROTOCOL)
+            for start, stop in zip(self.bounds[:-1], self.bounds[1:])
+        ]
+        byte_offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+        np.cumsum([len(chunk) for chunk in chunks], out=byte_offsets[1:])
+        data = np.frombuffer(b"".join(chunks), dtype=np.uint8)
+        return "object", (self._share(data), byte_offsets, self.bounds)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["blocks"] = {}
+        return state
+
+    def read(self, start=0, stop=None):
+        """Copy rows [start, stop) out of shared memory, returns (dict of column values, index values)."""
+        stop = self.n_rows if stop is None else stop
+        with _Attached() as attached:
+            columns = {
+                col: _read(attached, kind, spec, start, stop)
+                for col, (kind, spec) in self.columns
+            }
+            index = _read(attached, *self.index, start, stop)
+        return columns, index
+
+    def to_frame(self, start=0, stop=None) -> pd.DataFrame:
+        """Read rows [start, stop) into a new DataFrame."""
+        return _build_frame(*self.read(start, stop), self.index_name)
+
+    def handover(self) -> None:
+        """Hand the blocks over to another process, which releases them (see release)."""
+        for block in self.blocks.values():
+            resource_tracker.unregister(block._name, "shared_memory")
+            block.close()
+        self.blocks = {}
+
+    def release(self) -> None:
+        """Free the shared memory blocks."""
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks = {}
+
+    def block_names(self) -> List[str]:
+        names = []
+        for _, (kind, spec) in self.columns + [(None, self.index)]:
+            if kind == "array":
+                names.append(spec[0])
+            elif kind == "object":
+                names.append(spec[0][0])
+            elif kind == "curves":
+                names.extend([spec[0][0], spec[1][0]])
+        return names
+
+
+class _Attached:
+    """Attach to shared memory blocks by name and close them again on exit."""
+
+    def __init__(self):
+        self.blocks = {}
+
+    def array(self, spec):
+        name, dtype, shape = spec
+        if name not in self.blocks:
+            self.blocks[name] = shared_memory.SharedMemory(name=name)
+        return np.ndarray(shape, np.dtype(dtype), buffer=self.blocks[name].buf)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        for block in self.blocks.values():
+            block.close()
+
+
+def _read(attached: _Attached, kind, spec, start, stop):
+    """Copy rows [start, stop) of one stored column, curves are returned as a CurveArray."""
+    if kind == "array":
+        return attached.array(spec)[start:stop].copy()
+    if kind == "curves":
+        values, offsets = attached.array(spec[0]), attached.array(spec[1])
+        first, last = int(offsets[start]), int(offsets[stop])
+        return CurveArray(values[first:last].copy(), offsets[start : stop + 1] - first)
+    # Unpickle only the row ranges that overlap [start, stop)
+    data, byte_offsets, bounds = spec
+    buffer = attached.array(data)
+    parts = []
+    for i in range(len(bounds) - 1):
+        if bounds[i + 1] <= start or bounds[i] >= stop:
+            continue
+        chunk = pickle.loads(buffer[byte_offsets[i] : byte_offsets[i + 1]].tobytes())
+        parts.append(chunk.iloc[max(start - bounds[i], 0) : stop - bounds[i]])
+    if not parts:
+        return pd.Series([], dtype=object).array
+    return pd.concat(parts).array
+
+
+def _build_frame(columns, index, index_name) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            col: (
+                values.to_column().to_numpy()
+                if isinstance(values, CurveArray)
+                else values
+            )
+            for col, values in columns.items()
+        },
+        index=pd.Index(index, name=index_name),
+    )
+
+
+def _concat(parts):
+    """Concatenate the values of one column from several shards."""
+    if isinstance(parts[0], CurveArray):
+        offsets = [parts[0].offsets]
+        for part in parts[1:]:
+            offsets.append(part.offsets[1:] + offsets[-1][-1])
+        return CurveArray(
+            np.concatenate([part.values for part in parts]), np.concatenate(offsets)
+        )
+    if isinstance(parts[0], np.ndarray):
+        return np.concatenate(parts)
+    return pd.concat([pd.Series(part) for part in parts], ignore_index=True).array
+
+
+def concat_shared_frames(frames: List[SharedFrame]) -> pd.DataFrame:
+    """
+    ## Reassemble shards into one DataFrame
+
+    Columns are concatenated as arrays, curve columns end up in one shared CurveArray buffer again.
+    """
+    parts = [frame.read() for frame in frames]
+    columns = {col: _concat([part[0][col] for part in parts]) for col in parts[0][0]}
+    index = _concat([part[1] for part in parts])
+    return _build_frame(columns, index, frames[0].index_name)
+
+
+def release_blocks(names) -> None:
+    """Free shared memory blocks that were handed over by another process."""
+    for name in names:
+        block = shared_memory.SharedMemory(name=name)
+        block.close()
+        block.unlink()
+
+
+def _run_shard(job):
+    """Worker: run the steps on one row range of the shared input and return the result as a SharedFrame."""
+    from .pipe import DataPipeline
+
+    steps, shared, start, stop = job
+    pipeline = DataPipeline(max_workers=1)
+    for step in steps:
+        pipeline.add_step(step)
+    result = SharedFrame(pipeline.process(shared.to_frame(start, stop)))
+    result.handover()
+    return result
+
+
+def process_sharded(steps, data: pd.DataFrame, n_processes, n_shards=None):
+    """
+    ## Run row-local steps on row shards in a process pool
+
+    Input Arguments:
+    - steps (list of ProcessingStep): Row-local steps, the functions must be importable (no lambdas)
+    - data (pd.DataFrame): Input data
+    - n_processes (int): Number of worker processes
+    - n_shards (int, optional): Number of row shards. Default n_processes.
+
+    Returns:
+    - pd.DataFrame, the shards reassembled in the original row order
+    """
+    n_shards = min(n_shards or n_processes, max(len(data), 1))
+    bounds = np.linspace(0, len(data), n_shards + 1).astype(int)
+    shared = SharedFrame(data, bounds)
+    results = []
+    try:
+        jobs = [
+            (steps, shared, int(start), int(stop))
+            for start, stop in zip(bounds[:-1], bounds[1:])
+        ]
+        error = None
+        with ProcessPoolExecutor(max_workers=n_processes) as executor:
+            futures = [executor.submit(_run_shard, job) for job in jobs]
+            # Every finished shard is collected, also if another one fails, so its blocks are freed below
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    error = error or e
+        if error is not None:
+            raise error
+        return concat_shared_frames(results)
+    finally:
+        shared.release()
+        for result in results:
+            release_blocks(result.block_names())
@@ -3,9 +3,12 @@ Overall structure of the DataPipeline
 """
 
 import pandas as pd
-from functools import reduce
-from typing import List, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Set
 from .steps import ProcessingStep
+from .cache import StepCache, column_key, data_fingerprint, step_key
+from .profiling import StepProfiler
+from .parallel import process_sharded
 
 
 class DataPipeline:
@@ -13,27 +16,244 @@ class DataPipeline:
     ## DataPipeline -> Used to process the SRA step by step
 
     Import this, then add steps and finally process. **See main.py**.
+
+    Steps that declare their inputs and outputs (see ProcessingStep) form a dependency graph: a step waits for the
+    steps that write its inputs, independent steps run concurrently and only their output columns are merged into
+    the data. Steps without outputs are barriers and run in order, like in a plain sequential pipeline.
+
+    With a StepCache (see pipeline.cache) every step result is stored on disk and reused as long as the step, its
+    kwargs and the columns it reads did not change.
+
+    With a StepProfiler (see pipeline.profiling) wall time, CPU time, rows, bytes and optionally peak memory and a
+    cProfile of every step are recorded, `pipeline.profiler.report()` returns them after the run.
+
+    With n_processes > 1 the row-local steps run on row shards in a process pool (see pipeline.parallel), the other
+    steps run in this process on the reassembled data. The step cache and the profiler are not used in this mode.
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        cache: Optional[StepCache] = None,
+        profiler: Optional[StepProfiler] = None,
+        n_processes: Optional[int] = None,
+    ):
         self.steps: List[ProcessingStep] = []
         self.input_data: Any = None
         self.output_data: Any = None
+        self.max_workers = max_workers
+        self.cache = cache
+        self.profiler = profiler
+        self.n_processes = n_processes
 
     def add_step(self, step: ProcessingStep) -> None:
         """Adding a processing step."""
         self.steps.append(step)
 
+    def dependencies(self) -> Dict[int, Set[int]]:
+        """
+        ## Dependency graph of the steps
+
+        Returns:
+        - dict with the positions of the steps every step has to wait for
+        """
+        graph = {}
+        for i, step in enumerate(self.steps):
+            graph[i] = {j for j in range(i) if _depends_on(step, self.steps[j])}
+        return graph
+
+    def stages(self) -> List[List[int]]:
+        """
+        ## Steps grouped into stages
+
+        All steps of a stage only depend on steps of earlier stages and can run at the same time.
+        """
+        level = {}
+        for i, parents in self.dependencies().items():
+            level[i] = max((level[j] + 1 for j in parents), default=0)
+        stages = [[] for _ in range(max(level.values(), default=-1) + 1)]
+        for i, stage in level.items():
+            stages[stage].append(i)
+        return stages
+
     def process(self, input_data: pd.DataFrame) -> Any:
         """Process the pipe."""
         self.input_data = input_data
+        if self.n_processes is not None and self.n_processes > 1:
+            self.output_data = self._process_sharded(input_data)
+            return self.output_data
+        if self.profiler is not None:
+            self.profiler.reset()
+        column_keys = data_fingerprint(input_data) if self.cache is not None else None
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            self.output_data = self._run_stages(input_data, executor, column_keys)
+        return self.output_data
+
+    def stream(self, chunks: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        """
+        ## Process the pipe chunk by chunk
+
+        Generator version of process for data that does not fit into memory (see pipeline.stream for chunk readers).
+        Only one chunk is held at a time, so all steps must be row-local (ProcessingStep.row_local). The step cache
+        is not used.
+
+        Input Arguments:
+        - chunks: Iterable of DataFrames, e.g. read_parquet_chunks("data.parquet")
+
+        Returns:
+        - Generator of the processed chunks
+        """
+        not_row_local = [step.name for step in self.steps if not step.row_local]
+        if not_row_local:
+            raise ValueError(f"Steps are not row-local: {not_row_local}")
+        if self.profiler is not None:
+            self.profiler.reset()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for i, chunk in enumerate(chunks):
+                if self.profiler is not None:
+                    self.profiler.chunk = i
+                yield self._run_stages(chunk, executor, None)
+
+    def process_stream(
+        self, chunks: Iterable[pd.DataFrame], aggregators: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        ## Stream the chunks through the pipe and aggregate the results
+
+        Input Arguments:
+        - chunks: Iterable of DataFrames
+        - aggregators: dict of aggregators (see pipeline.stream), each gets every processed chunk
+
+        Returns:
+        - dict with the result of every aggregator
+        """
+        for chunk in self.stream(chunks):
+            for aggregator in aggregators.values():
+                aggregator.update(chunk)
+        return {name: aggregator.result() for name, aggregator in aggregators.items()}
 
-        def apply_step(data, step):
-            print(f"Executing step: {step.name}")
-            if step.kwargs is not None:
-                return step.function(data, **step.kwargs)
+    def _process_sharded(self, data: pd.DataFrame):
+        """Run consecutive row-local steps on row shards in a process pool, all other steps in this process."""
+        segments = []
+        for step in self.steps:
+            if segments and segments[-1][0] == step.row_local:
+                segments[-1][1].append(step)
             else:
-                return step.function(data)
+                segments.append((step.row_local, [step]))
 
-        self.output_data = reduce(apply_step, self.steps, input_data)
-        return self.output_data
+        for row_local, steps in segments:
+            if row_local:
+                data = process_sharded(steps, data, self.n_processes)
+            else:
+                pipeline = DataPipeline(max_workers=self.max_workers)
+                for step in steps:
+                    pipeline.add_step(step)
+                data = pipeline.process(data)
+        return data
+
+    def _run_stages(self, data: pd.DataFrame, executor, column_keys):
+        """Run all stages on the data, column_keys are the cache keys of the columns (None without cache)."""
+        data = data.copy(deep=False)
+        sequential = self.profiler is not None and self.profiler.sequential
+        for number, stage in enumerate(self.stages()):
+            steps = [self.steps[i] for i in stage]
+            keys = [self._step_key(step, column_keys) for step in steps]
+            jobs = [
+                lambda i=i, key=key: self._run_cached(i, number, key, data)
+                for i, key in zip(stage, keys)
+            ]
+            if len(jobs) == 1 or sequential:
+                results = [job() for job in jobs]
+            else:
+                results = list(executor.map(lambda job: job(), jobs))
+
+            for step, key, result in zip(steps, keys, results):
+                if step.is_barrier:
+                    data = result.copy(deep=False)
+                    if column_keys is not None:
+                        column_keys = {col: column_key(key, col) for col in data}
+                    continue
+                if not result.index.equals(data.index):
+                    raise ValueError(
+                        f"Step '{step.name}' changed the rows, use outputs=None for such steps"
+                    )
+                for col in step.outputs:
+                    data[col] = result[col]
+                    if column_keys is not None:
+                        column_keys[col] = column_key(key, col)
+        return data
+
+    def _step_key(self, step: ProcessingStep, column_keys):
+        """Cache key of a step, None without a cache."""
+        if column_keys is None:
+            return None
+        columns = None if step.is_barrier else step.inputs
+        missing = [col for col in columns or [] if col not in column_keys]
+        if missing:
+            raise ValueError(f"Missing required column for '{step.name}': {missing[0]}")
+        return step_key(step, column_keys, columns)
+
+    def _run_cached(self, position, stage, key, data: pd.DataFrame):
+        """Run a step or load its result from the cache."""
+        step = self.steps[position]
+        inputs = _step_inputs(step, data)
+        hit = False
+
+        def run():
+            nonlocal hit
+            if key is not None:
+                result = self.cache.get(key)
+                if result is not None:
+                    print(f"Using cached result: {step.name}")
+                    hit = True
+                    return result
+            return _run_step(step, inputs)
+
+        if self.profiler is None:
+            result = run()
+        else:
+            result, profile = self.profiler.run(step, position, stage, run, inputs)
+            profile.cached = hit
+        if hit:
+            return result
+
+        if not step.is_barrier:
+            for col in step.outputs:
+                if col not in result.columns:
+                    raise ValueError(f"Step '{step.name}' did not return column: {col}")
+        if key is not None:
+            self.cache.put(key, result if step.is_barrier else result[step.outputs])
+        return result
+
+
+def _step_inputs(step: ProcessingStep, data: pd.DataFrame):
+    """The data a step gets: only its input columns if they are declared, else all columns."""
+    if step.inputs is not None and not step.is_barrier:
+        for col in step.inputs:
+            if col not in data.columns:
+                raise ValueError(f"Missing required column for '{step.name}': {col}")
+        data = data[step.inputs]
+    return data
+
+
+def _run_step(step: ProcessingStep, data: pd.DataFrame):
+    """Run a single step."""
+    print(f"Executing step: {step.name}")
+    if step.kwargs is not None:
+        return step.function(data, **step.kwargs)
+    else:
+        return step.function(data)
+
+
+def _depends_on(step: ProcessingStep, earlier: ProcessingStep) -> bool:
+    """True if step has to run after the earlier step."""
+    if step.is_barrier or earlier.is_barrier:
+        return True
+    if step.inputs is None or earlier.inputs is None:
+        # Reads (or may read) every column
+        return True
+    writes, reads = set(step.outputs), set(step.inputs)
+    earlier_writes, earlier_reads = set(earlier.outputs), set(earlier.inputs)
+    return bool(
+        earlier_writes & reads or earlier_writes & writes or writes & earlier_reads
+    )
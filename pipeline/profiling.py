@@ -0,0 +1,200 @@
+"""
+Per-step instrumentation of the DataPipeline.
+
+Example:
+```python
+pipeline = DataPipeline(profiler=StepProfiler(memory=True))
+...
+result = pipeline.process(input_data)
+report = pipeline.profiler.report()
+print(report)  # totals per step, the bottleneck first
+report.to_csv("profile.csv")
+```
+"""
+
+import io
+import json
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+import pandas as pd
+from pydantic import BaseModel
+from typing import Callable, List, Optional
+
+
+class StepProfile(BaseModel):
+    """Measurements of one step execution."""
+
+    name: str
+    position: int
+    stage: int
+    chunk: int = 0
+    cached: bool = False
+    wall_time: float
+    cpu_time: float
+    peak_memory: Optional[int] = None
+    rows_in: int
+    rows_out: int
+    bytes_in: int
+    bytes_out: int
+    cprofile: Optional[str] = None
+
+
+def frame_bytes(data) -> int:
+    """Shallow memory usage of a DataFrame in bytes (object cells like curves are counted as pointers)."""
+    if isinstance(data, pd.DataFrame):
+        return int(data.memory_usage(index=True, deep=False).sum())
+    return 0
+
+
+def frame_rows(data) -> int:
+    return len(data) if isinstance(data, pd.DataFrame) else 0
+
+
+class PipelineReport:
+    """
+    ## Structured report of a profiled pipeline run
+
+    `to_frame()` has one row per step execution (one per chunk in streaming mode), `summary()` one row per step.
+    """
+
+    def __init__(self, profiles: List[StepProfile]):
+        self.profiles = sorted(profiles, key=lambda p: (p.chunk, p.position))
+
+    def to_frame(self) -> pd.DataFrame:
+        columns = list(StepProfile.model_fields)
+        return pd.DataFrame(
+            [profile.model_dump() for profile in self.profiles], columns=columns
+        )
+
+    def summary(self) -> pd.DataFrame:
+        """Totals per step, sorted by wall time (the bottleneck comes first)."""
+        frame = self.to_frame()
+        summary = frame.groupby(["position", "name"], sort=True).agg(
+            runs=("chunk", "size"),
+            cached=("cached", "sum"),
+            wall_time=("wall_time", "sum"),
+            cpu_time=("cpu_time", "sum"),
+            peak_memory=("peak_memory", "max"),
+            rows_in=("rows_in", "sum"),
+            rows_out=("rows_out", "sum"),
+            bytes_in=("bytes_in", "sum"),
+            bytes_out=("bytes_out", "sum"),
+        )
+        return summary.reset_index(level="position", drop=True).sort_values(
+            "wall_time", ascending=False
+        )
+
+    def bottleneck(self) -> Optional[str]:
+        """Name of the step with the largest total wall time."""
+        summary = self.summary()
+        return summary.index[0] if len(summary) else None
+
+    def to_json(self, path=None):
+        """Write the report as JSON (or return the string if path is None)."""
+        text = json.dumps([profile.model_dump() for profile in self.profiles], indent=2)
+        if path is None:
+            return text
+        with open(path, "w") as f:
+            f.write(text)
+
+    def to_csv(self, path):
+        """Write one row per step execution as CSV (without the cProfile text)."""
+        self.to_frame().drop(columns="cprofile").to_csv(path, index=False)
+
+    def __str__(self):
+        return self.summary().to_string()
+
+
+class StepProfiler:
+    """
+    ## Collects a StepProfile for every executed step
+
+    Wall time, CPU time (of the thread running the step), row counts and bytes are always measured.
+
+    Input Arguments:
+    - memory (bool): Measure the peak memory of every step with tracemalloc. Default False.
+    - cprofile (bool): Run every step under cProfile and keep the top functions as text. Default False.
+    - cprofile_lines (int): Number of functions in the cProfile text. Default 25.
+
+    tracemalloc measures the whole process, so with memory=True the steps of a stage run one after the other.
+    """
+
+    def __init__(self, memory=False, cprofile=False, cprofile_lines=25):
+        self.memory = memory
+        self.cprofile = cprofile
+        self.cprofile_lines = cprofile_lines
+        self.profiles: List[StepProfile] = []
+        self.chunk = 0
+        self._lock = threading.Lock()
+
+    @property
+    def sequential(self) -> bool:
+        """True if the steps of a stage must not run at the same time."""
+        return self.memory
+
+    def reset(self) -> None:
+        self.profiles = []
+        self.chunk = 0
+
+    def run(self, step, position, stage, function: Callable, data):
+        """
+        Run function() for the given step and record its measurements.
+
+        Returns:
+        - the result of function and the recorded StepProfile
+        """
+        profiler = cProfile.Profile() if self.cprofile else None
+        if self.memory:
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            result = function()
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            wall_time = time.perf_counter() - wall_start
+            cpu_time = time.thread_time() - cpu_start
+            peak_memory = None
+            if self.memory:
+                peak_memory = tracemalloc.get_traced_memory()[1] - baseline
+                if started_tracing:
+                    tracemalloc.stop()
+
+        cprofile_text = None
+        if profiler is not None:
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(
+                self.cprofile_lines
+            )
+            cprofile_text = stream.getvalue()
+
+        profile = StepProfile(
+            name=step.name,
+            position=position,
+            stage=stage,
+            chunk=self.chunk,
+            wall_time=wall_time,
+            cpu_time=cpu_time,
+            peak_memory=peak_memory,
+            rows_in=frame_rows(data),
+            rows_out=frame_rows(result),
+            bytes_in=frame_bytes(data),
+            bytes_out=frame_bytes(result),
+            cprofile=cprofile_text,
+        )
+        with self._lock:
+            self.profiles.append(profile)
+        return result, profile
+
+    def report(self) -> PipelineReport:
+        return PipelineReport(self.profiles)
@@ -1,10 +1,25 @@
 from pydantic import BaseModel
-from typing import Callable, Dict, Any
+from typing import Callable, Dict, Any, List, Optional
 
 
 class ProcessingStep(BaseModel):
-    """The structure of a pipeline step."""
+    """
+    The structure of a pipeline step.
+
+    - inputs: Columns the step reads. The step only gets these columns. None passes all columns.
+    - outputs: Columns the step adds or overwrites. Only these columns are merged back into the data. None marks
+    the step as a barrier (e.g. a filter that drops rows): it gets the full data and its result replaces it.
+    - row_local: The result of every row only depends on the row itself (true for normalization, temperature,
+    irradiance and label filters). Only row-local steps can be used with DataPipeline.stream.
+    """
 
     name: str
     function: Callable
     kwargs: Dict[str, Any] = None
+    inputs: Optional[List[str]] = None
+    outputs: Optional[List[str]] = None
+    row_local: bool = False
+
+    @property
+    def is_barrier(self) -> bool:
+        return self.outputs is None
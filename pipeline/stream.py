@@ -0,0 +1,140 @@
+"""
+Chunk readers and aggregators for the streaming mode of the DataPipeline.
+
+Example:
+```python
+chunks = read_parquet_chunks("data/measurements.parquet", batch_size=50_000)
+results = pipeline.process_stream(
+    chunks,
+    {
+        "bins": BinCountAggregator(G_VALUES, T_VALUES),
+        "fit": SurfaceStatisticsAggregator(anzahl_module=6),
+    },
+)
+results["fit"].fit(initial_stc_pmpp=320, initial_tkp=-0.38)
+```
+"""
+
+import os
+import glob
+import numpy as np
+import pandas as pd
+from typing import Iterator, List, Optional
+
+from sra.power import FIT_STATISTICS, solve_surface_fit, surface_fit_statistics
+from tools.helper import bin_pairs
+
+
+def read_parquet_chunks(
+    path, columns: Optional[List[str]] = None, batch_size: Optional[int] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    ## Read a Parquet file chunk by chunk
+
+    Input Arguments:
+    - path (str): Parquet file
+    - columns (list, optional): Only read these columns
+    - batch_size (int, optional): Rows per chunk. None yields one chunk per row group.
+
+    Returns:
+    - Generator of DataFrames
+    """
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path)
+    if batch_size is None:
+        for i in range(parquet_file.num_row_groups):
+            yield parquet_file.read_row_group(i, columns=columns).to_pandas()
+    else:
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+            yield batch.to_pandas()
+
+
+def read_file_chunks(
+    pattern, columns: Optional[List[str]] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    ## Read partitioned files one by one
+
+    Input Arguments:
+    - pattern (str): Folder or glob pattern, e.g. "data/2023-*.parquet". Files are read in sorted order.
+    - columns (list, optional): Only keep these columns
+
+    Returns:
+    - Generator of DataFrames, one per file (.parquet, .pkl or .csv)
+    """
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*")
+    paths = sorted(glob.glob(pattern))
+    if not paths:
+        raise FileNotFoundError(f"No files found: {pattern}")
+    for path in paths:
+        if path.endswith(".parquet"):
+            chunk = pd.read_parquet(path, columns=columns)
+        elif path.endswith(".pkl"):
+            chunk = pd.read_pickle(path)
+        elif path.endswith(".csv"):
+            chunk = pd.read_csv(path, usecols=columns)
+        else:
+            continue
+        yield chunk if columns is None else chunk[columns]
+
+
+class BinCountAggregator:
+    """
+    ## Bin counts of the G-T matrix over all chunks
+
+    Same counts as bin_pairs (count_pmpp_pairs / count_current_pairs) on the full data.
+    """
+
+    def __init__(
+        self,
+        g_values,
+        t_values,
+        target_column="Pmpp",
+        g_tol=75,
+        t_tol=10,
+        g_column="G_eff",
+        t_column="T_eff",
+    ):
+        self.g_values = g_values
+        self.t_values = t_values
+        self.kwargs = dict(
+            target_column=target_column,
+            g_tol=g_tol,
+            t_tol=t_tol,
+            g_column=g_column,
+            t_column=t_column,
+        )
+        self.counts = np.zeros((len(t_values), len(g_values)), dtype=np.int64)
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        self.counts += bin_pairs(chunk, self.g_values, self.t_values, **self.kwargs)
+
+    def result(self) -> np.ndarray:
+        return self.counts
+
+
+class SurfaceStatisticsAggregator:
+    """
+    ## Sufficient statistics of the power surface fit over all chunks
+
+    `fit()` gives the same result as fit_power_surface on the full data.
+    """
+
+    def __init__(self, anzahl_module):
+        self.anzahl_module = anzahl_module
+        self.statistics = np.zeros(len(FIT_STATISTICS))
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        self.statistics += surface_fit_statistics(chunk, self.anzahl_module)
+
+    def result(self):
+        return self
+
+    def fit(self, initial_stc_pmpp, initial_tkp, method="closed_form"):
+        """Solve the fit, see sra.power.solve_surface_fit."""
+        result = solve_surface_fit(
+            self.statistics, initial_stc_pmpp, initial_tkp, method
+        )
+        return {key: float(value) for key, value in result.items()}
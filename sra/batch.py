@@ -0,0 +1,269 @@
+"""
+Headless batch SRA for many strings or projects in one run.
+
+Runs temperature -> irradiance -> binning -> surface fit -> SRA matrix for every string in a process pool, for the
+power and (like the page betriebsbedingungen.py) for the current, and collects all matrices in one result store.
+Uses the same functions as the Streamlit pages.
+
+Example:
+```python
+configs = [StringConfig(string_id="WR1_String1", p_mpp=320, p_gamma=-0.38, anzahl_module=6,
+                        isc_calibrated=10.14, isc_alpha=0.06)]
+result = run_batch_sra(configs, data=long_table, output_dir="results/fleet")
+```
+
+With a process pool on Windows, call run_batch_sra inside an `if __name__ == "__main__":` block.
+"""
+
+import os
+import time
+import pandas as pd
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+
+from sra.temperature import (
+    cell_from_module_temperature,
+    module_from_ambient_temperature,
+)
+from sra.irradiance import effective_irradiance
+from sra.current import adjust_current_simple, fit_current_surface, sra_current_matrices
+from sra.matrix import G_VALUES, T_VALUES
+from sra.power import adjust_power_simple, calculate_sra_matrix, fit_power_surface
+from tools.helper import count_current_pairs, count_filled_bins, count_pmpp_pairs
+from tools.project_store import ProjectStore
+
+
+class StringConfig(BaseModel):
+    """Datasheet values and configuration of one string."""
+
+    string_id: str
+    p_mpp: float
+    p_gamma: float
+    anzahl_module: int
+    isc_calibrated: float
+    isc_alpha: float
+    module_type: str = "glass/glass"
+    mounting_type: str = "open_rack"
+
+
+def run_string_sra(data: pd.DataFrame, config: StringConfig, fit_method="closed_form"):
+    """
+    ## Run the SRA for a single string
+
+    Same steps as the pages betriebsbedingungen.py and analysis.py. If the data already contains T_eff or G_eff
+    the corresponding stage is skipped. The current matrix is fitted from Isc with the calibrated Isc and alpha as
+    initial values.
+
+    Input Arguments:
+    - data (pd.DataFrame): Measured data with Isc, Pmpp, G_mod and T_mod or T_amb
+    - config (StringConfig): Datasheet values of the string
+    - fit_method (str): "closed_form" or "joint", see sra.power.fit_power_surface
+
+    Returns:
+    - dict with the power matrix, the current matrix, the fit summary and the time per stage in seconds
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    if "T_eff" not in data.columns:
+        if "T_mod" not in data.columns:
+            data = module_from_ambient_temperature(
+                data.copy(), config.module_type, config.mounting_type
+            )
+        data = cell_from_module_temperature(
+            data, config.module_type, config.mounting_type
+        )
+    timings["temperature"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if "G_eff" not in data.columns:
+        data = effective_irradiance(data, config.isc_calibrated, config.isc_alpha)
+    timings["irradiance"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    is_filled = count_filled_bins(count_pmpp_pairs(data, G_VALUES, T_VALUES))
+    timings["binning"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    summary = {"string_id": config.string_id, "n": len(data), "is_filled": is_filled}
+    if is_filled:
+        fit = fit_power_surface(
+            data, config.p_mpp, config.p_gamma, config.anzahl_module, fit_method
+        )
+        p_mpp, p_gamma, correction_factor = fit["p_mpp"], fit["p_gamma"], 0
+        summary.update(rmse=fit["rmse"], r2=fit["r2"])
+    else:
+        p_mpp, p_gamma = config.p_mpp, config.p_gamma
+        correction_factor = adjust_power_simple(
+            data.copy(), p_mpp, p_gamma, config.anzahl_module
+        )
+    timings["fit"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matrix = calculate_sra_matrix(
+        p_mpp, p_gamma, config.anzahl_module, correction_factor
+    )
+    timings["matrix"] = time.perf_counter() - start
+
+    stc_power = matrix.loc["1000 W/m²", "25 °C"]
+    summary.update(
+        p_mpp=p_mpp,
+        p_gamma=p_gamma,
+        correction_factor=correction_factor,
+        stc_string_power=stc_power,
+        degradation_at_stc=(stc_power / (config.p_mpp * config.anzahl_module) - 1)
+        * 100,
+    )
+
+    start = time.perf_counter()
+    if count_filled_bins(count_current_pairs(data, G_VALUES, T_VALUES)):
+        fit = fit_current_surface(
+            data, config.isc_calibrated, config.isc_alpha, fit_method
+        )
+        isc_stc, isc_alpha, current_correction = fit["isc_stc"], fit["alpha"], 0
+    else:
+        isc_stc, isc_alpha = config.isc_calibrated, config.isc_alpha
+        current_correction = adjust_current_simple(data.copy(), isc_stc, isc_alpha)
+    timings["current_fit"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    current_matrix = sra_current_matrices(
+        isc_stc, isc_alpha, current_correction
+    ).to_frame()
+    timings["current_matrix"] = time.perf_counter() - start
+
+    stc_current = current_matrix.loc["1000 W/m²", "25 °C"]
+    summary.update(
+        isc_stc=isc_stc,
+        isc_alpha=isc_alpha,
+        current_correction_factor=current_correction,
+        current_degradation_at_stc=(stc_current / config.isc_calibrated - 1) * 100,
+    )
+    return {
+        "matrix": matrix,
+        "current_matrix": current_matrix,
+        "summary": summary,
+        "timings": timings,
+    }
+
+
+def load_project_data(project_name, projects_dir="projects", columns=None):
+    """
+    ## Load the data of a project for the batch SRA
+
+    Uses data_effective if it exists, otherwise data_filtered (see tools.project_store).
+
+    Input Arguments:
+    - project_name (str): Name of the project
+    - projects_dir (str): Directory with all projects. Default "projects".
+    - columns (list, optional): Only load these columns
+    """
+    store = ProjectStore(project_name, projects_dir)
+    for stage in ["data_effective", "data_filtered"]:
+        if store.exists(stage):
+            return store.load(stage, columns)
+    raise FileNotFoundError(f"No filtered data for project: {project_name}")
+
+
+def _run_job(job):
+    """Worker for the process pool. Loads the data if needed and catches errors per string."""
+    config, data, projects_dir, fit_method = job
+    start = time.perf_counter()
+    try:
+        if data is None:
+            data = load_project_data(config.string_id, projects_dir)
+        loaded = time.perf_counter()
+        result = run_string_sra(data, config, fit_method)
+        result["timings"] = {"load": loaded - start, **result["timings"]}
+    except Exception as e:
+        result = {
+            "matrix": None,
+            "current_matrix": None,
+            "summary": {"string_id": config.string_id, "error": str(e)},
+            "timings": {},
+        }
+    result["timings"]["total"] = time.perf_counter() - start
+    return result
+
+
+def _long_table(results, key, value_name):
+    """All matrices results[i][key] as one long table with string_id, G, T and value_name."""
+    matrices = []
+    for result in results:
+        if result[key] is None:
+            continue
+        matrix = result[key].stack().rename(value_name).reset_index()
+        matrix.columns = ["G", "T", value_name]
+        matrix.insert(0, "string_id", result["summary"]["string_id"])
+        matrices.append(matrix)
+    if not matrices:
+        return pd.DataFrame(columns=["string_id", "G", "T", value_name])
+    return pd.concat(matrices, ignore_index=True)
+
+
+def run_batch_sra(
+    configs: List[StringConfig],
+    data: Optional[pd.DataFrame] = None,
+    string_column="string_id",
+    projects_dir="projects",
+    output_dir=None,
+    n_workers=None,
+    fit_method="closed_form",
+) -> Dict[str, pd.DataFrame]:
+    """
+    ## Run the SRA for many strings in one go
+
+    Input Arguments:
+    - configs (list of StringConfig): One config per string
+    - data (pd.DataFrame, optional): One long table with all strings, identified by string_column. If None, the
+    data of every string is loaded from the project with the name string_id (see load_project_data).
+    - string_column (str): Column with the string id in data. Default "string_id".
+    - projects_dir (str): Directory with the projects. Default "projects".
+    - output_dir (str, optional): If given, matrices.parquet, current_matrices.parquet, summary.parquet and
+    timings.parquet are written into it.
+    - n_workers (int, optional): Number of worker processes. None uses all cores, 1 runs without a pool.
+    - fit_method (str): "closed_form" or "joint", see sra.power.fit_power_surface
+
+    Returns:
+    - dict with
+        - "matrices": long table with string_id, G, T and Pmpp of every matrix cell
+        - "current_matrices": long table with string_id, G, T and Isc of every current matrix cell
+        - "summary": one row per string with the fitted values, degradation and errors
+        - "timings": one row per string with the seconds per stage
+    """
+    if data is not None:
+        groups = dict(tuple(data.groupby(string_column, sort=False)))
+        jobs = [
+            (config, groups.get(config.string_id), projects_dir, fit_method)
+            for config in configs
+        ]
+        missing = [job[0].string_id for job in jobs if job[1] is None]
+        if missing:
+            raise ValueError(f"No data for strings: {missing}")
+    else:
+        jobs = [(config, None, projects_dir, fit_method) for config in configs]
+
+    if n_workers == 1:
+        results = [_run_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = list(executor.map(_run_job, jobs))
+
+    store = {
+        "matrices": _long_table(results, "matrix", "Pmpp"),
+        "current_matrices": _long_table(results, "current_matrix", "Isc"),
+        "summary": pd.DataFrame([result["summary"] for result in results]),
+        "timings": pd.DataFrame(
+            [
+                {"string_id": result["summary"]["string_id"], **result["timings"]}
+                for result in results
+            ]
+        ),
+    }
+
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+        for name, frame in store.items():
+            frame.to_parquet(os.path.join(output_dir, f"{name}.parquet"))
+    return store
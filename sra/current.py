@@ -6,6 +6,9 @@ import numpy as np
 import pandas as pd
 from scipy.optimize import minimize
 
+from sra.matrix import G_VALUES, T_VALUES, SRAMatrix, evaluate_grid
+from sra.power import group_sums, linear_fit_terms, per_group, solve_surface_fit
+
 
 def current_calculation(
     current_stc, current_alpha, irradiance, temperature, correction_factor=0
@@ -30,7 +33,9 @@ def current_calculation(
     ) * (1 + correction_factor / 100)
 
 
-def fit_current_data_to_surface(data, initial_isc_stc, initial_alpha):
+def fit_current_data_to_surface(
+    data, initial_isc_stc, initial_alpha, method="minimize"
+):
     """
     ## Fits the measured Isc data to the reference surface
 
@@ -40,11 +45,15 @@ def fit_current_data_to_surface(data, initial_isc_stc, initial_alpha):
     - data (pd.DataFrame) : Measured data
     - initial_isc_stc (float) : Isc under stc conditions (datasheet!)
     - initial_alpha (float) : Temperature coefficient of the Isc (STC, datasheet!)
+    - method (str) : "minimize" (two scipy fits, default), "closed_form" or "joint". See fit_current_surface.
 
     Returns:
     - adjusted_isc_stc (float) : Isc under stc conditions, adjusted with the reference surface
     - adjusted_p_gamma (float) : Temperature coefficient of the Isc, adjusted with the reference surface
     """
+    if method != "minimize":
+        result = fit_current_surface(data, initial_isc_stc, initial_alpha, method)
+        return result["isc_stc"], result["alpha"]
 
     def stc_isc_loss(stc_isc):
         """Loss function for fitting isc_stc (using fixed initial tkp)"""
@@ -77,7 +86,97 @@ def fit_current_data_to_surface(data, initial_isc_stc, initial_alpha):
     return adjusted_isc_stc, adjusted_isc
 
 
-def calculate_sra_current_matrix(isc_stc, alpha, correction_factor=0):
+def current_fit_statistics(data, weights=None):
+    """
+    ## Sufficient statistics for fitting the current surface
+
+    The current model is `Isc = isc_stc * (b + alpha * t)` with `b = G / 1000` and `t = G / 1000 * (T - 25) / 100`,
+    so the same closed-form solution as for the power applies (see sra.power.surface_fit_statistics).
+
+    Input Arguments:
+    - data (pd.DataFrame) : Measured data with G_mod, T_eff and Isc
+    - weights (np.ndarray, optional) : Row weights with shape (n_rows,) or (n_sets, n_rows)
+
+    Returns:
+    - np.ndarray with the sums in the order of sra.power.FIT_STATISTICS (last axis)
+    """
+    terms = _current_terms(data)
+    if weights is None:
+        return terms.sum(axis=0)
+    return np.asarray(weights, dtype=np.float64) @ terms
+
+
+def _current_terms(data):
+    """Per-row products whose sums are the fit statistics of the current model."""
+    irradiance = data["G_mod"].to_numpy(dtype=np.float64)
+    temperature = data["T_eff"].to_numpy(dtype=np.float64)
+    b = irradiance / 1000
+    t = b * (temperature - 25) / 100
+    return linear_fit_terms(b, t, data["Isc"].to_numpy(dtype=np.float64))
+
+
+def _rename_fit(result):
+    """Use the names of the current model for the fitted values."""
+    result = dict(result)
+    return {
+        "isc_stc": result.pop("p_mpp"),
+        "alpha": result.pop("p_gamma"),
+        **result,
+    }
+
+
+def fit_current_surface(data, initial_isc_stc, initial_alpha, method="closed_form"):
+    """
+    ## Fast fit of the measured Isc data to the reference surface
+
+    Same fit as fit_current_data_to_surface, solved analytically (see sra.power.solve_surface_fit).
+
+    Input Arguments:
+    - data (pd.DataFrame) : Measured data with G_mod, T_eff and Isc
+    - initial_isc_stc (float) : Isc under stc conditions (datasheet!)
+    - initial_alpha (float) : Temperature coefficient of the Isc (STC, datasheet!)
+    - method (str) : "closed_form" (default) or "joint"
+
+    Returns:
+    - dict with isc_stc, alpha and the residual statistics n, rmse, bias and r2 (all floats)
+    """
+    result = solve_surface_fit(
+        current_fit_statistics(data), initial_isc_stc, initial_alpha, method
+    )
+    return {key: float(value) for key, value in _rename_fit(result).items()}
+
+
+def fit_current_data_to_surface_grouped(
+    data, group_column, initial_isc_stc, initial_alpha, method="closed_form"
+):
+    """
+    ## Fits the Isc data of many strings at once
+
+    See sra.power.fit_data_to_surface_grouped.
+
+    Input Arguments:
+    - data (pd.DataFrame) : Measured data of all strings with G_mod, T_eff, Isc and the group column
+    - group_column (str) : Column with the string id
+    - initial_isc_stc : Isc under stc conditions, a single value or a dict/pd.Series per group
+    - initial_alpha : Temperature coefficient of the Isc, a single value or a dict/pd.Series per group
+    - method (str) : "closed_form" (default) or "joint"
+
+    Returns:
+    - pd.DataFrame indexed by group with isc_stc, alpha, n, rmse, bias and r2
+    """
+    groups, statistics = group_sums(_current_terms(data), data, group_column)
+    result = solve_surface_fit(
+        statistics,
+        per_group(initial_isc_stc, groups),
+        per_group(initial_alpha, groups),
+        method,
+    )
+    return pd.DataFrame(_rename_fit(result), index=groups)
+
+
+def calculate_sra_current_matrix(
+    isc_stc, alpha, correction_factor=0, g_values=None, t_values=None
+):
     """
     ## Calculate the SRA matrix for the current
 
@@ -87,31 +186,38 @@ def calculate_sra_current_matrix(isc_stc, alpha, correction_factor=0):
     - isc_stc (float) : Isc under stc conditions (datasheet!)
     - alpha (float) : Temperature coefficient of the Isc (STC, datasheet!)
     - correction_factor : Correction factor for a relative difference to the reference surface
+    - g_values, t_values (optional) : G-T grid, default DIN EN 61853-1 (see sra.matrix)
 
     Returns:
     - pd.DataFrame with the given power at the g-t-pairs
     """
-    g_values = [100, 200, 400, 500, 600, 800, 1000, 1100]
-    t_values = [15, 25, 45, 50, 75]
-    results_list = []
-
-    for g in g_values:
-        row = [f"{g} W/m²"]
-        for t in t_values:
-            current = current_calculation(
-                isc_stc,
-                alpha,
-                g,
-                t,
-                correction_factor,
-            )
-            row.append(current)
-        results_list.append(row)
-
-    columns = ["Isc / A"] + [f"{t} °C" for t in t_values]
-    df = pd.DataFrame(results_list, columns=columns)
-    df.set_index("Isc / A", inplace=True)
-    return df
+    return sra_current_matrices(
+        isc_stc, alpha, correction_factor, g_values, t_values
+    ).to_frame()
+
+
+def sra_current_matrices(
+    isc_stc, alpha, correction_factor=0, g_values=None, t_values=None
+):
+    """
+    ## Calculate many SRA current matrices at once
+
+    See sra.power.sra_matrices, the parameters can be arrays and broadcast against each other.
+
+    Returns:
+    - SRAMatrix with values of shape (*broadcast shape of the parameters, len(g_values), len(t_values))
+    """
+    g_values = G_VALUES if g_values is None else g_values
+    t_values = T_VALUES if t_values is None else t_values
+    values = evaluate_grid(
+        lambda isc, a, c, g, t: current_calculation(isc, a, g, t, c),
+        g_values,
+        t_values,
+        isc_stc,
+        alpha,
+        correction_factor,
+    )
+    return SRAMatrix(values, g_values, t_values, "Isc / A")
 
 
 def adjust_current_simple(data, isc_stc, alpha):
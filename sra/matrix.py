@@ -0,0 +1,83 @@
+"""
+Vectorized generation of SRA matrices on arbitrary G-T grids.
+"""
+
+import numpy as np
+import pandas as pd
+
+G_VALUES = [100, 200, 400, 500, 600, 800, 1000, 1100]
+"""G values of the matrix according to DIN EN 61853-1 (W/m²)."""
+
+T_VALUES = [15, 25, 45, 50, 75]
+"""T values of the matrix according to DIN EN 61853-1 (°C)."""
+
+
+class SRAMatrix:
+    """
+    ## Labelled array of one or many SRA matrices
+
+    `values` has the shape `(*batch_shape, len(g_values), len(t_values))`. The batch dimensions come from the
+    parameter arrays (e.g. one matrix per string or per bootstrap sample). Use `to_frame()` to get the DataFrame
+    layout used by the pages.
+    """
+
+    def __init__(self, values, g_values, t_values, label):
+        self.values = np.asarray(values)
+        self.g_values = np.asarray(g_values)
+        self.t_values = np.asarray(t_values)
+        self.label = label
+
+    def __repr__(self):
+        return f"SRAMatrix(label={self.label!r}, shape={self.values.shape})"
+
+    @property
+    def batch_shape(self):
+        return self.values.shape[:-2]
+
+    def __getitem__(self, index):
+        """Select matrices along the batch dimensions."""
+        values = self.values[index]
+        if values.ndim < 2 or values.shape[-2:] != self.values.shape[-2:]:
+            raise IndexError("Only the batch dimensions can be indexed")
+        return SRAMatrix(values, self.g_values, self.t_values, self.label)
+
+    def to_frame(self, index=()):
+        """
+        ## Convert one matrix to a DataFrame
+
+        Input Arguments:
+        - index: Position in the batch dimensions, not needed for a single matrix
+
+        Returns:
+        - pd.DataFrame with rows "<G> W/m²" and columns "<T> °C"
+        """
+        values = self.values[index]
+        if values.ndim != 2:
+            raise ValueError("index must select a single matrix")
+        return pd.DataFrame(
+            values,
+            index=pd.Index([f"{g} W/m²" for g in self.g_values], name=self.label),
+            columns=[f"{t} °C" for t in self.t_values],
+        )
+
+
+def evaluate_grid(model, g_values, t_values, *parameters):
+    """
+    ## Evaluate a model on a G-T grid for any number of parameter sets
+
+    The parameters broadcast against each other and form the batch dimensions, G and T are appended as the last
+    two dimensions.
+
+    Input Arguments:
+    - model: Function `model(*parameters, irradiance, temperature)`
+    - g_values: G values of the grid
+    - t_values: T values of the grid
+    - parameters: Scalars or arrays, passed to the model before irradiance and temperature
+
+    Returns:
+    - np.ndarray with shape (*broadcast shape of the parameters, len(g_values), len(t_values))
+    """
+    parameters = [np.asarray(p, dtype=np.float64)[..., None, None] for p in parameters]
+    irradiance = np.asarray(g_values, dtype=np.float64)[:, None]
+    temperature = np.asarray(t_values, dtype=np.float64)[None, :]
+    return model(*parameters, irradiance, temperature)
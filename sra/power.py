@@ -4,8 +4,12 @@ All functions for estimating the power of the system based on the reference surf
 
 import numpy as np
 import pandas as pd
+from functools import lru_cache
+from typing import NamedTuple
 from scipy.optimize import minimize
 
+from sra.matrix import G_VALUES, T_VALUES, SRAMatrix, evaluate_grid
+
 
 def power_calculation(
     p_mpp, p_gamma, anzahl_module, irradiance, temperature, correction_factor=0
@@ -35,16 +39,37 @@ def power_calculation(
     ) * (1 + correction_factor / 100)
 
 
-def reference_surface(p_mpp, p_gamma, anzahl_module, correction_factor=0):
+class SurfaceGrid(NamedTuple):
+    """G-T grid of the reference surface: T from t_min to t_max and G from g_min to g_max, n_points each."""
+
+    t_min: float = 10
+    t_max: float = 80
+    g_min: float = 50
+    g_max: float = 1200
+    n_points: int = 100
+
+
+REFERENCE_GRID = SurfaceGrid()
+
+
+def reference_surface(
+    p_mpp, p_gamma, anzahl_module, correction_factor=0, grid=REFERENCE_GRID
+):
     """
     ## Calculate the reference surface power according to the datasheet of the modules.
 
     ! This one does not work with the pipeline !
 
+    Surfaces are memoized per (p_mpp, p_gamma, anzahl_module, correction_factor, grid) in a bounded LRU cache
+    shared by all sessions, so Streamlit reruns with the same inputs do not recalculate them. The returned arrays
+    are read-only because they are shared, use `.copy()` before modifying them.
+
     Input Arguments:
     - p_mpp (float) : Power under stc conditions (datasheet!)
     - p_gamma (float) : Temperature coefficient of the power (STC, datasheet!)
     - anzahl_module (int) : Number of modules in the string.
+    - correction_factor : Correction factor for a relative difference to the reference surface
+    - grid (SurfaceGrid) : Grid of the surface, default T 10-80 °C and G 50-1200 W/m² with 100 points each
 
     Returns:
     - power_surface : Theoretical datasheet power for the G-T-Matrix
@@ -56,16 +81,42 @@ def reference_surface(p_mpp, p_gamma, anzahl_module, correction_factor=0):
     - [1]
     ---
     """
-    t_eff = np.linspace(10, 80, 100)
-    g_eff = np.linspace(50, 1200, 100)
-    t_eff_grid, g_eff_grid = np.meshgrid(t_eff, g_eff)
+    return _cached_reference_surface(
+        float(p_mpp),
+        float(p_gamma),
+        int(anzahl_module),
+        float(correction_factor),
+        SurfaceGrid(*grid),
+    )
+
 
+@lru_cache(maxsize=64)
+def _cached_reference_surface(p_mpp, p_gamma, anzahl_module, correction_factor, grid):
+    t_eff_grid, g_eff_grid = _surface_grid(grid)
     power_surface = power_calculation(
         p_mpp, p_gamma, anzahl_module, g_eff_grid, t_eff_grid, correction_factor
     )
+    power_surface.setflags(write=False)
     return power_surface, t_eff_grid, g_eff_grid
 
 
+@lru_cache(maxsize=8)
+def _surface_grid(grid):
+    """Read-only meshgrid (t_eff_grid, g_eff_grid) of a SurfaceGrid."""
+    t_eff = np.linspace(grid.t_min, grid.t_max, grid.n_points)
+    g_eff = np.linspace(grid.g_min, grid.g_max, grid.n_points)
+    t_eff_grid, g_eff_grid = np.meshgrid(t_eff, g_eff)
+    t_eff_grid.setflags(write=False)
+    g_eff_grid.setflags(write=False)
+    return t_eff_grid, g_eff_grid
+
+
+def clear_reference_surface_cache():
+    """Empty the caches of reference_surface."""
+    _cached_reference_surface.cache_clear()
+    _surface_grid.cache_clear()
+
+
 def adjust_power_simple(data, p_mpp, p_gamma, anzahl_module):
     """
     ## Adjust the power surface
@@ -91,7 +142,9 @@ def adjust_power_simple(data, p_mpp, p_gamma, anzahl_module):
     return avg_relative_distance
 
 
-def fit_data_to_surface(data, initial_stc_pmpp, initial_tkp, anzahl_module):
+def fit_data_to_surface(
+    data, initial_stc_pmpp, initial_tkp, anzahl_module, method="minimize"
+):
     """
     ## Fits the measured data to the reference surface
 
@@ -102,11 +155,18 @@ def fit_data_to_surface(data, initial_stc_pmpp, initial_tkp, anzahl_module):
     - p_mpp (float) : Power under stc conditions (datasheet!)
     - p_gamma (float) : Temperature coefficient of the power (STC, datasheet!)
     - anzahl_module (int) : Number of modules in the string.
+    - method (str) : "minimize" (two scipy fits, default), "closed_form" (same two steps solved analytically)
+    or "joint" (p_mpp and p_gamma fitted together). See fit_power_surface.
 
     Returns:
     - adjusted_p_mpp (float) : Power under stc conditions, adjusted with the reference surface
     - adjusted_p_gamma (float) : Temperature coefficient of the power, adjusted with the reference surface
     """
+    if method != "minimize":
+        result = fit_power_surface(
+            data, initial_stc_pmpp, initial_tkp, anzahl_module, method=method
+        )
+        return result["p_mpp"], result["p_gamma"]
 
     def stc_pmpp_loss(stc_pmpp):
         """Loss function for fitting stc_pmpp (using fixed initial tkp)"""
@@ -139,7 +199,279 @@ def fit_data_to_surface(data, initial_stc_pmpp, initial_tkp, anzahl_module):
     return adjusted_p_mpp, adjusted_p_gamma
 
 
-def calculate_sra_matrix(p_mpp, p_gamma, anzahl_module, correction_factor=0):
+FIT_STATISTICS = ("n", "b", "t", "y", "bb", "bt", "tt", "by", "ty", "yy")
+"""Order of the sums returned by surface_fit_statistics."""
+
+
+def surface_fit_statistics(data, anzahl_module, weights=None):
+    """
+    ## Sufficient statistics for fitting the power surface
+
+    The power model can be written as `P = p_mpp * (b + p_gamma * t)` with the per-row terms
+    `b = anzahl_module * G / 1000 * (1 + ln(G / 1000) / 100)` and `t = anzahl_module * G / 1000 * (T - 25) / 100`.
+    All least squares fits only need a few sums over b, t and the measured power y, see FIT_STATISTICS. Rows with
+    NaN in G_eff, T_eff or Pmpp are ignored.
+
+    Input Arguments:
+    - data (pd.DataFrame) : Measured data with G_eff, T_eff and Pmpp
+    - anzahl_module (int) : Number of modules in the string.
+    - weights (np.ndarray, optional) : Row weights with shape (n_rows,) or (n_sets, n_rows), e.g. bootstrap counts
+
+    Returns:
+    - np.ndarray with the sums in the order of FIT_STATISTICS (last axis)
+    """
+    terms = surface_terms(
+        data["G_eff"].to_numpy(dtype=np.float64),
+        data["T_eff"].to_numpy(dtype=np.float64),
+        data["Pmpp"].to_numpy(dtype=np.float64),
+        anzahl_module,
+    )
+    if weights is None:
+        return terms.sum(axis=0)
+    return np.asarray(weights, dtype=np.float64) @ terms
+
+
+def surface_terms(irradiance, temperature, power, anzahl_module):
+    """Per-row products whose sums are the fit statistics, shape (n_rows, len(FIT_STATISTICS))."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = anzahl_module * irradiance / 1000
+        b = scale * (1 + np.log(irradiance / 1000) / 100)
+        t = scale * (temperature - 25) / 100
+    return linear_fit_terms(b, t, power)
+
+
+def linear_fit_terms(b, t, y):
+    """
+    Per-row products for a model `y = x * (b + c * t)`, in the order of FIT_STATISTICS.
+
+    Rows with non-finite values are set to zero (n = 0), so they do not count.
+    """
+    valid = np.isfinite(b) & np.isfinite(t) & np.isfinite(y)
+    b, t, y = (np.where(valid, x, 0.0) for x in (b, t, y))
+    return np.stack(
+        [valid.astype(np.float64), b, t, y, b * b, b * t, t * t, b * y, t * y, y * y],
+        axis=-1,
+    )
+
+
+def group_sums(terms, data, group_column):
+    """
+    Sum per-row terms per group with np.bincount (one pass per statistic, no loop over the groups).
+
+    Returns:
+    - groups (pd.Index): The group keys in order of appearance
+    - np.ndarray with shape (len(groups), terms.shape[1])
+    """
+    codes, groups = pd.factorize(data[group_column], sort=False)
+    if np.any(codes < 0):
+        raise ValueError(f"Missing values in group column: {group_column}")
+    sums = np.stack(
+        [
+            np.bincount(codes, weights=terms[:, k], minlength=len(groups))
+            for k in range(terms.shape[1])
+        ],
+        axis=-1,
+    )
+    return pd.Index(groups, name=group_column), sums
+
+
+def per_group(value, groups, data=None, group_column=None):
+    """
+    Align a scalar or a per-group mapping (dict or pd.Series indexed by group) to the groups.
+
+    Returns an array with one value per group, or one value per row of data if data is given.
+    """
+    if isinstance(value, (dict, pd.Series)):
+        mapping = pd.Series(value, dtype=np.float64)
+        if data is not None:
+            aligned = data[group_column].map(mapping)
+        else:
+            aligned = mapping.reindex(groups)
+        if aligned.isna().any():
+            raise ValueError("Missing value for at least one group")
+        return aligned.to_numpy(dtype=np.float64)
+    length = len(data) if data is not None else len(groups)
+    return np.full(length, value, dtype=np.float64)
+
+
+def solve_surface_fit(statistics, initial_stc_pmpp, initial_tkp, method="closed_form"):
+    """
+    ## Solve the surface fit from the sufficient statistics
+
+    Works on any number of fits at once: statistics can have any leading shape (e.g. one row per string or per
+    bootstrap sample), the initial values broadcast against it.
+
+    - "closed_form": the two steps of fit_data_to_surface solved analytically. p_mpp is linear in the model for
+    a fixed p_gamma and p_gamma is linear for a fixed p_mpp, both are clipped to the same bounds as the scipy fit.
+    - "joint": p_mpp and p_gamma are fitted together within the same bounds. The best of the unconstrained
+    solution and the optimum on each edge of the bounds is returned.
+
+    Input Arguments:
+    - statistics (np.ndarray) : Sums from surface_fit_statistics, last axis in the order of FIT_STATISTICS
+    - initial_stc_pmpp : Power under stc conditions (datasheet!)
+    - initial_tkp : Temperature coefficient of the power (STC, datasheet!)
+    - method (str) : "closed_form" or "joint"
+
+    Returns:
+    - dict with p_mpp, p_gamma and the residual statistics n, rmse, bias (mean of measured - predicted) and r2
+    """
+    s = dict(zip(FIT_STATISTICS, np.moveaxis(np.asarray(statistics), -1, 0)))
+    p0 = np.asarray(initial_stc_pmpp, dtype=np.float64)
+    g0 = np.asarray(initial_tkp, dtype=np.float64)
+    p_low, p_high = np.minimum(p0 * 0.5, p0 * 1.2), np.maximum(p0 * 0.5, p0 * 1.2)
+    g_low, g_high = np.minimum(g0 * 1.2, g0 * 0.8), np.maximum(g0 * 1.2, g0 * 0.8)
+
+    if method == "closed_form":
+        p_mpp = np.clip(_best_p_mpp(s, g0, p0), p_low, p_high)
+        p_gamma = np.clip(_best_p_gamma(s, p_mpp, g0), g_low, g_high)
+    elif method == "joint":
+        p_mpp, p_gamma = _joint_fit(s, p0, g0, p_low, p_high, g_low, g_high)
+    else:
+        raise ValueError(f"Unknown fit method: {method}")
+
+    sse = _sum_of_squares(s, p_mpp, p_gamma)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        n = s["n"]
+        total = s["yy"] - s["y"] ** 2 / n
+        residual_sum = s["y"] - p_mpp * (s["b"] + p_gamma * s["t"])
+        return {
+            "p_mpp": p_mpp,
+            "p_gamma": p_gamma,
+            "n": n,
+            "rmse": np.sqrt(np.maximum(sse, 0) / n),
+            "bias": residual_sum / n,
+            "r2": 1 - sse / total,
+        }
+
+
+def _best_p_mpp(s, p_gamma, fallback):
+    """Least squares p_mpp for a fixed p_gamma."""
+    numerator = s["by"] + p_gamma * s["ty"]
+    denominator = s["bb"] + 2 * p_gamma * s["bt"] + p_gamma**2 * s["tt"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / denominator, fallback)
+
+
+def _best_p_gamma(s, p_mpp, fallback):
+    """Least squares p_gamma for a fixed p_mpp."""
+    numerator = s["ty"] - p_mpp * s["bt"]
+    denominator = p_mpp * s["tt"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator != 0, numerator / denominator, fallback)
+
+
+def _sum_of_squares(s, p_mpp, p_gamma):
+    """Sum of squared residuals for given parameters."""
+    q = p_mpp * p_gamma
+    return (
+        s["yy"]
+        - 2 * p_mpp * s["by"]
+        - 2 * q * s["ty"]
+        + p_mpp**2 * s["bb"]
+        + 2 * p_mpp * q * s["bt"]
+        + q**2 * s["tt"]
+    )
+
+
+def _joint_fit(s, p0, g0, p_low, p_high, g_low, g_high):
+    """Joint bounded fit of p_mpp and p_gamma, see solve_surface_fit."""
+    # Unconstrained: P = p_mpp * b + q * t with q = p_mpp * p_gamma is linear in (p_mpp, q)
+    determinant = s["bb"] * s["tt"] - s["bt"] ** 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p_free = (s["by"] * s["tt"] - s["ty"] * s["bt"]) / determinant
+        q_free = (s["ty"] * s["bb"] - s["by"] * s["bt"]) / determinant
+        g_free = q_free / p_free
+    inside = (
+        (p_free >= p_low) & (p_free <= p_high) & (g_free >= g_low) & (g_free <= g_high)
+    )
+
+    candidates = []
+    for p_edge in (p_low, p_high):
+        candidates.append(
+            (p_edge, np.clip(_best_p_gamma(s, p_edge, g0), g_low, g_high))
+        )
+    for g_edge in (g_low, g_high):
+        candidates.append((np.clip(_best_p_mpp(s, g_edge, p0), p_low, p_high), g_edge))
+    candidates.append((np.where(inside, p_free, p0), np.where(inside, g_free, g0)))
+
+    p_all = np.stack(np.broadcast_arrays(*[c[0] for c in candidates]))
+    g_all = np.stack(np.broadcast_arrays(*[c[1] for c in candidates]))
+    sse = _sum_of_squares(s, p_all, g_all)
+    sse[-1] = np.where(inside, sse[-1], np.inf)
+    best = np.argmin(np.nan_to_num(sse, nan=np.inf), axis=0)
+    p_mpp = np.take_along_axis(p_all, best[None], axis=0)[0]
+    p_gamma = np.take_along_axis(g_all, best[None], axis=0)[0]
+    return p_mpp, p_gamma
+
+
+def fit_power_surface(
+    data, initial_stc_pmpp, initial_tkp, anzahl_module, method="closed_form"
+):
+    """
+    ## Fast fit of the measured data to the reference surface
+
+    Same fit as fit_data_to_surface, but solved analytically from a few sums over the data instead of running
+    scipy's minimize on the full DataFrame (see surface_fit_statistics and solve_surface_fit).
+
+    Input Arguments:
+    - data (pd.DataFrame) : Measured data with G_eff, T_eff and Pmpp
+    - initial_stc_pmpp (float) : Power under stc conditions (datasheet!)
+    - initial_tkp (float) : Temperature coefficient of the power (STC, datasheet!)
+    - anzahl_module (int) : Number of modules in the string.
+    - method (str) : "closed_form" (default) or "joint"
+
+    Returns:
+    - dict with p_mpp, p_gamma and the residual statistics n, rmse, bias and r2 (all floats)
+    """
+    statistics = surface_fit_statistics(data, anzahl_module)
+    result = solve_surface_fit(statistics, initial_stc_pmpp, initial_tkp, method)
+    return {key: float(value) for key, value in result.items()}
+
+
+def fit_data_to_surface_grouped(
+    data,
+    group_column,
+    initial_stc_pmpp,
+    initial_tkp,
+    anzahl_module,
+    method="closed_form",
+):
+    """
+    ## Fits many strings to their reference surfaces at once
+
+    The fit statistics of all groups are built with segment sums (np.bincount) and solved together, so a refit of
+    the whole fleet is a handful of array operations instead of one minimize per string.
+
+    Input Arguments:
+    - data (pd.DataFrame) : Measured data of all strings with G_eff, T_eff, Pmpp and the group column
+    - group_column (str) : Column with the string id
+    - initial_stc_pmpp : Power under stc conditions, a single value or a dict/pd.Series per group
+    - initial_tkp : Temperature coefficient of the power, a single value or a dict/pd.Series per group
+    - anzahl_module : Number of modules in the string, a single value or a dict/pd.Series per group
+    - method (str) : "closed_form" (default) or "joint", see solve_surface_fit
+
+    Returns:
+    - pd.DataFrame indexed by group with p_mpp, p_gamma, n, rmse, bias and r2
+    """
+    terms = surface_terms(
+        data["G_eff"].to_numpy(dtype=np.float64),
+        data["T_eff"].to_numpy(dtype=np.float64),
+        data["Pmpp"].to_numpy(dtype=np.float64),
+        per_group(anzahl_module, None, data, group_column),
+    )
+    groups, statistics = group_sums(terms, data, group_column)
+    result = solve_surface_fit(
+        statistics,
+        per_group(initial_stc_pmpp, groups),
+        per_group(initial_tkp, groups),
+        method,
+    )
+    return pd.DataFrame(result, index=groups)
+
+
+def calculate_sra_matrix(
+    p_mpp, p_gamma, anzahl_module, correction_factor=0, g_values=None, t_values=None
+):
     """
     ## Calculate the SRA matrix
 
@@ -150,29 +482,44 @@ def calculate_sra_matrix(p_mpp, p_gamma, anzahl_module, correction_factor=0):
     - p_gamma (float) : Temperature coefficient of the power (STC, datasheet!)
     - anzahl_module (int) : Number of modules in the string.
     - correction_factor : Correction factor for a relative difference to the reference surface
+    - g_values, t_values (optional) : G-T grid, default DIN EN 61853-1 (see sra.matrix)
 
     Returns:
     - pd.DataFrame with the given power at the g-t-pairs
     """
-    g_values = [100, 200, 400, 500, 600, 800, 1000, 1100]
-    t_values = [15, 25, 45, 50, 75]
-    results_list = []
-
-    for g in g_values:
-        row = [f"{g} W/m²"]
-        for t in t_values:
-            power = power_calculation(
-                p_mpp,
-                p_gamma,
-                anzahl_module,
-                g,
-                t,
-                correction_factor,
-            )
-            row.append(power)
-        results_list.append(row)
-
-    columns = ["Pmpp / W"] + [f"{t} °C" for t in t_values]
-    df = pd.DataFrame(results_list, columns=columns)
-    df.set_index("Pmpp / W", inplace=True)
-    return df
+    return sra_matrices(
+        p_mpp, p_gamma, anzahl_module, correction_factor, g_values, t_values
+    ).to_frame()
+
+
+def sra_matrices(
+    p_mpp, p_gamma, anzahl_module, correction_factor=0, g_values=None, t_values=None
+):
+    """
+    ## Calculate many SRA matrices at once
+
+    All parameters can be arrays (e.g. one value per string or per bootstrap sample), they broadcast against each
+    other and every combination gets its own matrix.
+
+    Input Arguments:
+    - p_mpp : Power under stc conditions
+    - p_gamma : Temperature coefficient of the power
+    - anzahl_module : Number of modules in the string.
+    - correction_factor : Correction factor for a relative difference to the reference surface
+    - g_values, t_values (optional) : G-T grid, default DIN EN 61853-1 (see sra.matrix)
+
+    Returns:
+    - SRAMatrix with values of shape (*broadcast shape of the parameters, len(g_values), len(t_values))
+    """
+    g_values = G_VALUES if g_values is None else g_values
+    t_values = T_VALUES if t_values is None else t_values
+    values = evaluate_grid(
+        lambda p, gamma, n, c, g, t: power_calculation(p, gamma, n, g, t, c),
+        g_values,
+        t_values,
+        p_mpp,
+        p_gamma,
+        anzahl_module,
+        correction_factor,
+    )
+    return SRAMatrix(values, g_values, t_values, "Pmpp / W")
@@ -0,0 +1,205 @@
+"""
+Bootstrap confidence bands for the SRA matrices.
+
+Every resample draws the rows of data_effective with replacement. Instead of building a new DataFrame per
+resample, the resamples are expressed as row counts (weights) and the fit statistics of a whole batch of resamples
+are one matrix product with the per-row terms of sra.power. The fits and the matrices of all resamples are then
+solved with broadcasting (solve_surface_fit, sra_matrices).
+
+Example:
+```python
+result = bootstrap_sra(data, p_mpp=320, p_gamma=-0.38, anzahl_module=6, n_resamples=1000)
+result["power"]["lower"], result["power"]["upper"]
+```
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from sra.power import (
+    power_calculation,
+    solve_surface_fit,
+    sra_matrices,
+    surface_terms,
+)
+
+
+def resample_counts(n_rows, n_resamples, rng):
+    """
+    ## Bootstrap resamples as row counts
+
+    Input Arguments:
+    - n_rows (int) : Number of rows to draw from (and per resample)
+    - n_resamples (int) : Number of resamples
+    - rng (np.random.Generator) : Random generator
+
+    Returns:
+    - np.ndarray with shape (n_resamples, n_rows), how often every row was drawn in every resample
+    """
+    draws = rng.integers(0, n_rows, size=(n_resamples, n_rows))
+    draws += np.arange(n_resamples)[:, None] * n_rows
+    counts = np.bincount(draws.ravel(), minlength=n_resamples * n_rows)
+    return counts.reshape(n_resamples, n_rows).astype(np.float64)
+
+
+def _bootstrap_batch(job):
+    """Worker: bootstrap sums of the per-row terms for a batch of resamples."""
+    terms, n_resamples, batch_size, seed = job
+    rng = np.random.default_rng(seed)
+    sums = []
+    for start in range(0, n_resamples, batch_size):
+        weights = resample_counts(len(terms), min(batch_size, n_resamples - start), rng)
+        sums.append(weights @ terms)
+    if not sums:
+        return np.empty((0, terms.shape[1]))
+    return np.concatenate(sums)
+
+
+def bootstrap_sums(terms, n_resamples, batch_size=100, seed=None, n_workers=1):
+    """
+    ## Column sums of per-row terms for many bootstrap resamples
+
+    The resamples are processed in batches of batch_size, so the count matrix never gets larger than
+    (batch_size, n_rows). With n_workers > 1 the resamples are split across a process pool, each worker gets its
+    own independent random stream.
+
+    Input Arguments:
+    - terms (np.ndarray) : Per-row terms with shape (n_rows, n_terms)
+    - n_resamples (int) : Number of resamples
+    - batch_size (int) : Resamples per matrix product. Default 100.
+    - seed (int, optional) : Seed for reproducible results
+    - n_workers (int) : Number of worker processes. Default 1 (no pool), None uses all cores.
+
+    Returns:
+    - np.ndarray with shape (n_resamples, n_terms)
+    """
+    if n_workers == 1:
+        return _bootstrap_batch((terms, n_resamples, batch_size, seed))
+
+    n_jobs = n_workers or os.cpu_count() or 1
+    seeds = np.random.SeedSequence(seed).spawn(n_jobs)
+    shares = np.diff(np.linspace(0, n_resamples, n_jobs + 1).astype(int))
+    jobs = [(terms, int(share), batch_size, s) for share, s in zip(shares, seeds)]
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        return np.concatenate(list(executor.map(_bootstrap_batch, jobs)))
+
+
+def confidence_bands(samples: np.ndarray, like: pd.DataFrame, confidence=0.95):
+    """
+    ## Per-cell percentile bands of many matrices
+
+    Input Arguments:
+    - samples (np.ndarray) : Matrices with shape (n_resamples, *like.shape)
+    - like (pd.DataFrame) : Matrix whose index and columns are used for the result
+    - confidence (float) : Width of the band. Default 0.95.
+
+    Returns:
+    - dict with "lower", "median", "upper" and "std" as DataFrames in the layout of like
+    """
+    alpha = (1 - confidence) / 2
+    lower, median, upper = np.nanquantile(samples, [alpha, 0.5, 1 - alpha], axis=0)
+    bands = {"lower": lower, "median": median, "upper": upper}
+    bands["std"] = np.nanstd(samples, axis=0, ddof=1)
+    return {
+        name: pd.DataFrame(values, index=like.index, columns=like.columns)
+        for name, values in bands.items()
+    }
+
+
+def bootstrap_sra(
+    data,
+    p_mpp,
+    p_gamma,
+    anzahl_module,
+    n_resamples=1000,
+    is_filled=True,
+    method="closed_form",
+    confidence=0.95,
+    batch_size=100,
+    seed=None,
+    n_workers=1,
+):
+    """
+    ## Bootstrap confidence bands for the power and degradation matrix
+
+    Follows the analysis page: if the matrix is filled (is_filled), the reference surface is fitted to every
+    resample (see solve_surface_fit), otherwise the correction factor of adjust_power_simple is recalculated for
+    every resample. Rows with missing values are dropped before resampling.
+
+    Input Arguments:
+    - data (pd.DataFrame) : Measured data with G_eff, T_eff and Pmpp
+    - p_mpp (float) : Power under stc conditions (datasheet!)
+    - p_gamma (float) : Temperature coefficient of the power (STC, datasheet!)
+    - anzahl_module (int) : Number of modules in the string.
+    - n_resamples (int) : Number of bootstrap resamples. Default 1000.
+    - is_filled (bool) : Result of count_filled_bins, selects the fit or the simple correction. Default True.
+    - method (str) : "closed_form" (default) or "joint", see sra.power.solve_surface_fit
+    - confidence (float) : Width of the confidence bands. Default 0.95.
+    - batch_size, seed, n_workers : See bootstrap_sums
+
+    Returns:
+    - dict with
+        - "samples": pd.DataFrame with p_mpp, p_gamma, correction_factor and degradation_at_stc per resample
+        - "power": confidence bands of the power matrix (see confidence_bands)
+        - "degradation": confidence bands of the degradation matrix in %
+        - "degradation_at_stc": (lower, upper) of the degradation at STC in %
+    """
+    data = data[["G_eff", "T_eff", "Pmpp"]].dropna()
+    if data.empty:
+        raise ValueError("No valid rows for the bootstrap")
+    irradiance = data["G_eff"].to_numpy(dtype=np.float64)
+    temperature = data["T_eff"].to_numpy(dtype=np.float64)
+    power = data["Pmpp"].to_numpy(dtype=np.float64)
+
+    if is_filled:
+        terms = surface_terms(irradiance, temperature, power, anzahl_module)
+        fit = solve_surface_fit(
+            bootstrap_sums(terms, n_resamples, batch_size, seed, n_workers),
+            p_mpp,
+            p_gamma,
+            method,
+        )
+        p_mpp_samples, p_gamma_samples = fit["p_mpp"], fit["p_gamma"]
+        correction_factor = np.zeros(n_resamples)
+    else:
+        p_theory = power_calculation(
+            p_mpp, p_gamma, anzahl_module, irradiance, temperature
+        )
+        relative_distance = (power - p_theory) / p_theory * 100
+        valid = np.isfinite(relative_distance)
+        terms = np.stack([valid, np.where(valid, relative_distance, 0.0)], axis=-1)
+        sums = bootstrap_sums(
+            terms.astype(np.float64), n_resamples, batch_size, seed, n_workers
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            correction_factor = sums[:, 1] / sums[:, 0]
+        p_mpp_samples = np.full(n_resamples, float(p_mpp))
+        p_gamma_samples = np.full(n_resamples, float(p_gamma))
+
+    matrices = sra_matrices(
+        p_mpp_samples, p_gamma_samples, anzahl_module, correction_factor
+    )
+    like = matrices.to_frame(0)
+    datasheet_stc_string_power = p_mpp * anzahl_module
+    degradation = (matrices.values / datasheet_stc_string_power - 1) * 100
+
+    stc = (like.index.get_loc("1000 W/m²"), like.columns.get_loc("25 °C"))
+    degradation_at_stc = degradation[:, stc[0], stc[1]]
+    alpha = (1 - confidence) / 2
+    return {
+        "samples": pd.DataFrame(
+            {
+                "p_mpp": p_mpp_samples,
+                "p_gamma": p_gamma_samples,
+                "correction_factor": correction_factor,
+                "degradation_at_stc": degradation_at_stc,
+            }
+        ),
+        "power": confidence_bands(matrices.values, like, confidence),
+        "degradation": confidence_bands(degradation, like, confidence),
+        "degradation_at_stc": tuple(
+            np.nanquantile(degradation_at_stc, [alpha, 1 - alpha])
+        ),
+    }
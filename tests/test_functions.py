@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from pipeline.functions import interpolate_curves, normalize_curve_data
+from tools.curves import CurveArray, curve_matrix
+
+
+def _iv_curves(n_curves, seed=0):
+    """IV curves of different lengths, some with noisy (non-monotone) or repeated voltages near 0."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(n_curves):
+        n = int(rng.integers(20, 60))
+        voltage = np.linspace(0, 40, n) + rng.normal(0, 0.5, n) * (np.arange(n) < 5)
+        if i % 7 == 0:
+            voltage[3] = voltage[2]
+        current = 10 * (1 - np.exp((voltage - 40) / 3)) + rng.normal(0, 0.01, n)
+        rows.append((current.tolist(), voltage.tolist()))
+    return pd.DataFrame(rows, columns=["Current", "Voltage"])
+
+
+def test_normalize_curve_data_matches_np_interp():
+    data = _iv_curves(300)
+    steps = np.linspace(0, 1, 100)
+    expected = np.array(
+        [
+            np.interp(steps, np.array(v) / max(v), np.array(c) / max(c))
+            for c, v in zip(data["Current"], data["Voltage"])
+        ]
+    )
+
+    result = normalize_curve_data(data)
+
+    np.testing.assert_array_equal(
+        curve_matrix(result["Current_normalized"], np.float64), expected
+    )
+
+
+def test_interpolate_curves_matches_np_interp():
+    rng = np.random.default_rng(1)
+    xp, fp = [], []
+    for i in range(500):
+        n = int(rng.integers(2, 30))
+        xp.append(np.sort(rng.random(n)) if i % 3 else rng.random(n))
+        fp.append(rng.random(n))
+    x = np.linspace(-0.1, 1.1, 50)
+
+    result = interpolate_curves(
+        x,
+        CurveArray.from_lists(xp, dtype=np.float64),
+        CurveArray.from_lists(fp, dtype=np.float64),
+    )
+
+    expected = np.array([np.interp(x, a, b) for a, b in zip(xp, fp)])
+    np.testing.assert_array_equal(result, expected)
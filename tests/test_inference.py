@@ -0,0 +1,130 @@
+import numpy as np
+import pytest
+
+from autoencoder.inference import NumpyAutoencoder, coding_layer_index, export_model
+
+
+class Dense:
+    """Stand-in for a Keras Dense layer (only what export_model reads)."""
+
+    def __init__(self, rng, n_in, n_out, activation):
+        self.kernel = rng.normal(0, 1 / np.sqrt(n_in), (n_in, n_out)).astype(np.float32)
+        self.bias = rng.normal(0, 0.1, n_out).astype(np.float32)
+        self.activation = activation
+
+    def get_config(self):
+        return {"activation": self.activation}
+
+    def get_weights(self):
+        return [self.kernel, self.bias]
+
+
+class Dropout:
+    pass
+
+
+class Model:
+    def __init__(self, layers, input_size):
+        self.layers = layers
+        self.input_shape = (None, input_size)
+
+
+def _autoencoder(sizes, use_dropout, seed=0):
+    """Layer stack like Autoencoder.build_model, sizes from the input to the codings."""
+    rng = np.random.default_rng(seed)
+    layers = [Dropout()] if use_dropout else []
+    previous = sizes[0]
+    for size in sizes:
+        layers.append(Dense(rng, previous, size, "relu"))
+        previous = size
+    for size in reversed(sizes[:-1]):
+        layers.append(Dense(rng, previous, size, "relu"))
+        previous = size
+    layers.append(Dense(rng, previous, sizes[0], "sigmoid"))
+    return Model(layers, sizes[0])
+
+
+def _forward(model, X):
+    """Reference forward pass in float64, returns the reconstructions and the outputs of every layer."""
+    x, outputs = X.astype(np.float64), []
+    for layer in model.layers:
+        if isinstance(layer, Dense):
+            x = x @ layer.kernel + layer.bias
+            x = np.maximum(x, 0) if layer.activation == "relu" else 1 / (1 + np.exp(-x))
+        outputs.append(x)
+    return x, outputs
+
+
+@pytest.mark.parametrize("use_dropout", [False, True])
+def test_coding_layer_is_the_bottleneck(use_dropout):
+    model = _autoencoder([20, 15, 10, 5], use_dropout)
+
+    index = coding_layer_index([layer.__class__.__name__ for layer in model.layers])
+
+    assert model.layers[index].get_weights()[0].shape[1] == 5
+
+
+@pytest.mark.parametrize("use_dropout", [False, True])
+def test_numpy_inference_matches_forward_pass(tmp_path, use_dropout):
+    model = _autoencoder([20, 15, 10, 5], use_dropout)
+    X = np.random.default_rng(1).random((300, 20), dtype=np.float32)
+    export_model(model, tmp_path / "model.npz")
+
+    numpy_model = NumpyAutoencoder.load(tmp_path / "model.npz", batch_size=64)
+    reconstructions, codings = numpy_model.predict_with_codings(X)
+
+    expected, outputs = _forward(model, X)
+    index = coding_layer_index([layer.__class__.__name__ for layer in model.layers])
+    np.testing.assert_allclose(reconstructions, expected, atol=1e-5)
+    np.testing.assert_allclose(codings, outputs[index], atol=1e-5)
+    np.testing.assert_allclose(numpy_model.predict(X), reconstructions)
+
+
+def test_quantized_export_is_close(tmp_path):
+    model = _autoencoder([20, 15, 10, 5], use_dropout=False)
+    X = np.random.default_rng(1).random((100, 20), dtype=np.float32)
+    export_model(model, tmp_path / "model.npz", quantize=True)
+
+    reconstructions = NumpyAutoencoder.load(tmp_path / "model.npz").predict(X)
+
+    np.testing.assert_allclose(reconstructions, _forward(model, X)[0], atol=1e-2)
+
+
+def test_empty_input_has_the_coding_width(tmp_path):
+    export_model(_autoencoder([20, 15, 10, 5], True), tmp_path / "model.npz")
+
+    reconstructions, codings = NumpyAutoencoder.load(
+        tmp_path / "model.npz"
+    ).predict_with_codings(np.zeros((0, 20), np.float32))
+
+    assert reconstructions.shape == (0, 20)
+    assert codings.shape == (0, 5)
+
+
+@pytest.mark.parametrize("use_dropout", [False, True])
+def test_numpy_inference_matches_keras(tmp_path, use_dropout):
+    pytest.importorskip("tensorflow")
+    pytest.importorskip("hyperopt")
+    from autoencoder.autoencoder import Autoencoder
+
+    X = np.random.default_rng(0).random((200, 30), dtype=np.float32)
+    autoencoder = Autoencoder(
+        input_size=30,
+        n_codings=4,
+        n_layers=2,
+        use_dropout=use_dropout,
+        dropout_rate=0.2,
+    )
+    autoencoder.model = autoencoder.build_model()
+    autoencoder.export(tmp_path / "model.npz")
+
+    reconstructions, codings = NumpyAutoencoder.load(
+        tmp_path / "model.npz"
+    ).predict_with_codings(X)
+
+    expected, expected_codings = autoencoder.predict_with_codings(X)
+    assert codings.shape == (200, 4)
+    assert autoencoder.encoder.output_shape[-1] == 4
+    np.testing.assert_allclose(reconstructions, autoencoder.model.predict(X), atol=1e-4)
+    np.testing.assert_allclose(reconstructions, expected, atol=1e-4)
+    np.testing.assert_allclose(codings, expected_codings, atol=1e-4)
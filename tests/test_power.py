@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sra.power import fit_data_to_surface, fit_power_surface, power_calculation
+
+
+@pytest.fixture
+def measured_data():
+    rng = np.random.default_rng(0)
+    n = 2000
+    irradiance = rng.uniform(100, 1100, n)
+    temperature = rng.uniform(10, 70, n)
+    power = power_calculation(310, -0.36, 6, irradiance, temperature)
+    return pd.DataFrame(
+        {
+            "G_eff": irradiance,
+            "T_eff": temperature,
+            "Pmpp": power * rng.normal(1, 0.01, n),
+        }
+    )
+
+
+def test_closed_form_matches_minimize(measured_data):
+    p_mpp, p_gamma = fit_data_to_surface(measured_data, 320, -0.38, 6)
+
+    result = fit_power_surface(measured_data, 320, -0.38, 6, method="closed_form")
+
+    assert result["p_mpp"] == pytest.approx(p_mpp, rel=1e-6)
+    assert result["p_gamma"] == pytest.approx(p_gamma, rel=1e-6)
+
+
+def test_fit_recovers_the_surface(measured_data):
+    result = fit_power_surface(measured_data, 320, -0.38, 6, method="joint")
+
+    assert result["p_mpp"] == pytest.approx(310, rel=1e-2)
+    assert result["p_gamma"] == pytest.approx(-0.36, rel=2e-2)
+    assert result["r2"] > 0.99
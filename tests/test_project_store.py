@@ -0,0 +1,104 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from tools.project_store import ProjectStore
+from tools.selection import RowSelection
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ProjectStore("project", str(tmp_path))
+    index = pd.date_range(
+        "2024-06-01", periods=6, freq="h", tz="Europe/Berlin", name="time"
+    )
+    store.save_data(
+        pd.DataFrame(
+            {
+                "Current": [
+                    [1.0, 2.0, 3.0],
+                    [4.0, 5.0],
+                    [6.0],
+                    [7.0, 8.0],
+                    [9.0],
+                    [1.5],
+                ],
+                "G_mod": np.arange(6, dtype=np.float64) * 100,
+                "label_ok": [True, False, True, True, False, True],
+            },
+            index=index,
+        )
+    )
+    return store
+
+
+def _stored_columns(store, stage):
+    return pq.read_schema(os.path.join(store.folder_path, f"{stage}.parquet")).names
+
+
+def test_data_round_trip(store):
+    data = store.load("data")
+
+    assert data.index.name == "time"
+    assert str(data.index.tz) == "Europe/Berlin"
+    assert [list(curve) for curve in data["Current"]][:2] == [[1, 2, 3], [4, 5]]
+    assert data["Current"].iloc[0].dtype == np.float32
+
+
+def test_stage_stores_only_changed_columns(store):
+    data = store.load("data")
+    stage = data.iloc[[1, 3, 4]].copy()
+    stage["G_eff"] = stage["G_mod"] * 0.97
+
+    store.save_stage("data_effective", stage)
+
+    assert _stored_columns(store, "data_effective") == ["_row", "G_eff"]
+    loaded = store.load("data_effective")
+    pd.testing.assert_index_equal(loaded.index, stage.index)
+    np.testing.assert_array_equal(loaded["G_eff"], stage["G_eff"])
+    np.testing.assert_array_equal(loaded["G_mod"], stage["G_mod"])
+    assert list(store.load("data_effective", ["G_eff", "label_ok"]).columns) == [
+        "G_eff",
+        "label_ok",
+    ]
+
+
+def test_stage_without_changed_columns(store):
+    store.save_stage("data_filtered", store.load("data").iloc[[0, 2]])
+
+    assert _stored_columns(store, "data_filtered") == ["_row"]
+    assert list(store.load("data_filtered")["G_mod"]) == [0, 200]
+
+
+def test_stage_from_selection(store):
+    data = store.load("data")
+    selection = RowSelection(data["label_ok"])
+
+    store.save_stage("data_filtered", selection)
+
+    pd.testing.assert_frame_equal(store.load("data_filtered"), selection.apply(data))
+    pd.testing.assert_frame_equal(store.select(selection), selection.apply(data))
+
+
+def test_save_data_removes_curve_matrices(store):
+    store.save_curve_matrix("Current_normalized", np.ones((6, 4)))
+    assert store.curve_matrix("Current_normalized").shape == (6, 4)
+
+    store.save_data(store.load("data"))
+
+    assert not store.has_curve_matrix("Current_normalized")
+
+
+def test_legacy_pickle_is_migrated(tmp_path):
+    store = ProjectStore("legacy", str(tmp_path))
+    os.makedirs(store.folder_path)
+    data = pd.DataFrame({"Current": [[1.0, 2.0], [3.0]], "G_mod": [100.0, 200.0]})
+    data.to_pickle(os.path.join(store.folder_path, "data.pkl"))
+
+    store.save_stage("data_filtered", RowSelection.all(2))
+
+    assert not os.path.exists(os.path.join(store.folder_path, "data.pkl"))
+    assert list(store.load("data_filtered")["G_mod"]) == [100, 200]
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("hyperopt")
+
+from autoencoder.search import _search_state, _split, rung_budgets
+
+
+def test_rung_budgets():
+    assert rung_budgets(25, 400, 3) == [44, 133, 400]
+    assert rung_budgets(400, 400, 3) == [400]
+
+
+def test_resume_keeps_the_split(tmp_path):
+    X = np.random.default_rng(0).random((100, 10), dtype=np.float32)
+    first = _search_state(str(tmp_path), "data", 7, 0.2)
+
+    resumed = _search_state(str(tmp_path), "data", None, 0.2)
+
+    assert resumed["split_seed"] == first["split_seed"] == 7
+    for a, b in zip(
+        _split(X, 0.2, first["split_seed"]), _split(X, 0.2, resumed["split_seed"])
+    ):
+        np.testing.assert_array_equal(a, b)
+
+
+@pytest.mark.parametrize(
+    "fingerprint, seed, validation_fraction",
+    [("other data", None, 0.2), ("data", 8, 0.2), ("data", None, 0.3)],
+)
+def test_resume_refuses_other_data_or_split(
+    tmp_path, fingerprint, seed, validation_fraction
+):
+    _search_state(str(tmp_path), "data", 7, 0.2)
+
+    with pytest.raises(ValueError):
+        _search_state(str(tmp_path), fingerprint, seed, validation_fraction)
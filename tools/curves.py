@@ -0,0 +1,288 @@
+"""
+Columnar storage for IV curves.
+
+IV curves used to live as Python lists inside pandas object columns. A CurveArray keeps all curves of a column in
+one flat value buffer plus an offsets array, so curves can be processed with NumPy instead of row-wise `.apply`.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+
+class CurveArray:
+    """
+    ## Ragged array of curves -> flat value buffer plus offsets
+
+    Curve `i` is stored in `values[offsets[i]:offsets[i + 1]]`. For fixed-length curves (e.g. normalized curves)
+    `to_matrix()` returns a zero-copy 2D view of the buffer.
+
+    Use `CurveArray.from_column(df["Current"])` to read a DataFrame column and `to_column(df.index)` to write the
+    curves back. The written column holds NumPy views into the shared buffer, so reading it again with
+    `from_column` does not copy any data.
+    """
+
+    def __init__(self, values, offsets):
+        self.values = np.asarray(values)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        if self.values.ndim != 1 or self.offsets.ndim != 1:
+            raise ValueError("values and offsets must be one-dimensional")
+        if len(self.offsets) == 0 or self.offsets[0] != 0:
+            raise ValueError("offsets must start with 0")
+        if self.offsets[-1] != len(self.values):
+            raise ValueError("offsets must end with the number of values")
+
+    @classmethod
+    def from_lists(cls, curves, dtype=np.float32):
+        """Build a CurveArray from an iterable of sequences (lists, arrays, ...)."""
+        curves = [np.asarray(curve, dtype=dtype).ravel() for curve in curves]
+        lengths = np.fromiter((len(curve) for curve in curves), dtype=np.int64)
+        offsets = np.zeros(len(curves) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        if curves:
+            values = np.concatenate(curves)
+        else:
+            values = np.empty(0, dtype=dtype)
+        return cls(values, offsets)
+
+    @classmethod
+    def from_matrix(cls, matrix, dtype=None):
+        """Build a CurveArray from a 2D array with one curve per row (no copy if possible)."""
+        matrix = np.ascontiguousarray(matrix, dtype=dtype)
+        if matrix.ndim != 2:
+            raise ValueError("matrix must be two-dimensional")
+        n_curves, n_points = matrix.shape
+        offsets = np.arange(n_curves + 1, dtype=np.int64) * n_points
+        return cls(matrix.reshape(-1), offsets)
+
+    @classmethod
+    def from_column(cls, column: pd.Series, dtype=np.float32):
+        """
+        ## Read a DataFrame column with one curve per cell
+
+        If the cells are views into one shared buffer (as written by `to_column`), the buffer is reused without
+        copying (or converted in one step if the dtype differs). Otherwise all curves are concatenated into a new
+        buffer.
+
+        Input Arguments:
+        - column (pd.Series): Column with lists or arrays
+        - dtype: dtype of the value buffer. Default float32. Use None to keep the dtype of a shared buffer.
+
+        Returns:
+        - CurveArray
+        """
+        cells = column.tolist()
+        shared = _shared_buffer(cells)
+        if shared is not None:
+            curves = cls(*shared)
+            return curves if dtype is None else curves.astype(dtype)
+        return cls.from_lists(cells, dtype=np.float32 if dtype is None else dtype)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.values[self.offsets[i] : self.offsets[i + 1]]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __repr__(self):
+        return f"CurveArray(n_curves={len(self)}, n_values={len(self.values)}, dtype={self.values.dtype})"
+
+    @property
+    def dtype(self):
+        return self.values.dtype
+
+    @property
+    def starts(self):
+        """Start offset of every curve."""
+        return self.offsets[:-1]
+
+    @property
+    def lengths(self):
+        """Number of points of every curve."""
+        return np.diff(self.offsets)
+
+    @property
+    def is_fixed_length(self):
+        """True if all curves have the same number of points."""
+        lengths = self.lengths
+        return len(lengths) == 0 or bool(np.all(lengths == lengths[0]))
+
+    def row_ids(self):
+        """Curve index of every value in the buffer."""
+        return np.repeat(np.arange(len(self)), self.lengths)
+
+    def row_max(self):
+        """Maximum of every curve."""
+        return np.maximum.reduceat(self.values, self.starts)
+
+    def astype(self, dtype):
+        """Return a CurveArray with the values converted to dtype (no copy if the dtype already matches)."""
+        return CurveArray(self.values.astype(dtype, copy=False), self.offsets)
+
+    def take(self, indices):
+        """Return a new CurveArray with the selected curves."""
+        indices = np.asarray(indices)
+        if indices.dtype == bool:
+            indices = np.flatnonzero(indices)
+        lengths = self.lengths[indices]
+        offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        positions = np.repeat(self.starts[indices] - offsets[:-1], lengths) + np.arange(
+            offsets[-1]
+        )
+        return CurveArray(self.values[positions], offsets)
+
+    def to_matrix(self):
+        """
+        ## Zero-copy 2D view for fixed-length curves
+
+        Returns:
+        - np.ndarray with shape (number of curves, points per curve)
+
+        Raises ValueError if the curves do not all have the same length.
+        """
+        if not self.is_fixed_length:
+            raise ValueError("Curves have different lengths, use to_padded() instead")
+        n_points = int(self.lengths[0]) if len(self) else 0
+        return self.values.reshape(len(self), n_points)
+
+    def to_padded(self, fill_value=np.nan):
+        """
+        ## Padded 2D copy for curves of different length
+
+        Returns:
+        - np.ndarray with shape (number of curves, longest curve), padded with fill_value
+        """
+        lengths = self.lengths
+        width = int(lengths.max()) if len(self) else 0
+        padded = np.full((len(self), width), fill_value, dtype=self.values.dtype)
+        columns = np.arange(len(self.values)) - np.repeat(self.starts, lengths)
+        padded[self.row_ids(), columns] = self.values
+        return padded
+
+    def to_lists(self):
+        """Convert back to a list of Python lists."""
+        return [curve.tolist() for curve in self]
+
+    def to_column(self, index=None, name=None) -> pd.Series:
+        """
+        ## Write the curves to a DataFrame column
+
+        Every cell holds a NumPy view into the shared value buffer, no values are copied.
+
+        Input Arguments:
+        - index: Index of the resulting Series (e.g. df.index)
+        - name: Name of the resulting Series
+
+        Returns:
+        - pd.Series with object dtype
+        """
+        if self.is_fixed_length and len(self):
+            cells = list(self.to_matrix())
+        else:
+            cells = [self.values[a:b] for a, b in zip(self.starts, self.offsets[1:])]
+        return pd.Series(cells, index=index, name=name, dtype=object)
+
+
+def _shared_buffer(cells):
+    """Return (values, offsets) if all cells are consecutive views into one buffer, else None."""
+    if not cells or not isinstance(cells[0], np.ndarray):
+        return None
+    base = cells[0].base
+    if base is None or not isinstance(base, np.ndarray):
+        return None
+    if not base.flags.c_contiguous:
+        return None
+    itemsize = base.dtype.itemsize
+    address = base.__array_interface__["data"][0]
+    starts = np.empty(len(cells), dtype=np.int64)
+    lengths = np.empty(len(cells), dtype=np.int64)
+    for i, cell in enumerate(cells):
+        if (
+            not isinstance(cell, np.ndarray)
+            or cell.base is not base
+            or cell.ndim != 1
+            or not cell.flags.c_contiguous
+        ):
+            return None
+        starts[i] = (cell.__array_interface__["data"][0] - address) // itemsize
+        lengths[i] = len(cell)
+    if np.any(starts[1:] != starts[:-1] + lengths[:-1]):
+        return None
+    flat = base.reshape(-1)
+    values = flat[starts[0] : starts[-1] + lengths[-1]]
+    offsets = np.zeros(len(cells) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return values, offsets
+
+
+def is_curve_column(column: pd.Series) -> bool:
+    """True if the first cell of the column holds a curve (list or 1D array)."""
+    if len(column) == 0:
+        return False
+    first = column.iloc[0]
+    return isinstance(first, list) or (
+        isinstance(first, np.ndarray) and first.ndim == 1
+    )
+
+
+def curve_matrix(curves, dtype=np.float32):
+    """
+    ## 2D matrix of fixed-length curves
+
+    Input Arguments:
+    - curves: CurveArray, DataFrame column with curves or a 2D array
+
+    Returns:
+    - np.ndarray with one curve per row. Zero-copy if the curves are already stored in a shared buffer of the
+    requested dtype.
+    """
+    if isinstance(curves, pd.Series):
+        curves = CurveArray.from_column(curves, dtype=None)
+    if isinstance(curves, CurveArray):
+        return curves.astype(dtype).to_matrix()
+    return np.asarray(curves, dtype=dtype)
+
+
+def save_curve_matrix(path, curves, dtype=np.float32, chunk_rows=65536) -> None:
+    """
+    ## Write fixed-length curves to a .npy file
+
+    The file is filled chunk by chunk through a memory map, so only one chunk is converted to dtype at a time.
+
+    Input Arguments:
+    - path (str): Target .npy file, replaced atomically
+    - curves: CurveArray, DataFrame column with curves or a 2D array (see curve_matrix)
+    - dtype: dtype of the file. Default float32.
+    - chunk_rows (int): Rows converted per chunk. Default 65536.
+    """
+    if isinstance(curves, pd.Series):
+        curves = CurveArray.from_column(curves, dtype=None)
+    matrix = (
+        curves.to_matrix() if isinstance(curves, CurveArray) else np.asarray(curves)
+    )
+    if matrix.ndim != 2:
+        raise ValueError("Curves must have the same length to be stored as a matrix")
+    temporary = f"{path}.tmp.npy"
+    target = np.lib.format.open_memmap(
+        temporary, mode="w+", dtype=dtype, shape=matrix.shape
+    )
+    for start in range(0, len(matrix), chunk_rows):
+        target[start : start + chunk_rows] = matrix[start : start + chunk_rows]
+    target.flush()
+    del target
+    os.replace(temporary, path)
+
+
+def open_curve_matrix(path, mode="r") -> np.ndarray:
+    """
+    ## Open a curve matrix written by save_curve_matrix
+
+    Returns:
+    - np.memmap with one curve per row, the values are read from disk on access
+    """
+    return np.load(path, mmap_mode=mode)
@@ -11,6 +11,9 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from datetime import timedelta, datetime
 
+from tools.curves import CurveArray
+from tools.project_store import ProjectStore
+
 
 def plotly_plot_3d_power(
     dataframe: pd.DataFrame,
@@ -171,7 +174,7 @@ def plot_reconstructions(
     return fig
 
 
-def create_new_project(project_name: str):
+def create_new_project(project_name: str, data: pd.DataFrame = None):
     """
     ## Creating a new project
 
@@ -181,6 +184,7 @@ def create_new_project(project_name: str):
 
     Input Arguments:
     - project_name (str): The name of the project to create
+    - data (pd.DataFrame, optional): Raw data of the project, stored with the ProjectStore
 
     Returns:
     - Boolean success or failure state.
@@ -189,7 +193,7 @@ def create_new_project(project_name: str):
         clean_name = project_name.replace(" ", "")
         if not clean_name:
             new_name = input("Project name cannot be empty. Enter new project name: ")
-            return create_new_project(new_name)
+            return create_new_project(new_name, data)
 
         project_path = os.path.join("projects", clean_name)
 
@@ -200,18 +204,18 @@ def create_new_project(project_name: str):
                 ).lower()
                 if response == "y":
                     shutil.rmtree(project_path)
-                    os.makedirs(project_path)
-                    print(f"Project {clean_name} created")
-                    return True
+                    break
                 elif response == "n":
                     new_name = input("Enter new project name: ")
-                    return create_new_project(new_name)
+                    return create_new_project(new_name, data)
                 else:
                     print("Please answer 'y' or 'n'")
-        else:
-            os.makedirs(project_path)
-            print(f"Project {clean_name} created")
-            return True
+
+        os.makedirs(project_path)
+        if data is not None:
+            ProjectStore(clean_name).save_data(data)
+        print(f"Project {clean_name} created")
+        return True
 
     except Exception as e:
         print(f"Error creating project: {str(e)}")
@@ -246,29 +250,236 @@ def calculate_parameters(row):
     )
 
 
-def extract_curve_parameters(dataframe: pd.DataFrame):
+def calculate_curve_parameters(
+    current, voltage, refine_mpp=False, extended=False, slope_points=5
+):
+    """
+    ## Calculating the curve params for all curves at once
+
+    Batched version of calculate_parameters. The maximum power point is searched with segment reductions over the
+    flat curve buffer, so no Python loop over the curves is needed.
+
+    Input Arguments:
+    - current: CurveArray or padded 2D array (NaN padding at the end of each row) with the current values
+    - voltage: CurveArray or padded 2D array with the voltage values, same shape as current
+    - refine_mpp (bool): Refine the MPP between the measured points with a quadratic fit through the highest power
+    point and its two neighbours. Default False (same result as calculate_parameters).
+    - extended (bool): Also calculate the fill factor **FF** and the slope estimates **Rs** (near Voc) and
+    **Rsh** (near Isc) in Ohm. Default False.
+    - slope_points (int): Number of points at each end of the curve used for the Rs/Rsh estimates. Default 5.
+
+    Returns:
+    - pd.DataFrame with Isc, Voc, Pmpp, Impp, Vmpp (and FF, Rs, Rsh), one row per curve
+    """
+    current = _as_float64_curves(current)
+    voltage = _as_float64_curves(voltage)
+    if not np.array_equal(current.lengths, voltage.lengths):
+        raise ValueError("Current and voltage curves must have the same lengths")
+
+    starts, ends = current.starts, current.offsets[1:]
+    i_values, v_values = current.values, voltage.values
+    power = i_values * v_values
+
+    # First index of the maximum power per curve (same as np.argmax)
+    max_power = np.maximum.reduceat(power, starts)
+    hits = np.flatnonzero(power == np.repeat(max_power, current.lengths))
+    mpp = hits[np.minimum(np.searchsorted(hits, starts), len(hits) - 1)]
+    valid = (mpp >= starts) & (mpp < ends)
+    mpp = np.where(valid, mpp, starts)
+
+    parameters = {
+        "Isc": current.row_max(),
+        "Voc": voltage.row_max(),
+        "Pmpp": np.where(valid, power[mpp], np.nan),
+        "Impp": np.where(valid, i_values[mpp], np.nan),
+        "Vmpp": np.where(valid, v_values[mpp], np.nan),
+    }
+
+    if refine_mpp:
+        inner = valid & (mpp > starts) & (mpp < ends - 1)
+        left, right = np.where(inner, mpp - 1, mpp), np.where(inner, mpp + 1, mpp)
+        v0, v1, v2 = v_values[left], v_values[mpp], v_values[right]
+        p0, p1, p2 = power[left], power[mpp], power[right]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            d1 = (p1 - p0) / (v1 - v0)
+            a = ((p2 - p1) / (v2 - v1) - d1) / (v2 - v0)
+            v_peak = (v0 + v1) / 2 - d1 / (2 * a)
+            p_peak = p0 + d1 * (v_peak - v0) + a * (v_peak - v0) * (v_peak - v1)
+            # Only accept peaks that stay closer to the measured maximum than to its neighbours and gain less
+            # power than the drop to the neighbours (protects against noisy, nearly duplicated points)
+            use = (
+                inner
+                & (a < 0)
+                & (v_peak >= (v0 + v1) / 2)
+                & (v_peak <= (v1 + v2) / 2)
+                & (v_peak > 0)
+                & (p_peak - p1 <= np.maximum(p1 - p0, p1 - p2))
+                & (p_peak / v_peak <= parameters["Isc"])
+            )
+            parameters["Pmpp"] = np.where(use, p_peak, parameters["Pmpp"])
+            parameters["Vmpp"] = np.where(use, v_peak, parameters["Vmpp"])
+            parameters["Impp"] = np.where(use, p_peak / v_peak, parameters["Impp"])
+
+    if extended:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            parameters["FF"] = parameters["Pmpp"] / (
+                parameters["Isc"] * parameters["Voc"]
+            )
+            parameters["Rs"] = -1 / _end_slopes(current, voltage, slope_points, False)
+            parameters["Rsh"] = -1 / _end_slopes(current, voltage, slope_points, True)
+
+    return pd.DataFrame(parameters)
+
+
+def _as_float64_curves(curves):
+    """Convert a CurveArray, a column or a NaN-padded 2D array to a float64 CurveArray."""
+    if isinstance(curves, CurveArray):
+        return curves.astype(np.float64)
+    if isinstance(curves, pd.Series):
+        return CurveArray.from_column(curves, dtype=np.float64)
+    padded = np.asarray(curves, dtype=np.float64)
+    lengths = np.sum(~np.isnan(padded), axis=1)
+    offsets = np.zeros(len(padded) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return CurveArray(padded[np.arange(padded.shape[1]) < lengths[:, None]], offsets)
+
+
+def _end_slopes(current, voltage, n_points, at_start):
+    """Least squares slope dI/dV over the first (at_start) or last n_points of every curve."""
+    starts, ends = current.starts[:, None], current.offsets[1:, None]
+    if at_start:
+        positions = starts + np.arange(n_points)
+    else:
+        positions = ends - n_points + np.arange(n_points)
+    mask = (positions >= starts) & (positions < ends)
+    positions = np.clip(positions, starts, ends - 1)
+    x = np.where(mask, voltage.values[positions], 0.0)
+    y = np.where(mask, current.values[positions], 0.0)
+    n = mask.sum(axis=1)
+    sxx = n * (x * x).sum(axis=1) - x.sum(axis=1) ** 2
+    sxy = n * (x * y).sum(axis=1) - x.sum(axis=1) * y.sum(axis=1)
+    return sxy / sxx
+
+
+def extract_curve_parameters(dataframe: pd.DataFrame, refine_mpp=False, extended=False):
     """
     ## Extracting the curve params
 
-    Using the calculate_parameters function to get the curve params and storing them in the dataframe.
+    Computes the curve params for all curves at once with calculate_curve_parameters and stores them in the
+    dataframe.
 
     Input Arguments:
-    - pd.DataFrame
+    - pd.DataFrame with the columns **Current** and **Voltage** (lists or CurveArray column)
+    - refine_mpp (bool): Refine the MPP with a quadratic fit, see calculate_curve_parameters. Default False.
+    - extended (bool): Also add FF, Rs and Rsh, see calculate_curve_parameters. Default False.
 
     Returns:
     - pd.DataFrame with added curve params
     """
-    parameters = dataframe.apply(calculate_parameters, axis=1)
+    parameters = calculate_curve_parameters(
+        dataframe["Current"],
+        dataframe["Voltage"],
+        refine_mpp=refine_mpp,
+        extended=extended,
+    )
+    parameters.index = dataframe.index
     data = pd.concat([dataframe, parameters], axis=1)
 
     return data
 
 
+def bin_pairs(
+    df,
+    g_values,
+    t_values,
+    target_column="Pmpp",
+    g_tol=75,
+    t_tol=10,
+    g_column="G_eff",
+    t_column="T_eff",
+    return_indices=False,
+):
+    """
+    ## Counts the number of measured values around every G-T-pair of the matrix
+
+    Every row is assigned to the range of (possibly overlapping) tolerance windows it falls into with one
+    searchsorted per axis. The counts are then built as a cumulative 2D histogram from the corners of these
+    ranges, so the DataFrame is scanned once instead of once per matrix point. A row counts for a G-T-pair if
+    `g - g_tol <= G <= g + g_tol` and `t - t_tol <= T <= t + t_tol` (same as Series.between) and the target value
+    is not NaN.
+
+    Input Arguments:
+    - a DataFrame with the G, T and target columns
+    - g_values: A list with G values (from the G-T-pairs of the matrix)
+    - t_values: A list with T values (from the G-T-pairs of the matrix)
+    - target_column: The column to count, default "Pmpp"
+    - g_tol: The tolerance value for the G values around the given point, default 75 W/m²
+    - t_tol: The tolerance value for the T values around the given point, default 10 °C
+    - g_column: The column with the G values, default "G_eff"
+    - t_column: The column with the T values, default "T_eff"
+    - return_indices: Also return the index labels of the rows in every bin, default False
+
+    Returns:
+    - a matrix (len(t_values) x len(g_values)) with the counted number of pairs
+    - (only if return_indices) a nested list indices[i][j] with the index labels of the rows in bin (t_i, g_j)
+    """
+    valid = df[target_column].notna().to_numpy()
+    g_first, g_stop, g_order = _window_ranges(
+        df[g_column].to_numpy(dtype=np.float64), g_values, g_tol
+    )
+    t_first, t_stop, t_order = _window_ranges(
+        df[t_column].to_numpy(dtype=np.float64), t_values, t_tol
+    )
+    t_stop = np.where(valid, t_stop, t_first)
+
+    n_g, n_t = len(g_values), len(t_values)
+    size = (n_t + 1) * (n_g + 1)
+    corners = (
+        np.bincount(t_first * (n_g + 1) + g_first, minlength=size)
+        - np.bincount(t_first * (n_g + 1) + g_stop, minlength=size)
+        - np.bincount(t_stop * (n_g + 1) + g_first, minlength=size)
+        + np.bincount(t_stop * (n_g + 1) + g_stop, minlength=size)
+    )
+    sorted_counts = corners.reshape(n_t + 1, n_g + 1).cumsum(axis=0).cumsum(axis=1)
+    counts_matrix = np.zeros((n_t, n_g), dtype=int)
+    counts_matrix[np.ix_(t_order, g_order)] = sorted_counts[:n_t, :n_g]
+
+    if not return_indices:
+        return counts_matrix
+
+    # Expand every row into the (t, g) bins it belongs to and group the rows by bin
+    n_t_bins = t_stop - t_first
+    n_g_bins = np.maximum(g_stop - g_first, 0)
+    pairs = n_t_bins * n_g_bins
+    rows = np.repeat(np.arange(len(df)), pairs)
+    local = np.arange(len(rows)) - np.repeat(np.cumsum(pairs) - pairs, pairs)
+    width = np.repeat(n_g_bins, pairs)
+    t_bin = t_order[np.repeat(t_first, pairs) + local // np.maximum(width, 1)]
+    g_bin = g_order[np.repeat(g_first, pairs) + local % np.maximum(width, 1)]
+    bins = t_bin * n_g + g_bin
+    order = np.argsort(bins, kind="stable")
+    groups = np.split(
+        df.index.to_numpy()[rows[order]],
+        np.cumsum(np.bincount(bins, minlength=n_t * n_g))[:-1],
+    )
+    indices = [groups[i * n_g : (i + 1) * n_g] for i in range(n_t)]
+    return counts_matrix, indices
+
+
+def _window_ranges(values, centers, tol):
+    """First and stop position of the sorted tolerance windows containing every value, plus the sort order."""
+    order = np.argsort(np.asarray(centers, dtype=np.float64), kind="stable")
+    centers = np.asarray(centers, dtype=np.float64)[order]
+    first = np.searchsorted(centers + tol, values, side="left")
+    stop = np.searchsorted(centers - tol, values, side="right")
+    return first, np.maximum(stop, first), order
+
+
 def count_pmpp_pairs(df, g_values, t_values, g_tol=75, t_tol=10):
     """
     ## Counts the number of Pmpp pairs in a given bin
 
-    This is important when checking if the measured data can be fitted to the SRA surface or not.
+    This is important when checking if the measured data can be fitted to the SRA surface or not. See bin_pairs.
 
     Input Arguments:
     - a DataFrame with G_eff, T_eff and Pmpp
@@ -280,24 +491,14 @@ def count_pmpp_pairs(df, g_values, t_values, g_tol=75, t_tol=10):
     Returns:
     - a matrix with the counted number of Pmpp pairs
     """
-    counts_matrix = np.zeros((len(t_values), len(g_values)), dtype=int)
-
-    for i, t in enumerate(t_values):
-        for j, g in enumerate(g_values):
-            within_tolerance = df[
-                (df["G_eff"].between(g - g_tol, g + g_tol))
-                & (df["T_eff"].between(t - t_tol, t + t_tol))
-            ]
-            counts_matrix[i, j] = within_tolerance["Pmpp"].count()
-
-    return counts_matrix
+    return bin_pairs(df, g_values, t_values, "Pmpp", g_tol, t_tol)
 
 
 def count_current_pairs(df, _g_values, _t_values, g_tol=75, t_tol=10):
     """
     ## Counts the number of Isc pairs in a given bin
 
-    This is important when checking if the measured data can be fitted to the SRA surface or not.
+    This is important when checking if the measured data can be fitted to the SRA surface or not. See bin_pairs.
 
     Input Arguments:
     - a DataFrame with G_eff, T_eff and Isc
@@ -309,17 +510,7 @@ def count_current_pairs(df, _g_values, _t_values, g_tol=75, t_tol=10):
     Returns:
     - a matrix with the counted number of Pmpp pairs
     """
-    counts_matrix = np.zeros((len(_t_values), len(_g_values)), dtype=int)
-
-    for i, t in enumerate(_t_values):
-        for j, g in enumerate(_g_values):
-            within_tolerance = df[
-                (df["G_eff"].between(g - g_tol, g + g_tol))
-                & (df["T_eff"].between(t - t_tol, t + t_tol))
-            ]
-            counts_matrix[i, j] = within_tolerance["Isc"].count()
-
-    return counts_matrix
+    return bin_pairs(df, _g_values, _t_values, "Isc", g_tol, t_tol)
 
 
 def count_filled_bins(matrix, threshold=4, percentage=0.15):
@@ -0,0 +1,394 @@
+"""
+Columnar storage of the project data.
+
+A project used to hold a full pickle of the data after every stage (data.pkl, data_filtered.pkl,
+data_effective.pkl). The ProjectStore keeps the raw data once in data.parquet (IV curves as list<float32>) and
+stores every later stage as a delta: the positions of its rows in data.parquet plus only the columns the stage added
+or changed. Columns can be read selectively, e.g. `store.load("data_effective", ["G_eff", "T_eff", "Pmpp"])`.
+
+Filter results are stored as RowSelection bitmaps (see tools.selection) in the folder selections/, a stage can be
+saved directly from a selection, e.g. `store.save_stage("data_filtered", selection)`.
+
+Normalized curves for the autoencoder are stored as float32 .npy matrices (one row per row of the raw data) and
+opened as memory maps, e.g. `store.curve_matrix("Current_normalized")`. They are deleted when save_data replaces the
+raw data, so a matrix never belongs to older data.
+
+Small result tables (matrices, bootstrap samples) are stored as single Parquet files. Projects with the old pickle
+files can still be read, new results are always written as Parquet.
+"""
+
+import os
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import List, Optional
+
+from tools.curves import (
+    CurveArray,
+    is_curve_column,
+    open_curve_matrix,
+    save_curve_matrix,
+)
+from tools.selection import RowSelection
+
+STAGES = ("data", "data_filtered", "data_effective")
+"""Data stages of a project in processing order."""
+
+_ROW = "_row"
+_INDEX = "_index"
+_METADATA_KEY = b"sra"
+
+
+class ProjectStore:
+    """
+    ## Storage of one project directory
+
+    Input Arguments:
+    - project_name (str): Name of the project (folder inside projects_dir)
+    - projects_dir (str): Directory with all projects. Default "projects".
+    """
+
+    def __init__(self, project_name, projects_dir="projects"):
+        self.project_name = project_name
+        self.folder_path = os.path.join(projects_dir, project_name)
+
+    def _path(self, name, extension="parquet"):
+        return os.path.join(self.folder_path, f"{name}.{extension}")
+
+    def exists(self, name) -> bool:
+        """True if the stage or table exists (as Parquet or as a legacy pickle)."""
+        return os.path.exists(self._path(name)) or os.path.exists(
+            self._path(name, "pkl")
+        )
+
+    def columns(self, stage="data") -> List[str]:
+        """Columns of a stage without loading it."""
+        if not os.path.exists(self._path(stage)):
+            return list(self.load(stage).columns)
+        return _read_metadata(self._path(stage))["columns"]
+
+    def save_data(self, data: pd.DataFrame) -> None:
+        """Store the raw data of the project (stage "data")."""
+        os.makedirs(self.folder_path, exist_ok=True)
+        table = _to_arrow(data)
+        _write(self._path("data"), table, _metadata(data, delta=False))
+        _remove(self._path("data", "pkl"))
+        # Curve matrices hold one row per row of the raw data
+        for name in self.curve_matrices():
+            _remove(self._path(name, "npy"))
+
+    def save_stage(self, stage, data) -> None:
+        """
+        ## Store the result of a processing stage
+
+        If every row of data can be found in the raw data (by index label), only the row positions and the columns
+        that differ from the raw data are written. Otherwise the full frame is written. A RowSelection is stored
+        as the row positions only.
+
+        Input Arguments:
+        - stage (str): e.g. "data_filtered" or "data_effective"
+        - data (pd.DataFrame or RowSelection): The data after the stage, with the index of the raw data
+        """
+        if isinstance(data, RowSelection):
+            return self._save_selected_stage(stage, data)
+        if stage == "data":
+            return self.save_data(data)
+        os.makedirs(self.folder_path, exist_ok=True)
+        metadata = _metadata(data, delta=False)
+        rows = self._base_rows(data.index)
+        if rows is None:
+            table = _to_arrow(data)
+        else:
+            base = self.columns("data")
+            common = [col for col in data.columns if str(col) in base]
+            base_data = _read_rows(self._path("data"), [str(c) for c in common], rows)
+            changed = [
+                col
+                for col in data.columns
+                if str(col) not in base
+                or not _same_column(data[col], base_data[str(col)])
+            ]
+            # The row positions go first, a table without changed columns still has one row per row
+            table = pa.table({_ROW: pa.array(rows, pa.int64())})
+            for name, array in zip(
+                _names(data[changed]), _to_arrow(data[changed], index=False).columns
+            ):
+                table = table.append_column(name, array)
+            metadata["delta"] = True
+        _write(self._path(stage), table, metadata)
+        _remove(self._path(stage, "pkl"))
+
+    def _save_selected_stage(self, stage, selection: RowSelection) -> None:
+        """Store a stage that holds the selected rows of the raw data without any changes."""
+        self._migrate_data()
+        if selection.n_rows != self.n_rows():
+            raise ValueError(
+                f"Selection has {selection.n_rows} rows, the data has {self.n_rows()} rows"
+            )
+        metadata = _read_metadata(self._path("data"))
+        metadata["delta"] = True
+        table = pa.table({_ROW: pa.array(selection.positions, pa.int64())})
+        _write(self._path(stage), table, metadata)
+        _remove(self._path(stage, "pkl"))
+
+    def _migrate_data(self) -> None:
+        """Convert a legacy data.pkl to data.parquet, selections need the columnar raw data."""
+        if not os.path.exists(self._path("data")):
+            if not os.path.exists(self._path("data", "pkl")):
+                raise FileNotFoundError(f"No data for project: {self.project_name}")
+            self.save_data(pd.read_pickle(self._path("data", "pkl")))
+
+    def n_rows(self, stage="data") -> int:
+        """Number of rows of a stage without loading it."""
+        if not os.path.exists(self._path(stage)):
+            return len(self.load(stage))
+        return pq.read_metadata(self._path(stage)).num_rows
+
+    def save_selection(self, name, selection: RowSelection) -> None:
+        """Store a filter result under a name (e.g. "label_ok" or "autoencoder")."""
+        os.makedirs(os.path.join(self.folder_path, "selections"), exist_ok=True)
+        selection.save(self._selection_path(name))
+
+    def load_selection(self, name) -> RowSelection:
+        path = self._selection_path(name)
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f"No selection {name} for project: {self.project_name}"
+            )
+        return RowSelection.load(path)
+
+    def selections(self) -> List[str]:
+        """Names of all stored selections."""
+        folder = os.path.join(self.folder_path, "selections")
+        if not os.path.isdir(folder):
+            return []
+        return sorted(
+            f[: -len(".npz")] for f in os.listdir(folder) if f.endswith(".npz")
+        )
+
+    def _selection_path(self, name):
+        return os.path.join(self.folder_path, "selections", f"{name}.npz")
+
+    def select(self, selection: RowSelection, columns: Optional[List[str]] = None):
+        """
+        ## Load the selected rows of the raw data
+
+        Input Arguments:
+        - selection (RowSelection): Rows to load
+        - columns (list, optional): Only load these columns
+
+        Returns:
+        - pd.DataFrame like `selection.apply(store.load("data", columns))`, but only the selected rows are read
+        """
+        self._migrate_data()
+        metadata = _read_metadata(self._path("data"))
+        if selection.n_rows != self.n_rows():
+            raise ValueError(
+                f"Selection has {selection.n_rows} rows, the data has {self.n_rows()} rows"
+            )
+        columns = metadata["columns"] if columns is None else list(columns)
+        return _read_rows(
+            self._path("data"), columns, selection.positions, metadata["index_name"]
+        )
+
+    def _base_rows(self, index: pd.Index) -> Optional[np.ndarray]:
+        """Positions of the index labels in the raw data, None if they can not be matched."""
+        if not os.path.exists(self._path("data")):
+            return None
+        base_index = pd.Index(
+            pq.read_table(self._path("data"), columns=[_INDEX])
+            .column(_INDEX)
+            .to_pandas()
+        )
+        if not base_index.is_unique:
+            return None
+        rows = base_index.get_indexer(index)
+        if np.any(rows < 0):
+            return None
+        return rows
+
+    def load(self, stage="data", columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        ## Load a stage
+
+        Input Arguments:
+        - stage (str): "data", "data_filtered" or "data_effective"
+        - columns (list, optional): Only load these columns
+
+        Returns:
+        - pd.DataFrame with the index of the raw data, curves as CurveArray-backed columns
+        """
+        path = self._path(stage)
+        if not os.path.exists(path):
+            legacy = self._path(stage, "pkl")
+            if not os.path.exists(legacy):
+                raise FileNotFoundError(f"No {stage} for project: {self.project_name}")
+            data = pd.read_pickle(legacy)
+            return data if columns is None else data[columns]
+
+        metadata = _read_metadata(path)
+        columns = metadata["columns"] if columns is None else list(columns)
+        for col in columns:
+            if col not in metadata["columns"]:
+                raise ValueError(f"Missing required column: {col}")
+        index_name = metadata["index_name"]
+        if not metadata["delta"]:
+            return _read_rows(path, columns, None, index_name)
+
+        stored = set(pq.read_schema(path).names)
+        own = [col for col in columns if col in stored]
+        stage_table = pq.read_table(path, columns=own + [_ROW])
+        rows = stage_table.column(_ROW).to_numpy()
+        base = _read_rows(
+            self._path("data"),
+            [col for col in columns if col not in stored],
+            rows,
+            index_name,
+        )
+        stage_data = _from_arrow(stage_table.drop([_ROW]), base.index)
+        return pd.concat([base, stage_data], axis=1)[columns]
+
+    def save_curve_matrix(self, name, curves) -> None:
+        """Store fixed-length curves (e.g. the column Current_normalized) as a float32 matrix {name}.npy."""
+        os.makedirs(self.folder_path, exist_ok=True)
+        save_curve_matrix(self._path(name, "npy"), curves)
+
+    def curve_matrices(self) -> List[str]:
+        """Names of all stored curve matrices."""
+        if not os.path.isdir(self.folder_path):
+            return []
+        return sorted(
+            f[: -len(".npy")]
+            for f in os.listdir(self.folder_path)
+            if f.endswith(".npy")
+        )
+
+    def has_curve_matrix(self, name) -> bool:
+        return os.path.exists(self._path(name, "npy"))
+
+    def curve_matrix(self, name) -> np.ndarray:
+        """Read-only memory map of a matrix stored with save_curve_matrix."""
+        path = self._path(name, "npy")
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f"No curve matrix {name} for project: {self.project_name}"
+            )
+        return open_curve_matrix(path)
+
+    def save_table(self, name, table: pd.DataFrame) -> None:
+        """Store a small result table like a matrix (index and columns are kept)."""
+        os.makedirs(self.folder_path, exist_ok=True)
+        _write(self._path(name), pa.Table.from_pandas(table), None)
+        _remove(self._path(name, "pkl"))
+
+    def load_table(self, name) -> pd.DataFrame:
+        """Load a table stored with save_table (or a legacy pickle)."""
+        path = self._path(name)
+        if os.path.exists(path):
+            return pq.read_table(path).to_pandas()
+        return pd.read_pickle(self._path(name, "pkl"))
+
+
+def _names(data: pd.DataFrame) -> List[str]:
+    return [str(col) for col in data.columns]
+
+
+def _metadata(data: pd.DataFrame, delta) -> dict:
+    index_name = data.index.name
+    return {
+        "columns": _names(data),
+        "index_name": None if index_name is None else str(index_name),
+        "delta": delta,
+    }
+
+
+def _write(path, table: pa.Table, metadata) -> None:
+    """Write a table atomically, metadata is stored as JSON in the schema."""
+    if metadata is not None:
+        schema_metadata = dict(table.schema.metadata or {})
+        schema_metadata[_METADATA_KEY] = json.dumps(metadata).encode()
+        table = table.replace_schema_metadata(schema_metadata)
+    temporary = f"{path}.tmp"
+    pq.write_table(table, temporary)
+    os.replace(temporary, path)
+
+
+def _read_metadata(path) -> dict:
+    return json.loads(pq.read_schema(path).metadata[_METADATA_KEY])
+
+
+def _remove(path) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _to_arrow(data: pd.DataFrame, index=True) -> pa.Table:
+    """Convert a DataFrame to Arrow, curve columns become list<float32>."""
+    arrays = [_column_to_arrow(data[col]) for col in data.columns]
+    names = _names(data)
+    if index:
+        arrays.append(pa.Array.from_pandas(pd.Series(data.index)))
+        names.append(_INDEX)
+    return pa.Table.from_arrays(arrays, names=names)
+
+
+def _column_to_arrow(column: pd.Series) -> pa.Array:
+    if column.dtype == object and is_curve_column(column):
+        try:
+            curves = CurveArray.from_column(column, dtype=np.float32)
+        except (TypeError, ValueError):
+            return pa.Array.from_pandas(column)
+        offsets = curves.offsets
+        list_type = pa.ListArray
+        if offsets[-1] > np.iinfo(np.int32).max:
+            list_type = pa.LargeListArray
+        else:
+            offsets = offsets.astype(np.int32)
+        return list_type.from_arrays(pa.array(offsets), pa.array(curves.values))
+    return pa.Array.from_pandas(column)
+
+
+def _read_rows(path, columns, rows, index_name=None) -> pd.DataFrame:
+    """Read columns (and the index) of a Parquet file, optionally only the rows at the given positions."""
+    table = pq.read_table(path, columns=list(columns) + [_INDEX])
+    if rows is not None:
+        table = table.take(pa.array(rows, pa.int64()))
+    index = pd.Index(table.column(_INDEX).to_pandas()).rename(index_name)
+    return _from_arrow(table.drop([_INDEX]), index)
+
+
+def _from_arrow(table: pa.Table, index: pd.Index) -> pd.DataFrame:
+    """Convert Arrow to a DataFrame, list<float> columns become CurveArray-backed columns."""
+    columns = {}
+    for name in table.column_names:
+        column = table.column(name)
+        if (
+            pa.types.is_list(column.type) or pa.types.is_large_list(column.type)
+        ) and pa.types.is_floating(column.type.value_type):
+            array = column.combine_chunks()
+            if array.null_count == 0:
+                offsets = array.offsets.to_numpy().astype(np.int64)
+                values = array.flatten().to_numpy()
+                curves = CurveArray(values, offsets - offsets[0])
+                columns[name] = curves.to_column(index, name)
+                continue
+        columns[name] = pd.Series(column.to_pandas().values, index=index, name=name)
+    return pd.DataFrame(columns, index=index)
+
+
+def _same_column(column: pd.Series, base: pd.Series) -> bool:
+    """True if the column holds the same values as the stored base column (curves compared as float32)."""
+    if len(column) != len(base):
+        return False
+    if is_curve_column(column) and is_curve_column(base):
+        try:
+            a = CurveArray.from_column(column, dtype=np.float32)
+            b = CurveArray.from_column(base, dtype=np.float32)
+        except (TypeError, ValueError):
+            return False
+        return np.array_equal(a.offsets, b.offsets) and np.array_equal(
+            a.values, b.values, equal_nan=True
+        )
+    return column.reset_index(drop=True).equals(base.reset_index(drop=True))
@@ -0,0 +1,108 @@
+"""
+Row selections of the project data.
+
+A filter result is stored as a bitmap over the rows of the raw data (data.parquet) instead of a copy of the selected
+rows. Selections can be combined with & (and), | (or), ~ (not) and - (without), e.g.
+`store.load_selection("label_ok") & store.load_selection("autoencoder")`.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class RowSelection:
+    """
+    ## Set of rows of the raw data, stored as a boolean mask
+
+    Input Arguments:
+    - mask (array-like of bool): One value per row of the raw data, True for selected rows
+    """
+
+    def __init__(self, mask):
+        mask = np.asarray(mask, dtype=bool)
+        if mask.ndim != 1:
+            raise ValueError("Selection mask must be 1D")
+        self.mask = mask
+
+    @classmethod
+    def all(cls, n_rows):
+        """Selection of all rows."""
+        return cls(np.ones(n_rows, dtype=bool))
+
+    @classmethod
+    def from_positions(cls, positions, n_rows):
+        """Selection from (sorted or unsorted) row positions."""
+        mask = np.zeros(n_rows, dtype=bool)
+        mask[np.asarray(positions, dtype=np.int64)] = True
+        return cls(mask)
+
+    @classmethod
+    def from_labels(cls, index: pd.Index, labels):
+        """Selection from index labels, index is the index of the raw data."""
+        positions = index.get_indexer(labels)
+        if np.any(positions < 0):
+            raise ValueError("Selection contains rows that are not in the data")
+        return cls.from_positions(positions, len(index))
+
+    @property
+    def n_rows(self) -> int:
+        """Number of rows of the raw data."""
+        return len(self.mask)
+
+    @property
+    def count(self) -> int:
+        """Number of selected rows."""
+        return int(np.count_nonzero(self.mask))
+
+    @property
+    def positions(self) -> np.ndarray:
+        """Sorted positions of the selected rows."""
+        return np.flatnonzero(self.mask)
+
+    def apply(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Select the rows of data, which must have the rows of the raw data in their original order."""
+        if len(data) != self.n_rows:
+            raise ValueError(
+                f"Selection has {self.n_rows} rows, the data has {len(data)} rows"
+            )
+        return data[self.mask]
+
+    def _check(self, other):
+        if not isinstance(other, RowSelection):
+            raise TypeError(f"Can not combine a RowSelection with {type(other)}")
+        if other.n_rows != self.n_rows:
+            raise ValueError("Selections refer to data with a different number of rows")
+        return other
+
+    def __and__(self, other):
+        other = self._check(other)
+        return RowSelection(self.mask & other.mask)
+
+    def __or__(self, other):
+        other = self._check(other)
+        return RowSelection(self.mask | other.mask)
+
+    def __sub__(self, other):
+        other = self._check(other)
+        return RowSelection(self.mask & ~other.mask)
+
+    def __invert__(self):
+        return RowSelection(~self.mask)
+
+    def __eq__(self, other):
+        if not isinstance(other, RowSelection):
+            return NotImplemented
+        return np.array_equal(self.mask, other.mask)
+
+    def __repr__(self):
+        return f"RowSelection({self.count} of {self.n_rows} rows)"
+
+    def save(self, path) -> None:
+        """Write the selection as packed bits (1 bit per row) to a .npz file."""
+        np.savez_compressed(path, bits=np.packbits(self.mask), n_rows=self.n_rows)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as stored:
+            n_rows = int(stored["n_rows"])
+            return cls(np.unpackbits(stored["bits"], count=n_rows).astype(bool))